@@ -0,0 +1,208 @@
+# 複数の講義評価CSVをまとめて感情分析するバッチ処理
+#
+# 使用例:
+#   python Sudachi/batch_analyze.py data/raw/2025 --workers 4
+#   python Sudachi/batch_analyze.py data/raw/2025 --force   # マニフェストを無視してすべて再処理
+#
+# 出力ディレクトリの manifest.json に、入力ファイルの内容ハッシュと解析器・感情辞書のバージョンを記録します。
+# 内容もバージョンも変わっていないファイルは処理を省略するため、新しい講義ファイルを追加した場合はそのファイルだけが処理されます。
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from importlib import metadata
+
+import test2
+from unit_store import file_digest  # test2 が src/utils を sys.path に追加する
+
+MANIFEST_NAME = 'manifest.json'
+# 分析結果の形式や処理内容を変更したときに上げる（既存の結果をすべて再処理させる）
+ANALYSIS_VERSION = 4
+
+# ワーカープロセスごとの感情極性辞書とマッチャー（_init_worker で読み込む）
+_worker_pn_dict = None
+_worker_matcher = None
+
+
+def analysis_signature(pn_artifact_path, pn_matcher_path=None):
+    """
+    分析結果に影響する解析器・感情辞書のバージョンをまとめます。
+    この値が変わった場合、マニフェストに記録済みのファイルもすべて再処理します。
+
+    Args:
+        pn_artifact_path (str): コンパイル済み感情極性辞書のパス。
+        pn_matcher_path (str, optional): 感情表現マッチャーのパス。None の場合は表層形で照合します。
+
+    Returns:
+        dict: 分析処理・SudachiPy・Sudachi辞書・分割単位・感情辞書・マッチャーのバージョン。
+    """
+    versions = {}
+    for package in ('sudachipy', 'sudachidict_core'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = 'unknown'
+    return {
+        'analysis_version': ANALYSIS_VERSION,
+        'sudachipy': versions['sudachipy'],
+        'sudachidict_core': versions['sudachidict_core'],
+        'split_mode': str(test2.mode),
+        'lexicon': file_digest(pn_artifact_path),
+        'matcher': file_digest(pn_matcher_path) if pn_matcher_path else None,
+    }
+
+
+def load_manifest(path):
+    """
+    マニフェストを読み込みます。存在しない・壊れている場合は空のマニフェストを返します。
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'signature': None, 'files': {}}
+
+
+def save_manifest(path, manifest):
+    """
+    マニフェストを保存します。途中で中断しても壊れないよう、一時ファイルに書き込んでから置き換えます。
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def plan_files(csv_files, manifest, signature, force=False, target_dir='.'):
+    """
+    処理が必要なファイルと、結果が最新のため省略できるファイルに分けます。
+    マニフェストのファイル名と出力先は target_dir からの相対パスです（実行時のカレントディレクトリによらない）。
+
+    Args:
+        csv_files (list[str]): 入力CSVのパス。
+        manifest (dict): 前回のマニフェスト。
+        signature (dict): 現在の解析器・感情辞書のバージョン。
+        force (bool, optional): True の場合はすべて処理対象にします。
+        target_dir (str, optional): 入力CSVのディレクトリ。
+
+    Returns:
+        tuple[list[tuple[str, str]], list[str]]: (処理対象の (パス, ハッシュ) のリスト, 省略するパスのリスト)。
+    """
+    same_signature = manifest.get('signature') == signature
+    pending, skipped = [], []
+    for path in csv_files:
+        digest = file_digest(path)
+        entry = manifest['files'].get(os.path.relpath(path, target_dir))
+        if (not force and same_signature and entry is not None and entry['sha256'] == digest
+                and os.path.isfile(os.path.join(target_dir, entry['output']))):
+            skipped.append(path)
+        else:
+            pending.append((path, digest))
+    return pending, skipped
+
+
+def _init_worker(pn_artifact_path, pn_matcher_path):
+    global _worker_pn_dict, _worker_matcher
+    _worker_pn_dict = test2.PolarityLexicon.load(pn_artifact_path)
+    _worker_matcher = test2.PolarityMatcher.load(pn_matcher_path) if pn_matcher_path else None
+
+
+def _process_file(file_path, output_dir):
+    return test2.process_csv_file(file_path, _worker_pn_dict, output_dir=output_dir, verbose=False,
+                                  matcher=_worker_matcher)
+
+
+def _print_progress(done, total, failed):
+    sys.stdout.write(f"\r処理中: {done}/{total} ファイル（失敗 {failed}）")
+    sys.stdout.flush()
+
+
+def run_batch(target_dir, output_dir=None, workers=1, force=False, pattern='*.csv',
+              pn_artifact_path=test2.PN_ARTIFACT_PATH, pn_dic_path=test2.PN_DIC_PATH,
+              pn_matcher_path=test2.PN_MATCHER_PATH):
+    """
+    ディレクトリ内のCSVファイルを並列に感情分析し、マニフェストを更新します。
+
+    Args:
+        target_dir (str): 入力CSVのディレクトリ。
+        output_dir (str, optional): 出力先ディレクトリ。None の場合は target_dir/analysis。
+        workers (int, optional): ワーカープロセス数。デフォルトは 1。
+        force (bool, optional): True の場合はマニフェストを無視してすべて再処理します。
+        pattern (str, optional): 入力ファイルのパターン。デフォルトは '*.csv'。
+        pn_artifact_path (str, optional): コンパイル済み感情極性辞書のパス。
+        pn_dic_path (str, optional): 感情極性辞書（pn_ja.dic）のパス。未コンパイルの場合に使用します。
+        pn_matcher_path (str, optional): 感情表現マッチャーのパス。未作成の場合は pn_ja.dic から作成します。
+                                         作成できない場合は表層形で照合します。
+
+    Returns:
+        dict: processed, skipped, failed, seconds を含む処理結果。辞書を読み込めない場合は None。
+    """
+    if test2.load_pn_table(pn_artifact_path, pn_dic_path) is None:
+        return None
+    # マッチャーは親プロセスで1度だけ作成・保存し、ワーカーは保存したファイルを読み込む
+    if test2.load_pn_matcher(pn_matcher_path, pn_dic_path) is None:
+        pn_matcher_path = None
+    if output_dir is None:
+        output_dir = os.path.join(target_dir, 'analysis')
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    start = time.perf_counter()
+    csv_files = sorted(glob.glob(os.path.join(target_dir, pattern)))
+    signature = analysis_signature(pn_artifact_path, pn_matcher_path)
+    manifest = load_manifest(manifest_path)
+    pending, skipped = plan_files(csv_files, manifest, signature, force, target_dir)
+    if manifest.get('signature') != signature:
+        # バージョンが変わった場合、古い記録は再処理が終わったものから置き換える
+        manifest = {'signature': signature, 'files': {}}
+    # 入力から消えたファイルの記録を削除する（出力済みの分析結果のファイルは残す）
+    inputs = {os.path.relpath(path, target_dir) for path in csv_files}
+    manifest['files'] = {name: entry for name, entry in manifest['files'].items() if name in inputs}
+    print(f"対象: {len(csv_files)}ファイル（処理 {len(pending)}、最新のため省略 {len(skipped)}）")
+
+    failed = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(pn_artifact_path, pn_matcher_path)) as executor:
+            futures = {executor.submit(_process_file, path, output_dir): (path, digest) for path, digest in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path, digest = futures[future]
+                result = future.result()
+                if result is None:
+                    failed.append(path)
+                else:
+                    manifest['files'][os.path.relpath(path, target_dir)] = {
+                        'sha256': digest,
+                        'output': os.path.relpath(result['output'], target_dir),
+                        'rows': result['rows'],
+                        'processed_at': datetime.now().isoformat(timespec='seconds'),
+                    }
+                    # 中断しても処理済みのファイルをやり直さないよう、1ファイルごとに保存する
+                    save_manifest(manifest_path, manifest)
+                _print_progress(done, len(pending), len(failed))
+        print()
+    save_manifest(manifest_path, manifest)
+
+    seconds = time.perf_counter() - start
+    print(f"完了: 処理 {len(pending) - len(failed)}、省略 {len(skipped)}、失敗 {len(failed)}（{seconds:.1f}秒）")
+    for path in failed:
+        print(f"失敗: {path}")
+    return {'processed': len(pending) - len(failed), 'skipped': len(skipped), 'failed': failed, 'seconds': seconds}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="講義評価CSVの感情分析（並列・差分処理）")
+    parser.add_argument("target_dir", help="入力CSVのディレクトリ")
+    parser.add_argument("--output-dir", help="出力先ディレクトリ（デフォルト: <target_dir>/analysis）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数")
+    parser.add_argument("--pattern", default="*.csv", help="入力ファイルのパターン")
+    parser.add_argument("--force", action="store_true", help="マニフェストを無視してすべて再処理する")
+    args = parser.parse_args()
+
+    summary = run_batch(args.target_dir, args.output_dir, args.workers, args.force, args.pattern)
+    if summary is None or summary['failed']:
+        sys.exit(1)
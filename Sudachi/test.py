@@ -1,29 +1,32 @@
 from sudachipy import tokenizer
 from sudachipy import dictionary
 from collections import defaultdict
-import pandas as pd
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'utils'))
+from pn_lexicon import PolarityLexicon, compile_pn_dic
 
 # Sudachiの初期化
 tokenizer_obj = dictionary.Dictionary().create()
 mode = tokenizer.Tokenizer.SplitMode.C
 
+# 感情極性辞書のパス（pn_ja.dic と、それをコンパイルしたバイナリ辞書）
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+PN_DIC_PATH = os.path.join(DATA_DIR, 'raw', 'pn_ja.dic')
+PN_ARTIFACT_PATH = os.path.join(DATA_DIR, 'processed', 'pn_ja.pnlx')
+
 # 感情値辞書の読み込み
-def load_pn_table():
+def load_pn_table(artifact_path=PN_ARTIFACT_PATH, dic_path=PN_DIC_PATH):
+    """
+    コンパイル済みの感情極性辞書を読み込みます。
+    未コンパイルの場合は、ローカルの pn_ja.dic から1度だけコンパイルします（ネットワークは使用しません）。
+    pn_ja.dic は http://www.lr.pi.titech.ac.jp/~takamura/pubs/pn_ja.dic から取得し、data/raw に配置してください。
+    """
     try:
-        pndic = pd.read_csv("http://www.lr.pi.titech.ac.jp/~takamura/pubs/pn_ja.dic",
-                           encoding="shift-jis",
-                           names=['word_type_score'])
-        
-        # 辞書の初期化
-        pn_dict = defaultdict(float)
-        
-        # データフレームを辞書に変換
-        for _, row in pndic.iterrows():
-            parts = row['word_type_score'].split(':')
-            if len(parts) >= 2:
-                word = parts[0]
-                score = float(parts[3]) if len(parts) > 3 and parts[3] != "0" else 0.0
-                pn_dict[word] = score
+        if not os.path.isfile(artifact_path):
+            compile_pn_dic(dic_path, artifact_path)
+        pn_dict = PolarityLexicon.load(artifact_path)
         
         print(f"感情辞書の読み込み完了: {len(pn_dict)}語")
         return pn_dict
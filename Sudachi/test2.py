@@ -6,29 +6,40 @@ import pandas as pd
 import os
 import glob
 import re
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'utils'))
+from pn_lexicon import PolarityLexicon, compile_pn_dic, parse_pn_dic
+from polarity_matcher import PolarityMatcher
+from sentiment_scorer import BatchSentimentScorer
+from instrumentation import instrumentation_from_env, profile_session
+from ingest import COMMENT_PATTERN, detect_encoding, extract_comments
+
 # Sudachiの初期化
 tokenizer_obj = dictionary.Dictionary().create()
 mode = tokenizer.Tokenizer.SplitMode.C
 
+# 感情極性辞書のパス（pn_ja.dic と、それをコンパイルしたバイナリ辞書）
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+PN_DIC_PATH = os.path.join(DATA_DIR, 'raw', 'pn_ja.dic')
+PN_ARTIFACT_PATH = os.path.join(DATA_DIR, 'processed', 'pn_ja.pnlx')
+PN_MATCHER_PATH = os.path.join(DATA_DIR, 'processed', 'pn_ja_matcher.pkl')
+
+# 処理段階ごとの計測（環境変数 ANALYZER_INSTRUMENT=1 のときだけ有効）
+instrumentation = instrumentation_from_env()
+
 # 感情値辞書の読み込み
-def load_pn_table():
+def load_pn_table(artifact_path=PN_ARTIFACT_PATH, dic_path=PN_DIC_PATH):
+    """
+    コンパイル済みの感情極性辞書を読み込みます。
+    未コンパイルの場合は、ローカルの pn_ja.dic から1度だけコンパイルします（ネットワークは使用しません）。
+    pn_ja.dic は http://www.lr.pi.titech.ac.jp/~takamura/pubs/pn_ja.dic から取得し、data/raw に配置してください。
+    """
     try:
-        pndic = pd.read_csv("http://www.lr.pi.titech.ac.jp/~takamura/pubs/pn_ja.dic",
-                           encoding="shift-jis",
-                           names=['word_type_score'])
-        
-        # 辞書の初期化
-        pn_dict = defaultdict(float)
-        
-        # データフレームを辞書に変換
-        for _, row in pndic.iterrows():
-            parts = row['word_type_score'].split(':')
-            if len(parts) >= 2:
-                word = parts[0]
-                score = float(parts[3]) if len(parts) > 3 and parts[3] != "0" else 0.0
-                pn_dict[word] = score
+        if not os.path.isfile(artifact_path):
+            compile_pn_dic(dic_path, artifact_path)
+        pn_dict = PolarityLexicon.load(artifact_path)
         
         print(f"感情辞書の読み込み完了: {len(pn_dict)}語")
         return pn_dict
@@ -60,6 +71,38 @@ def analyze_sentiment(text, pn_dict):
     
     return total_score, found_words
 
+# 見出し語・複数語表現で照合するマッチャーの読み込み
+def load_pn_matcher(matcher_path=PN_MATCHER_PATH, dic_path=PN_DIC_PATH):
+    """
+    感情極性辞書の各項目をSudachiで解析したマッチャーを読み込みます。
+    未作成の場合は pn_ja.dic から1度だけ作成して保存します。
+    """
+    try:
+        if os.path.isfile(matcher_path):
+            matcher = PolarityMatcher.load(matcher_path)
+        else:
+            matcher = PolarityMatcher.from_entries(parse_pn_dic(dic_path),
+                                                   lambda text: tokenizer_obj.tokenize(text, mode))
+            os.makedirs(os.path.dirname(matcher_path), exist_ok=True)
+            matcher.save(matcher_path)
+        print(f"感情表現マッチャーの読み込み完了: {len(matcher)}項目")
+        return matcher
+    except Exception as e:
+        print(f"感情表現マッチャーの読み込みに失敗: {e}")
+        return None
+
+def analyze_sentiment_batch(texts, pn_dict, normalize="token_mean", matcher=None):
+    # 複数の文章をまとめて形態素解析し、感情スコアを1回の行列演算で計算する
+    # matcher を指定した場合は表層形ではなく見出し語（正規化表記）と品詞で照合する
+    # 一致した感情表現は返り値の explain(行番号) で必要な行だけ取得できる
+    if matcher is not None:
+        with instrumentation.stage("tokenize"):
+            token_lists = [list(tokenizer_obj.tokenize(text, mode)) for text in texts]
+        return BatchSentimentScorer(matcher=matcher, instrumentation=instrumentation).score(token_lists, normalize=normalize)
+    with instrumentation.stage("tokenize"):
+        token_lists = [[token.surface() for token in tokenizer_obj.tokenize(text, mode)] for text in texts]
+    return BatchSentimentScorer(pn_dict, instrumentation=instrumentation).score(token_lists, normalize=normalize)
+
 def extract_text(text):
     # 日付情報を除外（YYYY/MM/DD（曜日）のパターン）
     date_pattern = r'\d{4}/\d{2}/\d{2}（[月火水木金土日]）'
@@ -78,66 +121,99 @@ def extract_text(text):
         return parts[-1].strip()
     return text
 
-def process_csv_file(file_path, pn_dict):
+def process_csv_file(file_path, pn_dict, output_dir=None, verbose=True, matcher=None):
+    """
+    CSVファイルの自由記述を感情分析し、結果を <ファイル名>_analysis.csv に保存します。
+
+    Args:
+        file_path (str): 講義評価CSVのパス。
+        pn_dict (PolarityLexicon or dict): 感情極性辞書。
+        output_dir (str, optional): 出力先ディレクトリ。None の場合は入力ファイルと同じ場所の analysis ディレクトリ。
+        verbose (bool, optional): 各文章の結果を表示する場合は True。デフォルトは True。
+        matcher (PolarityMatcher, optional): load_pn_matcher のマッチャー。指定した場合は見出し語と複数語表現で照合します。
+                                             None の場合は表層形で pn_dict を引きます。
+
+    Returns:
+        dict or None: {'file', 'rows', 'output'} 形式の処理結果。エラーが発生した場合は None。
+    """
     try:
         # CSVファイルから文章を読み込み
-        df = pd.read_csv(file_path, encoding='utf-8')
+        with instrumentation.stage("csv_read"):
+            df = pd.read_csv(file_path, encoding=detect_encoding(file_path))
         
         # ファイル名を取得
         file_name = os.path.basename(file_path)
-        print(f"\n=== ファイル: {file_name} の分析 ===")
+        if verbose:
+            print(f"\n=== ファイル: {file_name} の分析 ===")
         
         # 分析結果を格納するリスト
         results = []
         
-        # 各文章を分析
-        for i, row in df.iterrows():
-            text = row['自由記述']
-            # 日付情報を除外して純粋なテキストを取得
-            clean_text = extract_text(text)
-            
-            if clean_text:  # 空でない場合のみ分析
+        # 日付情報を除外して純粋なテキストを取得し、空でない行のみ分析
+        with instrumentation.stage("extract_text"):
+            clean_texts = extract_comments(df['自由記述'])
+            # 評価期間の開始日（年度・学期ごとの集計に使う）。期間の表記がない行は空欄
+            period_starts = df['自由記述'].fillna('').astype(str).str.extract(COMMENT_PATTERN)['period_start']
+        targets = df[clean_texts != ''].index
+        sentiment = analyze_sentiment_batch(clean_texts[targets].tolist(), pn_dict, matcher=matcher)
+        
+        # 各文章の結果を出力
+        for j, i in enumerate(targets):
+            row = df.loc[i]
+            clean_text = clean_texts[i]
+            score = sentiment.scores[j]
+            found_words = sentiment.explain(j)
+            if verbose:
                 print(f"\nテスト{i+1}:")
                 print(f"文章: {clean_text}")
-                score, found_words = analyze_sentiment(clean_text, pn_dict)
                 print(f"感情スコア: {score:.2f}")
                 print("検出された感情表現:")
-                for sentiment, words in found_words.items():
+                for sentiment_type, words in found_words.items():
                     if words:
-                        print(f"- {sentiment}: {', '.join(words)}")
+                        print(f"- {sentiment_type}: {', '.join(words)}")
                 print("-" * 50)
-                
-                # 結果をリストに追加
-                results.append({
-                    '講義名': row['講義名'],
-                    '平均評価ポイント': row['平均評価ポイント'],
-                    '自由記述': clean_text,
-                    '感情スコア': score,
-                    'ポジティブ表現': ', '.join(found_words['positive']),
-                    'ネガティブ表現': ', '.join(found_words['negative'])
-                })
+            
+            # 結果をリストに追加
+            results.append({
+                '講義名': row['講義名'],
+                '平均評価ポイント': row['平均評価ポイント'],
+                '自由記述': clean_text,
+                '感情スコア': score,
+                'ポジティブ表現': ', '.join(found_words['positive']),
+                'ネガティブ表現': ', '.join(found_words['negative']),
+                '評価開始日': period_starts[i]
+            })
         
         # 結果をDataFrameに変換
         results_df = pd.DataFrame(results)
         
         # 出力ディレクトリの作成
-        output_dir = os.path.join(os.path.dirname(file_path), 'analysis')
+        if output_dir is None:
+            output_dir = os.path.join(os.path.dirname(file_path), 'analysis')
         os.makedirs(output_dir, exist_ok=True)
         
         # 出力ファイル名を生成
         output_file = os.path.join(output_dir, os.path.splitext(file_name)[0] + '_analysis.csv')
         
         # CSVファイルに出力
-        results_df.to_csv(output_file, index=False, encoding='utf-8')
-        print(f"\n分析結果を {output_file} に保存しました。")
+        with instrumentation.stage("write"):
+            results_df.to_csv(output_file, index=False, encoding='utf-8')
+        if verbose:
+            print(f"\n分析結果を {output_file} に保存しました。")
+        if instrumentation.enabled:
+            print(instrumentation.summary(f"{file_name} の処理時間の内訳"))
+        return {'file': file_name, 'rows': len(results_df), 'output': output_file}
             
     except Exception as e:
         print(f"ファイル {file_path} の処理中にエラーが発生: {e}")
+        return None
 
 # メイン処理
 if __name__ == "__main__":
     # 感情辞書の読み込み
     pn_dict = load_pn_table()
+    # 見出し語・複数語表現で照合するマッチャー（読み込めない場合は表層形で照合する）
+    pn_matcher = load_pn_matcher()
     
     if pn_dict:
         # 指定されたディレクトリ内のCSVファイルを処理
@@ -148,5 +224,6 @@ if __name__ == "__main__":
             print("CSVファイルが見つかりません。")
         else:
             print(f"処理対象のCSVファイル: {len(csv_files)}個")
-            for csv_file in csv_files:
-                process_csv_file(csv_file, pn_dict)
\ No newline at end of file
+            with profile_session("test2"):
+                for csv_file in csv_files:
+                    process_csv_file(csv_file, pn_dict, matcher=pn_matcher)
\ No newline at end of file
@@ -0,0 +1,74 @@
+# 形態素解析バックエンド（MeCab / Sudachi A・B・C）の速度とメモリ使用量の比較
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'utils'))
+from morphological_analyzer import MorphologicalAnalyzer
+from tokenizer_backends import BACKENDS
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Sudachi', 'extracted_社会環境学.csv')
+
+
+def benchmark_backend(backend, texts, dictionary_path="", workers=1):
+    """
+    1つのバックエンドでテキストを解析し、処理速度とメモリ使用量を計測します。
+
+    Args:
+        backend (str): バックエンド名。
+        texts (list[str]): 解析対象のテキスト。
+        dictionary_path (str, optional): MeCabの辞書パス。
+        workers (int, optional): ワーカープロセス数。
+
+    Returns:
+        dict: backend, init_sec, analyze_sec, n_tokens, tokens_per_sec, peak_mb を含む辞書。
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    analyzer = MorphologicalAnalyzer(dictionary_path=dictionary_path, backend=backend)
+    init_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = analyzer.analyze_texts(texts, workers=workers)
+    analyze_sec = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_tokens = sum(len(tokens) for tokens in results)
+    return {
+        "backend": backend,
+        "init_sec": init_sec,
+        "analyze_sec": analyze_sec,
+        "n_tokens": n_tokens,
+        "tokens_per_sec": n_tokens / analyze_sec if analyze_sec else float("inf"),
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="形態素解析バックエンドの速度・メモリ比較")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="講義評価CSVのパス")
+    parser.add_argument("--column", default="自由記述", help="解析対象の列名")
+    parser.add_argument("--encoding", default="utf-8-sig", help="CSVのエンコーディング")
+    parser.add_argument("--backends", nargs="+", default=["mecab", "sudachi_a", "sudachi_b", "sudachi_c"],
+                        choices=BACKENDS, help="比較するバックエンド")
+    parser.add_argument("--dictionary-path", default="", help="MeCabの辞書パス")
+    parser.add_argument("--workers", type=int, default=1, help="ワーカープロセス数")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv, encoding=args.encoding)
+    texts = df[args.column].tolist()
+    print(f"対象: {args.csv}（{len(texts)}件）")
+
+    rows = []
+    for backend in args.backends:
+        try:
+            rows.append(benchmark_backend(backend, texts, args.dictionary_path, args.workers))
+        except RuntimeError as e:
+            print(f"{backend}: 初期化に失敗したためスキップします: {e}")
+
+    if rows:
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
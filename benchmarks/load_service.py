@@ -0,0 +1,160 @@
+# 解析サービス（src/utils/analysis_service.py）の負荷試験
+#
+# 使用例:
+#   python benchmarks/load_service.py --url http://127.0.0.1:8765 --concurrency 16 --requests 2000
+#   python benchmarks/load_service.py --spawn --workers 4 --concurrency 32   # サービスを起動して計測し、終了させる
+#
+# 同時に concurrency 本の接続から /analyze に1件ずつリクエストを送り、レイテンシの分布（p50/p90/p99）と
+# 1秒あたりの処理件数を表示します。--bulk を指定した場合は同じテキストを /analyze/bulk で1回に送った場合と比較します。
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SERVICE_SCRIPT = os.path.join(ROOT_DIR, 'src', 'utils', 'analysis_service.py')
+DEFAULT_CSV = os.path.join(ROOT_DIR, 'Sudachi', 'extracted_社会環境学.csv')
+
+
+def _worker(url, texts, latencies, errors):
+    # 1本の接続（keep-alive）で順にリクエストを送り、1件ごとのレイテンシを記録する
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+    for text in texts:
+        body = json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+        start = time.perf_counter()
+        try:
+            connection.request("POST", "/analyze", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except OSError as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run_load(url, texts, concurrency):
+    """
+    concurrency 本の接続から texts を分担して1件ずつ送信し、レイテンシと処理件数を計測します。
+
+    Returns:
+        dict: requests, errors, seconds, throughput, p50_ms, p90_ms, p99_ms, max_ms を含む辞書。
+    """
+    shares = [texts[i::concurrency] for i in range(concurrency)]
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_worker, args=(url, share, latencies, errors)) for share in shares]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    ms = np.asarray(latencies) * 1000
+    percentiles = np.percentile(ms, [50, 90, 99]) if len(ms) else [float("nan")] * 3
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": seconds,
+        "throughput": len(latencies) / seconds if seconds else float("inf"),
+        "p50_ms": percentiles[0],
+        "p90_ms": percentiles[1],
+        "p99_ms": percentiles[2],
+        "max_ms": ms.max() if len(ms) else float("nan"),
+    }
+
+
+def run_bulk(url, texts):
+    """
+    texts を /analyze/bulk で1回に送信し、全件の処理時間を計測します。
+
+    Returns:
+        dict: requests, seconds, throughput を含む辞書。
+    """
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=600)
+    body = "".join(json.dumps(text, ensure_ascii=False) + "\n" for text in texts).encode("utf-8")
+    start = time.perf_counter()
+    connection.request("POST", "/analyze/bulk", body, {"Content-Type": "application/x-ndjson"})
+    n_lines = sum(1 for line in connection.getresponse() if line.strip())
+    seconds = time.perf_counter() - start
+    connection.close()
+    return {"requests": n_lines, "seconds": seconds, "throughput": n_lines / seconds if seconds else float("inf")}
+
+
+def wait_for_service(url, timeout=60.0):
+    """
+    サービスの /health が応答するまで待ちます。
+
+    Raises:
+        TimeoutError: timeout 秒以内に応答しない場合。
+    """
+    target = urlparse(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=1)
+            connection.request("GET", "/health")
+            info = json.loads(connection.getresponse().read())
+            connection.close()
+            return info
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} が {timeout} 秒以内に起動しませんでした。")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="解析サービスの負荷試験（レイテンシ・スループット）")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="サービスのURL")
+    parser.add_argument("--spawn", action="store_true", help="サービスを子プロセスとして起動して計測する")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn 時のサービスのワーカープロセス数")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="--spawn 時のマイクロバッチの待ち時間の上限")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="送信するテキストの講義評価CSV")
+    parser.add_argument("--column", default="自由記述", help="送信するテキストの列名")
+    parser.add_argument("--encoding", default="utf-8-sig", help="CSVのエンコーディング")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="同時接続数（複数指定可）")
+    parser.add_argument("--requests", type=int, default=1000, help="1回の計測で送るリクエスト数")
+    parser.add_argument("--bulk", action="store_true", help="/analyze/bulk で1回に送った場合も計測する")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv, encoding=args.encoding)
+    corpus = [str(text) for text in df[args.column].dropna()]
+    # サービスのキャッシュや重複除去で処理が省略されないよう、番号を付けて異なるテキストにする
+    texts = [f"{corpus[i % len(corpus)]}（{i}）" for i in range(args.requests)]
+
+    process = None
+    if args.spawn:
+        port = urlparse(args.url).port
+        process = subprocess.Popen([sys.executable, SERVICE_SCRIPT, "--port", str(port), "--workers", str(args.workers),
+                                    "--max-wait-ms", str(args.max_wait_ms)])
+    try:
+        info = wait_for_service(args.url)
+        print(f"サービス: {args.url}（{info['backend']}、ワーカー {info['workers']}）、{len(texts)}件")
+        rows = []
+        for concurrency in args.concurrency:
+            before = wait_for_service(args.url)
+            row = {"mode": f"analyze x{concurrency}", **run_load(args.url, texts, concurrency)}
+            after = wait_for_service(args.url)
+            batches = after["batches"] - before["batches"]
+            row["batch_size"] = (after["requests"] - before["requests"]) / batches if batches else float("nan")
+            rows.append(row)
+        if args.bulk:
+            rows.append({"mode": "bulk", **run_bulk(args.url, texts)})
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,272 @@
+# 形態素解析 → 感情スコア → 学習 の各段階のベンチマーク
+#
+# 使用例:
+#   python benchmarks/run_pipeline_bench.py --scales 1 10 --output bench.json
+#   python benchmarks/run_pipeline_bench.py --scales 1 10 --baseline benchmarks/baseline.json
+#
+# 各段階・各倍率は新しいプロセスで実行し、処理件数・処理時間・スループット・ピークRSSをJSONに記録します。
+# --baseline を指定した場合は保存済みの結果と比較し、許容範囲を超えて遅く（大きく）なった段階を報告します。
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+import pandas as pd
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT_DIR, 'src', 'utils'))
+sys.path.append(os.path.join(ROOT_DIR, 'Sudachi'))
+sys.path.append(ROOT_DIR)
+
+DEFAULT_CSV = os.path.join(ROOT_DIR, 'Sudachi', 'extracted_社会環境学.csv')
+STAGES = ("preprocess", "preprocess_neologdn", "preprocess_batch", "analyze_text", "analyze_column", "extract_text", "analyze_sentiment", "train")
+
+
+def load_corpus(csv_path, scale):
+    """
+    ベンチマーク用のコーパスを読み込み、指定倍率に拡大します。
+    2倍目以降のコピーは末尾に「（k）」を付け、analyze_texts の重複除去やキャッシュで処理が省略されないようにします。
+
+    Args:
+        csv_path (str): 講義評価CSVのパス。
+        scale (int): 拡大倍率。
+
+    Returns:
+        pd.DataFrame: 講義名・平均評価ポイント・自由記述の列を持つDataFrame。
+    """
+    df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    copies = [df]
+    for k in range(1, scale):
+        copy = df.copy()
+        copy['自由記述'] = copy['自由記述'].astype(str) + f"（{k}）"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windowsでは resource モジュールがない
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _stage_preprocess(df, options):
+    from morphological_analyzer import MorphologicalAnalyzer
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"])
+    texts = df['自由記述'].tolist()
+    start = time.perf_counter()
+    for text in texts:
+        analyzer._preprocess_text(text)
+    return time.perf_counter() - start, len(texts), None
+
+
+def _stage_preprocess_neologdn(df, options):
+    # 絵文字などの除去を行わない、neologdn による正規化だけの前処理（比較用）
+    from morphological_analyzer import MorphologicalAnalyzer
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"], preprocess_steps=["neologdn"])
+    texts = df['自由記述'].tolist()
+    start = time.perf_counter()
+    for text in texts:
+        analyzer._preprocess_text(text)
+    return time.perf_counter() - start, len(texts), None
+
+
+def _stage_preprocess_batch(df, options):
+    from morphological_analyzer import MorphologicalAnalyzer
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"])
+    texts = df['自由記述'].tolist()
+    start = time.perf_counter()
+    analyzer.preprocess_texts(texts)
+    return time.perf_counter() - start, len(texts), None
+
+
+def _stage_analyze_text(df, options):
+    from morphological_analyzer import MorphologicalAnalyzer
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"])
+    texts = df['自由記述'].tolist()
+    start = time.perf_counter()
+    n_tokens = sum(len(analyzer.analyze_text(text)) for text in texts)
+    return time.perf_counter() - start, len(texts), n_tokens
+
+
+def _stage_analyze_column(df, options):
+    from morphological_analyzer import MorphologicalAnalyzer
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"])
+    start = time.perf_counter()
+    results = analyzer.analyze_column(df, '自由記述', workers=options["workers"])
+    elapsed = time.perf_counter() - start
+    return elapsed, len(df), sum(len(tokens) for tokens in results)
+
+
+def _stage_extract_text(df, options):
+    import test2
+    texts = df['自由記述'].tolist()
+    start = time.perf_counter()
+    for text in texts:
+        test2.extract_text(text)
+    return time.perf_counter() - start, len(texts), None
+
+
+def _stage_analyze_sentiment(df, options):
+    import test2
+    if options["pn_artifact"] is None or not os.path.isfile(options["pn_artifact"]):
+        return None
+    pn_dict = test2.PolarityLexicon.load(options["pn_artifact"])
+    texts = [text for text in df['自由記述'].apply(test2.extract_text) if text]
+    start = time.perf_counter()
+    for text in texts:
+        test2.analyze_sentiment(text, pn_dict)
+    return time.perf_counter() - start, len(texts), None
+
+
+def _stage_train(df, options):
+    from morphological_analyzer import MorphologicalAnalyzer
+    from sklearn.linear_model import LogisticRegression
+    import rating_word_analyzer
+
+    analyzer = MorphologicalAnalyzer(dictionary_path=options["dictionary_path"])
+    ratings = df['平均評価ポイント'].astype(str).str.extract(r'([0-9]+\.[0-9]+)')[0].astype(float)
+    labels = (ratings >= ratings.median()).astype(int)
+    if labels.nunique() < 2:
+        # 同じ講義だけのCSVでは評価が1種類になるため、学習時間の計測用に行番号の偶奇でラベルを作る
+        labels = pd.Series(df.index % 2, index=df.index)
+
+    start = time.perf_counter()
+    token_lists = rating_word_analyzer.tokenize_corpus(analyzer, df['自由記述'].tolist(), workers=options["workers"])
+    _, X = rating_word_analyzer.build_features(token_lists)
+    LogisticRegression(max_iter=1000).fit(X, labels)
+    return time.perf_counter() - start, len(df), None
+
+
+_STAGE_FUNCTIONS = {
+    "preprocess": _stage_preprocess,
+    "preprocess_neologdn": _stage_preprocess_neologdn,
+    "preprocess_batch": _stage_preprocess_batch,
+    "analyze_text": _stage_analyze_text,
+    "analyze_column": _stage_analyze_column,
+    "extract_text": _stage_extract_text,
+    "analyze_sentiment": _stage_analyze_sentiment,
+    "train": _stage_train,
+}
+
+
+def run_stage(stage, csv_path, scale, options):
+    """
+    1つの段階を実行して計測します。ピークRSSを段階ごとに分けるため、新しいプロセスから呼び出します。
+
+    Args:
+        stage (str): 段階名。
+        csv_path (str): 講義評価CSVのパス。
+        scale (int): 拡大倍率。
+        options (dict): dictionary_path, workers, pn_artifact を含む設定。
+
+    Returns:
+        dict or None: 計測結果。段階を実行できない場合は None。
+    """
+    df = load_corpus(csv_path, scale)
+    measured = _STAGE_FUNCTIONS[stage](df, options)
+    if measured is None:
+        return None
+    seconds, n_items, n_tokens = measured
+    return {
+        "stage": stage,
+        "scale": scale,
+        "n_items": n_items,
+        "seconds": seconds,
+        "items_per_sec": n_items / seconds if seconds else None,
+        "tokens_per_sec": n_tokens / seconds if n_tokens is not None and seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    計測結果を基準結果と比較し、性能が低下した項目を返します。
+
+    Args:
+        results (list[dict]): 今回の計測結果。
+        baseline (dict): 保存済みの基準結果（run_pipeline_bench.py の出力JSON）。
+        tolerance (float): 許容する低下率（0.1 なら10%）。
+
+    Returns:
+        list[str]: 性能低下の説明文のリスト。
+    """
+    previous = {(row["stage"], row["scale"]): row for row in baseline.get("results", [])}
+    regressions = []
+    for row in results:
+        base = previous.get((row["stage"], row["scale"]))
+        if base is None:
+            continue
+        if base.get("items_per_sec") and row["items_per_sec"] is not None:
+            if row["items_per_sec"] < base["items_per_sec"] * (1 - tolerance):
+                regressions.append(
+                    f"{row['stage']} x{row['scale']}: スループット {base['items_per_sec']:.1f} → {row['items_per_sec']:.1f} 件/秒"
+                )
+        if base.get("peak_rss_mb") and row["peak_rss_mb"] is not None:
+            if row["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                regressions.append(
+                    f"{row['stage']} x{row['scale']}: ピークRSS {base['peak_rss_mb']:.1f} → {row['peak_rss_mb']:.1f} MB"
+                )
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="形態素解析・感情スコア・学習の各段階のベンチマーク")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="講義評価CSVのパス")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100], help="コーパスの拡大倍率")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES, help="計測する段階")
+    parser.add_argument("--dictionary-path", default="", help="MeCabの辞書パス")
+    parser.add_argument("--workers", type=int, default=1, help="analyze_column のワーカープロセス数")
+    parser.add_argument("--pn-artifact", default=os.path.join(ROOT_DIR, 'data', 'processed', 'pn_ja.pnlx'),
+                        help="コンパイル済み感情極性辞書のパス（ない場合は analyze_sentiment を省略）")
+    parser.add_argument("--output", help="計測結果を保存するJSONのパス")
+    parser.add_argument("--baseline", help="比較する基準結果のJSONのパス")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="許容する性能低下率（デフォルト: 0.1）")
+    args = parser.parse_args()
+
+    options = {"dictionary_path": args.dictionary_path, "workers": args.workers, "pn_artifact": args.pn_artifact}
+    results = []
+    context = get_context("spawn")
+    for scale in args.scales:
+        for stage in args.stages:
+            # 段階ごとに新しいプロセスで実行し、ピークRSSが前の段階の影響を受けないようにする
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                row = executor.submit(run_stage, stage, args.csv, scale, options).result()
+            if row is None:
+                print(f"{stage} x{scale}: 実行に必要なファイルがないため省略しました")
+                continue
+            results.append(row)
+            rss = f"{row['peak_rss_mb']:.1f} MB" if row['peak_rss_mb'] is not None else "-"
+            print(f"{stage:<18} x{scale:<4} {row['seconds']:8.3f} 秒  {row['items_per_sec']:10.1f} 件/秒  ピークRSS {rss}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "csv": os.path.basename(args.csv),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を {args.output} に保存しました。")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n--- 性能低下が検出されました ---")
+            for message in regressions:
+                print(message)
+            sys.exit(1)
+        print("\n基準結果からの性能低下はありません。")
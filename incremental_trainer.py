@@ -0,0 +1,266 @@
+# 講義評価データを1ファイルずつ読み込み、ハッシュ特徴量で逐次学習する評価単語分析
+#
+# 使用例:
+#   python incremental_trainer.py "(CSV)2025 raw"                  # 新しいファイルだけを追加で学習
+#   python incremental_trainer.py data/processed/evaluations --task regress
+#   python incremental_trainer.py "(CSV)2025 raw" --reset          # 学習状態を消して最初から学習
+#
+# rating_word_analyzer.py はすべてのCSVを1つのDataFrameにまとめ、TF-IDFとロジスティック回帰をメモリ上で学習します。
+# こちらは1ファイル（Parquetデータセットの場合は1パーティションのファイル）ずつ HashingVectorizer で特徴量にし、
+# SGDClassifier / SGDRegressor の partial_fit で更新するため、年度を追加してもメモリ使用量は増えません。
+# 処理済みのファイルは学習状態のマニフェストに記録し、新しい学期のファイルが追加されたときはそのファイルだけで更新します。
+import argparse
+import json
+import os
+from collections import Counter
+import joblib
+import numpy as np
+from analysis_client import make_analyzer
+from ingest import list_evaluation_files, read_evaluation_columns
+from unit_store import file_digest
+from content_words import tokenize_corpus
+from rating_word_analyzer import identity_analyzer, top_terms
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'processed', 'incremental_model')
+# 学習の種類。classify は評価が閾値以上かどうか、regress は評価の値そのものを予測する
+TASKS = ('classify', 'regress')
+
+
+class BoundedVocabulary:
+    """
+    ハッシュ特徴量の列番号から元の語を引くための、大きさに上限のある対応表。
+    語ごとの文書頻度を数え、上限の2倍を超えたら頻度の低い語を捨てて上限まで減らします。
+    同じ列に複数の語が衝突した場合は、文書頻度の最も高い語をその列の名前として使います。
+    """
+
+    def __init__(self, max_size=100000):
+        """
+        Args:
+            max_size (int, optional): 保持する語の数の上限。デフォルトは 100000。
+        """
+        self.max_size = max_size
+        self.document_frequency = Counter()
+
+    def __len__(self):
+        return len(self.document_frequency)
+
+    def update(self, token_lists):
+        """
+        文書ごとのトークンのリストから文書頻度を更新します。
+        """
+        for tokens in token_lists:
+            self.document_frequency.update(set(tokens))
+        if len(self.document_frequency) > 2 * self.max_size:
+            self.document_frequency = Counter(dict(self.document_frequency.most_common(self.max_size)))
+
+    def column_names(self, vectorizer, columns):
+        """
+        指定した列番号に対応する語を返します。対応表にない列は '#列番号' とします。
+
+        Args:
+            vectorizer (HashingVectorizer): 特徴量の作成に使ったベクトライザ。
+            columns (np.ndarray): 列番号。
+
+        Returns:
+            np.ndarray: 列番号に対応する語。
+        """
+        terms = list(self.document_frequency)
+        names = {}
+        if terms:
+            hashed = vectorizer.transform([[term] for term in terms]).tocoo()
+            for row, column in zip(hashed.row, hashed.col):
+                term = terms[row]
+                current = names.get(column)
+                if current is None or self.document_frequency[term] > self.document_frequency[current]:
+                    names[column] = term
+        return np.array([names.get(column, f'#{column}') for column in columns], dtype=object)
+
+
+def read_unit(path):
+    """
+    学習の単位を1つ読み込み、自由記述と評価を返します。評価がない行は除きます。
+
+    Returns:
+        pd.DataFrame: 自由記述・rating の列を持つDataFrame。
+    """
+    df = read_evaluation_columns(path, ['自由記述', 'rating'])
+    return df.dropna(subset=['rating']).reset_index(drop=True)
+
+
+class IncrementalRatingTrainer:
+    """
+    学習状態（モデル・語の対応表・処理済みファイルのマニフェスト）を保存しながら、ファイル単位で逐次学習するクラス。
+    """
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR, task='classify', n_features=2 ** 20, vocabulary_size=100000,
+                 threshold=None, analyzer=None, workers=1):
+        """
+        Args:
+            state_dir (str, optional): 学習状態の保存先。既存の状態がある場合は読み込んで続きから学習します。
+            task (str, optional): 'classify' または 'regress'。デフォルトは 'classify'。
+            n_features (int, optional): ハッシュ特徴量の次元数。デフォルトは 2**20。
+            vocabulary_size (int, optional): 語の対応表に保持する語の数の上限。デフォルトは 100000。
+            threshold (float, optional): classify で高評価とみなす閾値。None の場合は最初のファイルの中央値に固定します。
+                                         続きから学習する場合は保存済みの閾値と同じ値を指定してください。
+            analyzer (MorphologicalAnalyzer, optional): 形態素解析器。None の場合は make_analyzer で作成します。
+            workers (int, optional): 形態素解析のワーカープロセス数。
+
+        Raises:
+            ValueError: task が不正な場合、または保存済みの状態と設定が一致しない場合。
+        """
+        if task not in TASKS:
+            raise ValueError(f"task には {TASKS} のいずれかを指定してください: {task}")
+        self.state_dir = state_dir
+        self.analyzer = analyzer or make_analyzer()
+        self.workers = workers
+        self.manifest = self._load_manifest() or {
+            'task': task, 'n_features': n_features, 'threshold': threshold, 'n_documents': 0, 'units': {},
+        }
+        if self.manifest['task'] != task or self.manifest['n_features'] != n_features:
+            raise ValueError("保存済みの学習状態と task / n_features が一致しません。--reset で学習し直してください。")
+        if task == 'classify' and threshold is not None:
+            if self.manifest['threshold'] is None:
+                self.manifest['threshold'] = float(threshold)
+            elif self.manifest['threshold'] != threshold:
+                raise ValueError(f"保存済みの学習状態の閾値（{self.manifest['threshold']}）と threshold（{threshold}）が"
+                                 "一致しません。--reset で学習し直してください。")
+        self.vectorizer = HashingVectorizer(analyzer=identity_analyzer, n_features=n_features,
+                                            alternate_sign=False, norm='l2')
+        self.model = self._load('model.joblib')
+        if self.model is None:
+            self.model = SGDClassifier(loss='log_loss', random_state=0) if task == 'classify' else SGDRegressor(random_state=0)
+        self.vocabulary = self._load('vocabulary.joblib')
+        if self.vocabulary is None:
+            self.vocabulary = BoundedVocabulary(vocabulary_size)
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _load(self, name):
+        return joblib.load(self._path(name)) if os.path.isfile(self._path(name)) else None
+
+    def _load_manifest(self):
+        if not os.path.isfile(self._path('state.json')):
+            return None
+        with open(self._path('state.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self):
+        """
+        モデル・語の対応表・マニフェストを保存します。
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        joblib.dump(self.model, self._path('model.joblib'))
+        joblib.dump(self.vocabulary, self._path('vocabulary.joblib'))
+        tmp_path = self._path('state.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path('state.json'))
+
+    def partial_fit(self, token_lists, ratings):
+        """
+        1単位分のトークン化済み文書と評価でモデルを更新します。
+        """
+        X = self.vectorizer.transform(token_lists)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        if self.manifest['task'] == 'classify':
+            if self.manifest['threshold'] is None:
+                self.manifest['threshold'] = float(np.median(ratings))
+            y = (ratings >= self.manifest['threshold']).astype(int)
+            self.model.partial_fit(X, y, classes=np.array([0, 1]))
+        else:
+            self.model.partial_fit(X, ratings)
+        self.vocabulary.update(token_lists)
+        self.manifest['n_documents'] += len(ratings)
+
+    def fit_path(self, path):
+        """
+        ディレクトリ内の未処理のファイルだけで逐次学習し、1ファイルごとに学習状態を保存します。
+        処理済みかどうかはファイルの内容（SHA-256）で判定するため、同じ内容のファイルは名前が変わっても学習しません。
+        処理済みのファイルの内容が変わっていた場合は、二重に学習しないよう読み飛ばして警告します。
+
+        Args:
+            path (str): 講義評価CSVのディレクトリ、または取り込み済みのParquetデータセット。
+
+        Returns:
+            dict: trained（学習したファイル）, skipped（処理済み）, changed（内容が変わった処理済みファイル）のリスト。
+        """
+        summary = {'trained': [], 'skipped': [], 'changed': []}
+        trained_digests = set(self.manifest['units'].values())
+        for unit in list_evaluation_files(path):
+            key = os.path.relpath(unit, path)
+            digest = file_digest(unit)
+            recorded = self.manifest['units'].get(key)
+            if digest in trained_digests:
+                if recorded != digest:
+                    # 名前だけが変わった（取り込み直したパーティションなど）。現在の名前で記録し直す
+                    self.manifest['units'][key] = digest
+                    self.save()
+                summary['skipped'].append(key)
+                continue
+            if recorded is not None:
+                summary['changed'].append(key)
+                continue
+            df = read_unit(unit)
+            if not df.empty:
+                token_lists = tokenize_corpus(self.analyzer, df['自由記述'].tolist(), workers=self.workers)
+                self.partial_fit(token_lists, df['rating'].to_numpy())
+            self.manifest['units'][key] = digest
+            trained_digests.add(digest)
+            self.save()
+            summary['trained'].append(key)
+        return summary
+
+    def top_terms(self, n=20):
+        """
+        係数の大きい語と小さい語を n 個ずつ返します。
+
+        Returns:
+            tuple[list[tuple[float, str]], list[tuple[float, str]]]: (係数の大きい順, 係数の小さい順) の (係数, 語) のリスト。
+        """
+        if not hasattr(self.model, 'coef_'):
+            return [], []
+        coef = np.ravel(self.model.coef_)
+        positive, negative = top_terms(coef, np.arange(len(coef)), n)
+        columns = np.array([column for _, column in positive + negative], dtype=np.int64)
+        names = dict(zip(columns, self.vocabulary.column_names(self.vectorizer, columns)))
+        return ([(w, names[c]) for w, c in positive], [(w, names[c]) for w, c in negative])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="講義評価データのファイル単位の逐次学習")
+    parser.add_argument("data", help="講義評価CSVのディレクトリ、または取り込み済みのParquetデータセット")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR, help="学習状態の保存先")
+    parser.add_argument("--task", default="classify", choices=TASKS, help="classify（評価の高低）または regress（評価の値）")
+    parser.add_argument("--threshold", type=float, help="高評価とみなす評価の閾値（デフォルト: 最初のファイルの中央値）")
+    parser.add_argument("--n-features", type=int, default=2 ** 20, help="ハッシュ特徴量の次元数")
+    parser.add_argument("--vocabulary-size", type=int, default=100000, help="語の対応表に保持する語の数の上限")
+    parser.add_argument("--workers", type=int, default=1, help="形態素解析のワーカープロセス数")
+    parser.add_argument("--top-k", type=int, default=20, help="表示する単語の数")
+    parser.add_argument("--reset", action="store_true", help="保存済みの学習状態を消して最初から学習する")
+    args = parser.parse_args()
+
+    if args.reset:
+        for name in ('state.json', 'model.joblib', 'vocabulary.joblib'):
+            path = os.path.join(args.state_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    trainer = IncrementalRatingTrainer(args.state_dir, args.task, args.n_features, args.vocabulary_size,
+                                       args.threshold, workers=args.workers)
+    summary = trainer.fit_path(args.data)
+    print(f"学習 {len(summary['trained'])}ファイル、処理済みのため省略 {len(summary['skipped'])}ファイル"
+          f"（累計 {trainer.manifest['n_documents']}件）")
+    for key in summary['changed']:
+        print(f"警告: 学習済みの {key} の内容が変わっています。反映するには --reset で学習し直してください。")
+
+    top_positive, top_negative = trainer.top_terms(args.top_k)
+    print('--- 高評価に関連する単語 ---')
+    for w, t in top_positive:
+        print(f'{t}\t{w:.4f}')
+
+    print('\n--- 低評価に関連する単語 ---')
+    for w, t in top_negative:
+        print(f'{t}\t{w:.4f}')
@@ -1,70 +1,371 @@
+import argparse
+import json
 import os
-import glob
-import re
+import shutil
+import tempfile
+import joblib
+import numpy as np
 import pandas as pd
-from morphological_analyzer import MorphologicalAnalyzer
+from joblib import Parallel, delayed
+from scipy import sparse
+from analysis_client import make_analyzer
+from content_words import tokenize_corpus
+from dedup import add_duplicate_columns
+from ingest import list_evaluation_files, load_evaluations
+from instrumentation import profile_session
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
 
+# 学習に使った中間結果（トークン列・ベクトライザ・TF-IDF行列・評価・モデル）の保存先
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'processed', 'rating_words')
 
-def load_dataset(raw_dir):
-    data_frames = []
-    for path in glob.glob(os.path.join(raw_dir, '*.csv')):
-        try:
-            df = pd.read_csv(path, encoding='utf-8-sig')
-        except Exception:
-            continue
-        if '平均評価ポイント' not in df.columns or '自由記述' not in df.columns:
-            continue
-        tmp = df[['平均評価ポイント', '自由記述']].copy()
-        tmp = tmp.dropna(subset=['自由記述'])
-        def extract_rating(val):
-            m = re.search(r'([0-9]+\.[0-9]+)', str(val))
-            return float(m.group(1)) if m else None
-        tmp['rating'] = tmp['平均評価ポイント'].apply(extract_rating)
-        tmp = tmp.dropna(subset=['rating'])
-        data_frames.append(tmp[['自由記述', 'rating']])
-    if data_frames:
-        return pd.concat(data_frames, ignore_index=True)
-    return pd.DataFrame(columns=['自由記述', 'rating'])
-
-
-def tokenize_text(analyzer):
-    def tokenizer(text):
-        tokens = []
-        for token in analyzer.analyze_text(text):
-            pos = token[1]
-            base = token[7] if token[7] else token[0]
-            if pos in ('名詞', '動詞', '形容詞', '形容動詞'):
-                tokens.append(base)
-        return tokens
-    return tokenizer
 
+def load_dataset(raw_dir, dedup_threshold=None):
+    """
+    取り込み済みのParquetデータセット、CSV・Excelのディレクトリ、またはExcelブックから自由記述と評価を読み込みます。
+    dedup_threshold を指定した場合は、重複・ほぼ重複のコメントのうち評価も同じものを代表の1件にまとめ、
+    まとめた件数を weight 列に入れます（別の学部のスクレイピング結果との重なりや定型文を1回だけ解析・学習するため）。
 
-def main():
-    raw_dir = '(CSV)2025 raw'
-    analyzer = MorphologicalAnalyzer()
-    df = load_dataset(raw_dir)
-    if df.empty:
-        print('データが読み込めませんでした。')
-        return
+    Args:
+        raw_dir (str): 講義評価CSV・Excelのディレクトリ、Excelブック、または取り込み済みのParquetデータセット。
+        dedup_threshold (float, optional): ほぼ重複とみなす Jaccard 係数の閾値。None の場合はまとめません。
 
-    median_rating = df['rating'].median()
-    df['label'] = (df['rating'] >= median_rating).astype(int)
+    Returns:
+        pd.DataFrame: 自由記述・rating・weight の列を持つDataFrame。
+    """
+    df = load_evaluations(raw_dir, columns=['自由記述', 'rating'])
+    df = df.dropna(subset=['rating']).reset_index(drop=True)
+    if dedup_threshold is None:
+        return df.assign(weight=1)
+    df = add_duplicate_columns(df, threshold=dedup_threshold)
+    groups = df.groupby(['cluster_id', 'rating'], sort=False)
+    representatives = df.loc[groups.head(1).index, ['自由記述', 'rating']]
+    return representatives.assign(weight=groups.size().to_numpy()).reset_index(drop=True)
 
-    vectorizer = TfidfVectorizer(tokenizer=tokenize_text(analyzer))
-    X = vectorizer.fit_transform(df['自由記述'])
-    y = df['label']
 
-    model = LogisticRegression(max_iter=1000)
-    model.fit(X, y)
+def dataset_key(raw_dir, analyzer, dedup_threshold=None):
+    """
+    トークン列を作ったときのデータの読み込み条件を返します。保存済みのトークン列を使えるかどうかの判定に使います。
+    入力ファイルはサイズと更新日時で比べるため、ファイルを追加・変更・削除した場合は読み込みからやり直します。
 
-    feature_names = vectorizer.get_feature_names_out()
+    Args:
+        raw_dir (str): load_dataset に渡すパス。
+        analyzer (MorphologicalAnalyzer): トークン列の作成に使う形態素解析器。
+        dedup_threshold (float, optional): load_dataset に渡す閾値。
+
+    Returns:
+        dict: path（絶対パス）, files（[相対パス, サイズ, 更新日時]のリスト）, dictionary_id, dedup_threshold を含む辞書。
+    """
+    path = os.path.abspath(raw_dir)
+    base = path if os.path.isdir(path) else os.path.dirname(path)
+    files = []
+    for file in list_evaluation_files(path):
+        stat = os.stat(file)
+        files.append([os.path.relpath(file, base), stat.st_size, stat.st_mtime_ns])
+    return {'path': path, 'files': files, 'dictionary_id': analyzer.dictionary_id, 'dedup_threshold': dedup_threshold}
+
+
+def identity_analyzer(tokens):
+    # トークン化済みの文書をそのまま返す（保存したベクトライザを読み込めるようモジュールの関数にしておく）
+    return tokens
+
+
+def build_features(token_lists, **vectorizer_options):
+    """
+    トークン化済みのコーパスからTF-IDF行列を作成します。
+
+    Args:
+        token_lists (list[list[str]]): 文書ごとの原形のリスト。
+        **vectorizer_options: TfidfVectorizer に渡す追加の引数（min_df など）。
+
+    Returns:
+        tuple[TfidfVectorizer, scipy.sparse.csr_matrix]: (学習済みのベクトライザ, TF-IDF行列)。
+    """
+    vectorizer = TfidfVectorizer(analyzer=identity_analyzer, **vectorizer_options)
+    X = vectorizer.fit_transform(token_lists)
+    return vectorizer, X.tocsr()
+
+
+def make_labels(ratings, threshold=None):
+    """
+    評価を閾値以上なら1、未満なら0のラベルに変換します。閾値を省略した場合は中央値を使います。
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    if threshold is None:
+        threshold = np.median(ratings)
+    return (ratings >= threshold).astype(int)
+
+
+def top_terms(coef, feature_names, n=20):
+    """
+    係数の大きい語と小さい語を n 個ずつ返します。語彙全体を並べ替えず argpartition で候補を絞ります。
+
+    Args:
+        coef (np.ndarray): 語ごとの係数。
+        feature_names (np.ndarray): 係数に対応する語。
+        n (int, optional): 取り出す語の数。デフォルトは 20。
+
+    Returns:
+        tuple[list[tuple[float, str]], list[tuple[float, str]]]: (係数の大きい順, 係数の小さい順) の (係数, 語) のリスト。
+    """
+    n = min(n, len(coef))
+    if n == 0:
+        return [], []
+    top = np.argpartition(-coef, n - 1)[:n]
+    bottom = np.argpartition(coef, n - 1)[:n]
+    top = top[np.argsort(-coef[top])]
+    bottom = bottom[np.argsort(coef[bottom])]
+    return ([(coef[i], feature_names[i]) for i in top],
+            [(coef[i], feature_names[i]) for i in bottom])
+
+
+def save_artifacts(artifact_dir, token_lists=None, vectorizer=None, X=None, ratings=None, model=None,
+                   weights=None, dataset=None):
+    """
+    学習に使った中間結果を保存します。None の項目は保存しません。
+
+    Args:
+        artifact_dir (str): 保存先ディレクトリ。
+        token_lists (list[list[str]], optional): トークン化済みのコーパス。
+        vectorizer (TfidfVectorizer, optional): 学習済みのベクトライザ。
+        X (scipy.sparse.csr_matrix, optional): TF-IDF行列。
+        ratings (np.ndarray, optional): 文書ごとの評価。
+        model (LogisticRegression, optional): 学習済みのモデル。
+        weights (np.ndarray, optional): 文書ごとの重み（まとめた重複コメントの件数）。
+        dataset (dict, optional): トークン列を作ったときのデータの読み込み条件（dataset_key の返り値）。
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    if token_lists is not None:
+        joblib.dump(token_lists, os.path.join(artifact_dir, 'tokens.joblib'))
+    if vectorizer is not None:
+        joblib.dump(vectorizer, os.path.join(artifact_dir, 'vectorizer.joblib'))
+    if X is not None:
+        sparse.save_npz(os.path.join(artifact_dir, 'tfidf.npz'), X)
+    if ratings is not None:
+        np.save(os.path.join(artifact_dir, 'ratings.npy'), np.asarray(ratings, dtype=np.float64))
+    if model is not None:
+        joblib.dump(model, os.path.join(artifact_dir, 'model.joblib'))
+    if weights is not None:
+        np.save(os.path.join(artifact_dir, 'weights.npy'), np.asarray(weights, dtype=np.float64))
+    if dataset is not None:
+        with open(os.path.join(artifact_dir, 'dataset.json'), 'w', encoding='utf-8') as f:
+            json.dump(dataset, f)
+
+
+def load_artifacts(artifact_dir):
+    """
+    save_artifacts で保存した中間結果を読み込みます。存在しない項目は None になります。
+
+    Returns:
+        dict: token_lists, vectorizer, X, ratings, model, weights, dataset をキーとする辞書。
+    """
+    def _path(name):
+        path = os.path.join(artifact_dir, name)
+        return path if os.path.isfile(path) else None
+
+    paths = {name: _path(name) for name in ('tokens.joblib', 'vectorizer.joblib', 'tfidf.npz', 'ratings.npy', 'model.joblib',
+                                            'weights.npy', 'dataset.json')}
+    dataset = None
+    if paths['dataset.json']:
+        with open(paths['dataset.json'], encoding='utf-8') as f:
+            dataset = json.load(f)
+    return {
+        'token_lists': joblib.load(paths['tokens.joblib']) if paths['tokens.joblib'] else None,
+        'vectorizer': joblib.load(paths['vectorizer.joblib']) if paths['vectorizer.joblib'] else None,
+        'X': sparse.load_npz(paths['tfidf.npz']).tocsr() if paths['tfidf.npz'] else None,
+        'ratings': np.load(paths['ratings.npy']) if paths['ratings.npy'] else None,
+        'model': joblib.load(paths['model.joblib']) if paths['model.joblib'] else None,
+        'weights': np.load(paths['weights.npy']) if paths['weights.npy'] else None,
+        'dataset': dataset,
+    }
+
+
+def prepare_features(raw_dir, artifact_dir, analyzer, workers=1, retokenize=False, min_df=1, dedup_threshold=None):
+    """
+    保存済みのトークン列・TF-IDF行列があれば読み込み、なければ作成して保存します。
+    min_df を変えた場合はトークン列から行列だけを作り直します。
+    データのパス・入力ファイル・辞書・dedup_threshold のいずれかが保存済みのトークン列を作ったときと異なる場合は、
+    データの読み込みからやり直します（dataset_key）。
+
+    Returns:
+        tuple[TfidfVectorizer, scipy.sparse.csr_matrix, np.ndarray, np.ndarray] or None:
+            (ベクトライザ, TF-IDF行列, 評価, 重み)。データがない場合は None。
+    """
+    instrumentation = analyzer.instrumentation
+    dataset = dataset_key(raw_dir, analyzer, dedup_threshold)
+    artifacts = load_artifacts(artifact_dir) if not retokenize else {}
+    token_lists, ratings, weights = artifacts.get('token_lists'), artifacts.get('ratings'), artifacts.get('weights')
+    if token_lists is None or ratings is None or weights is None or artifacts.get('dataset') != dataset:
+        with instrumentation.stage("load_dataset"):
+            df = load_dataset(raw_dir, dedup_threshold)
+        if df.empty:
+            return None
+        with instrumentation.stage("tokenize"):
+            token_lists = tokenize_corpus(analyzer, df['自由記述'].tolist(), workers=workers)
+        ratings = df['rating'].to_numpy(dtype=np.float64)
+        weights = df['weight'].to_numpy(dtype=np.float64)
+        save_artifacts(artifact_dir, token_lists=token_lists, ratings=ratings, weights=weights, dataset=dataset)
+        artifacts = {}
+
+    vectorizer, X = artifacts.get('vectorizer'), artifacts.get('X')
+    if vectorizer is None or X is None or vectorizer.min_df != min_df:
+        with instrumentation.stage("vectorize"):
+            vectorizer, X = build_features(token_lists, min_df=min_df)
+        save_artifacts(artifact_dir, vectorizer=vectorizer, X=X)
+    return vectorizer, X, ratings, weights
+
+
+def share_matrix(X, directory):
+    """
+    CSR行列の配列を .npy として保存し、ワーカープロセスがメモリマップで共有できるようにします。
+
+    Args:
+        X (scipy.sparse.csr_matrix): 共有する行列。
+        directory (str): 保存先ディレクトリ。
+
+    Returns:
+        dict: 各配列のパスと行列の形状。open_shared_matrix に渡します。
+    """
+    spec = {'shape': X.shape}
+    for name in ('data', 'indices', 'indptr'):
+        path = os.path.join(directory, f'{name}.npy')
+        np.save(path, getattr(X, name))
+        spec[name] = path
+    return spec
+
+
+def open_shared_matrix(spec):
+    """
+    share_matrix で保存した行列をメモリマップで開きます（配列はコピーしません）。
+    """
+    arrays = [np.load(spec[name], mmap_mode='r') for name in ('data', 'indices', 'indptr')]
+    return sparse.csr_matrix(tuple(arrays), shape=spec['shape'], copy=False)
+
+
+def _fit_resample(spec, y, sample_weight, train_rows, test_rows, C, top_k):
+    # 1回分の再標本で学習し、係数・上位語・検証データの正解率を返す（重みは学習と検証の両方の行に合わせて取り出す）
+    X = open_shared_matrix(spec)
+    model = LogisticRegression(C=C, max_iter=1000)
+    model.fit(X[train_rows], y[train_rows], sample_weight=sample_weight[train_rows] if sample_weight is not None else None)
     coef = model.coef_[0]
+    k = min(top_k, len(coef))
+    selected = np.concatenate([np.argpartition(-coef, k - 1)[:k], np.argpartition(coef, k - 1)[:k]])
+    test_weight = sample_weight[test_rows] if sample_weight is not None else None
+    score = model.score(X[test_rows], y[test_rows], sample_weight=test_weight) if len(test_rows) else np.nan
+    return coef.astype(np.float32), selected, score
+
+
+def _resamples(y, n_bootstrap, n_folds, seed):
+    # (種類, 学習に使う行, 検証に使う行) を順に作る。ブートストラップの検証には選ばれなかった行（OOB）を使う
+    rng = np.random.default_rng(seed)
+    n = len(y)
+    if n_folds > 1:
+        folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+        for train_rows, test_rows in folds.split(np.zeros(n), y):
+            yield 'cv', train_rows, test_rows
+    for _ in range(n_bootstrap):
+        train_rows = rng.integers(0, n, size=n)
+        while np.unique(y[train_rows]).size < 2:
+            train_rows = rng.integers(0, n, size=n)
+        test_rows = np.setdiff1d(np.arange(n), train_rows, assume_unique=False)
+        yield 'bootstrap', train_rows, test_rows
+
+
+def coefficient_stability(X, y, feature_names, n_bootstrap=100, n_folds=5, C=1.0, top_k=20,
+                          n_jobs=-1, confidence=0.95, seed=0, sample_weight=None):
+    """
+    k分割交差検証とブートストラップで学習を繰り返し、語ごとの係数の安定性を集計します。
+    TF-IDF行列は一時ディレクトリにメモリマップ用の配列として1回だけ保存し、各ワーカーはそれを共有します
+    （タスクごとに行列をシリアライズしません）。
+
+    Args:
+        X (scipy.sparse.csr_matrix): TF-IDF行列。
+        y (np.ndarray): ラベル。
+        feature_names (np.ndarray): 列に対応する語。
+        n_bootstrap (int, optional): ブートストラップの回数。デフォルトは 100。
+        n_folds (int, optional): 交差検証の分割数。1以下の場合は交差検証を行いません。デフォルトは 5。
+        C (float, optional): ロジスティック回帰の正則化の強さの逆数。
+        top_k (int, optional): 選択頻度の集計で「選ばれた」とみなす上位・下位の語の数。デフォルトは 20。
+        n_jobs (int, optional): 並列数。-1 の場合はすべてのCPUを使います。
+        confidence (float, optional): 信頼区間の水準。デフォルトは 0.95。
+        seed (int, optional): 乱数シード。
+        sample_weight (np.ndarray, optional): 行ごとの学習の重み（まとめたコメントの件数など）。
+                                              各再標本の学習と検証の正解率に、その行の重みを使います。
 
-    n = 20
-    top_positive = sorted(zip(coef, feature_names), reverse=True)[:n]
-    top_negative = sorted(zip(coef, feature_names))[:n]
+    Returns:
+        tuple[pd.DataFrame, dict]: (語ごとの mean, std, ci_low, ci_high, selection_freq を持つDataFrame,
+                                    {'cv': 正解率のリスト, 'bootstrap': OOB正解率のリスト})。
+    """
+    y = np.asarray(y)
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight, dtype=np.float64)
+    resamples = list(_resamples(y, n_bootstrap, n_folds, seed))
+    workdir = tempfile.mkdtemp(prefix='rating_words_')
+    try:
+        spec = share_matrix(X.tocsr(), workdir)
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_resample)(spec, y, sample_weight, train_rows, test_rows, C, top_k)
+            for _, train_rows, test_rows in resamples
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    coefs = np.vstack([coef for coef, _, _ in results])
+    selected = np.bincount(np.concatenate([rows for _, rows, _ in results]), minlength=coefs.shape[1])
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(coefs, [alpha, 1 - alpha], axis=0)
+    stats = pd.DataFrame({
+        'term': feature_names,
+        'mean': coefs.mean(axis=0),
+        'std': coefs.std(axis=0),
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'selection_freq': selected / len(results),
+    })
+    scores = {'cv': [], 'bootstrap': []}
+    for (kind, _, _), (_, _, score) in zip(resamples, results):
+        scores[kind].append(score)
+    return stats, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="講義評価の高低に関連する単語の抽出")
+    parser.add_argument("--data", default='(CSV)2025 raw', help="講義評価CSV・Excelのディレクトリ、Excelブック、または取り込み済みのParquetデータセット")
+    parser.add_argument("--artifacts", default=DEFAULT_ARTIFACT_DIR, help="中間結果の保存先")
+    parser.add_argument("--retokenize", action="store_true", help="保存済みのトークン列を使わずに形態素解析からやり直す")
+    parser.add_argument("--workers", type=int, default=1, help="形態素解析のワーカープロセス数")
+    parser.add_argument("--min-df", type=int, default=1, help="語彙に含める最小文書数")
+    parser.add_argument("--threshold", type=float, help="高評価とみなす評価の閾値（デフォルト: 中央値）")
+    parser.add_argument("--C", type=float, default=1.0, help="ロジスティック回帰の正則化の強さの逆数")
+    parser.add_argument("--top-k", type=int, default=20, help="表示する単語の数")
+    parser.add_argument("--bootstrap", type=int, default=0, help="係数の安定性を調べるブートストラップの回数")
+    parser.add_argument("--cv", type=int, default=0, help="係数の安定性を調べる交差検証の分割数")
+    parser.add_argument("--dedup", type=float, metavar="THRESHOLD",
+                        help="重複・ほぼ重複のコメント（評価も同じもの）を1件にまとめる Jaccard 係数の閾値（例: 0.8）")
+    parser.add_argument("--weight-duplicates", action="store_true",
+                        help="まとめたコメントの件数を学習の重みに使う（デフォルトは1件として学習）")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="安定性の計算の並列数（-1 ですべてのCPU）")
+    args = parser.parse_args()
+
+    analyzer = make_analyzer()  # ANALYZER_SERVICE_URL が設定されている場合は解析サービスを使う
+    instrumentation = analyzer.instrumentation
+    prepared = prepare_features(args.data, args.artifacts, analyzer, args.workers, args.retokenize, args.min_df,
+                                args.dedup)
+    if prepared is None:
+        print('データが読み込めませんでした。')
+        return
+    vectorizer, X, ratings, weights = prepared
+    y = make_labels(ratings, args.threshold)
+
+    sample_weight = weights if args.weight_duplicates else None
+    with instrumentation.stage("fit"):
+        model = LogisticRegression(C=args.C, max_iter=1000)
+        model.fit(X, y, sample_weight=sample_weight)
+    save_artifacts(args.artifacts, model=model)
+
+    feature_names = vectorizer.get_feature_names_out()
+    top_positive, top_negative = top_terms(model.coef_[0], feature_names, args.top_k)
 
     print('--- 高評価に関連する単語 ---')
     for w, t in top_positive:
@@ -74,6 +375,31 @@ def main():
     for w, t in top_negative:
         print(f'{t}\t{w:.4f}')
 
+    if args.bootstrap > 0 or args.cv > 1:
+        with instrumentation.stage("stability"):
+            stats, scores = coefficient_stability(X, y, feature_names, args.bootstrap, args.cv, args.C,
+                                                  args.top_k, args.n_jobs, sample_weight=sample_weight)
+        stats_path = os.path.join(args.artifacts, 'stability.csv')
+        stats.to_csv(stats_path, index=False, encoding='utf-8-sig')
+
+        print('\n--- 係数の安定性（平均・95%信頼区間・上位語に選ばれた割合） ---')
+        if scores['cv']:
+            print(f"交差検証の正解率: {np.mean(scores['cv']):.4f} ± {np.std(scores['cv']):.4f}")
+        if scores['bootstrap']:
+            print(f"ブートストラップ（OOB）の正解率: {np.nanmean(scores['bootstrap']):.4f}")
+        stable = stats.sort_values('selection_freq', ascending=False).head(args.top_k)
+        for row in stable.itertuples():
+            print(f'{row.term}\t{row.mean:.4f}\t[{row.ci_low:.4f}, {row.ci_high:.4f}]\t{row.selection_freq:.2f}')
+        print(f"\n語ごとの集計を {stats_path} に保存しました。")
+
+    if instrumentation.enabled:
+        print()
+        print(instrumentation.summary())
+
 
 if __name__ == '__main__':
-    main()
+    # 保存するベクトライザが __main__ ではなくこのモジュールの identity_analyzer を参照するよう、
+    # モジュールとして読み込み直した main を実行する（他のスクリプトからも load_artifacts できるようにするため）
+    import rating_word_analyzer
+    with profile_session("rating_word_analyzer"):
+        rating_word_analyzer.main()
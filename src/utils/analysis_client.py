@@ -0,0 +1,185 @@
+import http.client
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+import pandas as pd
+from instrumentation import instrumentation_from_env
+
+# 解析サービスのURLを指定する環境変数（例: http://127.0.0.1:8765）
+SERVICE_URL_ENV = "ANALYZER_SERVICE_URL"
+# サービスに接続できなかった後、再び接続を試みるまでの秒数
+RETRY_SECONDS = 30.0
+# サービスに接続できない・応答が途中で切れたとみなし、プロセス内で解析する例外
+# （http.client.IncompleteRead など応答の読み込みの失敗は OSError のサブクラスではない）
+_CONNECTION_ERRORS = (OSError, http.client.HTTPException)
+
+
+def make_analyzer(**options):
+    """
+    スクリプトで使う形態素解析器を作成します。
+    環境変数 ANALYZER_SERVICE_URL が設定されている場合は AnalysisClient（サービスに接続できない場合は options で作成した
+    MorphologicalAnalyzer で解析）、設定されていない場合は MorphologicalAnalyzer を返します。
+
+    Args:
+        **options: MorphologicalAnalyzer に渡す引数（dictionary_path, cache, backend など）。
+
+    Returns:
+        AnalysisClient or MorphologicalAnalyzer: 形態素解析器。
+    """
+    from morphological_analyzer import MorphologicalAnalyzer
+
+    if os.environ.get(SERVICE_URL_ENV):
+        return AnalysisClient(fallback=lambda: MorphologicalAnalyzer(**options))
+    return MorphologicalAnalyzer(**options)
+
+
+class AnalysisClient:
+    """
+    analysis_service の形態素解析サービスを使うクライアント。
+    MorphologicalAnalyzer と同じ analyze_text / analyze_texts / load_csv / dictionary_id を持つため、解析器の代わりに渡せます。
+    サービスに接続できない場合は、プロセス内の解析器（初回だけ作成）で解析します。
+    """
+
+    def __init__(self, url=None, fallback=None, timeout=30.0):
+        """
+        Args:
+            url (str, optional): サービスのURL。None の場合は環境変数 ANALYZER_SERVICE_URL。どちらもない場合は常にプロセス内で解析します。
+            fallback (callable, optional): プロセス内の解析器を作成する関数。None の場合は MorphologicalAnalyzer()。
+            timeout (float, optional): 1回のリクエストのタイムアウト（秒）。
+        """
+        self.url = (url or os.environ.get(SERVICE_URL_ENV) or "").rstrip("/") or None
+        self.timeout = timeout
+        self.instrumentation = instrumentation_from_env()
+        self._fallback_factory = fallback
+        self._fallback = None
+        self._info = None
+        self._unavailable_until = 0.0
+
+    @property
+    def fallback(self):
+        """プロセス内の解析器（初回の参照時に作成）。"""
+        if self._fallback is None:
+            if self._fallback_factory is not None:
+                self._fallback = self._fallback_factory()
+            else:
+                from morphological_analyzer import MorphologicalAnalyzer
+                self._fallback = MorphologicalAnalyzer()
+        return self._fallback
+
+    def info(self):
+        """
+        サービスの状態（/health の応答）を返します。接続できない場合は None。
+        """
+        if self._info is None and self._service_available():
+            try:
+                self._info = self._request("GET", "/health")
+            except _CONNECTION_ERRORS:
+                self._mark_unavailable()
+        return self._info
+
+    @property
+    def dictionary_id(self):
+        """解析に使う辞書の識別子（サービスに接続できる場合はサービスの値）。"""
+        info = self.info()
+        return info["dictionary_id"] if info is not None else self.fallback.dictionary_id
+
+    def load_csv(self, file_path_or_buffer, encoding='utf-8'):
+        """
+        CSVファイル・Excelブックを読み込みます（MorphologicalAnalyzer.load_csv と同じ。読み込みは常にプロセス内で行います）。
+        """
+        if isinstance(file_path_or_buffer, str) and file_path_or_buffer.lower().endswith(".xlsx"):
+            from ingest import read_excel_evaluations  # Excelブックを読み込むときだけ読み込む
+
+            with self.instrumentation.stage("excel_read"):
+                return read_excel_evaluations(file_path_or_buffer)
+        with self.instrumentation.stage("csv_read"):
+            return pd.read_csv(file_path_or_buffer, encoding=encoding)
+
+    def analyze_text(self, text, fields=None, pos_filter=None):
+        """
+        1件のテキストを解析します。形式は MorphologicalAnalyzer.analyze_text と同じです。
+        """
+        if self._service_available():
+            payload = {"text": text if isinstance(text, str) else "", "fields": fields,
+                       "pos_filter": sorted(pos_filter) if pos_filter is not None else None}
+            try:
+                with self.instrumentation.stage("remote_analyze"):
+                    response = self._request("POST", "/analyze", json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+                return [tuple(token) for token in response["tokens"]]
+            except _CONNECTION_ERRORS:
+                self._mark_unavailable()
+        return self.fallback.analyze_text(text, fields=fields, pos_filter=pos_filter)
+
+    def analyze_texts(self, texts, workers=1, chunksize=None, as_table=False, fields=None, pos_filter=None):
+        """
+        複数のテキストをまとめて解析します（サービスの /analyze/bulk）。形式は MorphologicalAnalyzer.analyze_texts と同じです。
+        サービスを使う場合、workers と chunksize はサービス側の設定が使われます。
+        """
+        texts = [str(text) if pd.notna(text) else "" for text in texts]
+        if self._service_available():
+            try:
+                with self.instrumentation.stage("remote_analyze"):
+                    token_lists = self._bulk(texts, fields, pos_filter)
+                if as_table:
+                    from token_table import TokenTable
+                    return TokenTable.from_token_lists(token_lists)
+                return token_lists
+            except _CONNECTION_ERRORS:
+                self._mark_unavailable()
+        return self.fallback.analyze_texts(texts, workers=workers, chunksize=chunksize, as_table=as_table,
+                                           fields=fields, pos_filter=pos_filter)
+
+    def score_texts(self, texts):
+        """
+        複数のテキストの感情スコアをサービスで計算します（サービスに感情極性辞書が読み込まれている必要があります）。
+
+        Returns:
+            list[float]: 入力と同じ順序の感情スコア。
+
+        Raises:
+            OSError: サービスに接続できない場合（感情スコアはプロセス内では計算しません）。
+        """
+        texts = [str(text) if pd.notna(text) else "" for text in texts]
+        responses = self._bulk_responses(texts, {"fields": "surface", "score": "1"})
+        return [response["score"] for response in responses]
+
+    def _bulk(self, texts, fields, pos_filter):
+        query = {}
+        if fields is not None:
+            query["fields"] = ",".join(fields)
+        if pos_filter is not None:
+            query["pos_filter"] = ",".join(sorted(pos_filter))
+        return [[tuple(token) for token in response["tokens"]] for response in self._bulk_responses(texts, query)]
+
+    def _bulk_responses(self, texts, query):
+        body = "".join(json.dumps(text, ensure_ascii=False) + "\n" for text in texts).encode("utf-8")
+        path = "/analyze/bulk" + (f"?{urlencode(query)}" if query else "")
+        request = urllib.request.Request(self.url + path, data=body, method="POST",
+                                         headers={"Content-Type": "application/x-ndjson"})
+        # 行ごとの読み込み（readline）は応答が途中で切れても例外にならないため、read でまとめて読み込む（IncompleteRead になる）
+        return self._open(request, lambda response: [json.loads(line) for line in response.read().splitlines()
+                                                     if line.strip()])
+
+    def _request(self, method, path, body=None):
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={"Content-Type": "application/json"})
+        return self._open(request, lambda response: json.loads(response.read()))
+
+    def _open(self, request, read):
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return read(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 400:  # 引数の誤りはプロセス内で解析しても同じなので、呼び出し元に伝える
+                raise ValueError(json.loads(e.read()).get("error", str(e))) from e
+            raise
+
+    def _service_available(self):
+        return self.url is not None and time.monotonic() >= self._unavailable_until
+
+    def _mark_unavailable(self):
+        # しばらくはサービスへの接続を試みずにプロセス内で解析する
+        self._unavailable_until = time.monotonic() + RETRY_SECONDS
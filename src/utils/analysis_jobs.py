@@ -0,0 +1,187 @@
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from token_table import DOC_ID_COLUMN, TokenTable, TokenTableWriter
+from unit_store import file_digest
+
+# ジョブの状態
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# エクスポートの形式（zip内のファイル形式）
+EXPORT_FORMATS = ("csv", "parquet")
+# 文書表の列名（CSV出力時）
+DOCUMENT_LABELS = {"text": "元のテキスト", "n_tokens": "トークン数"}
+
+
+class AnalysisJob:
+    """
+    1つのファイル・列に対する形態素解析ジョブ。
+    解析はチャンク単位で進み、終わったチャンクの結果は解析中でも document() で参照できます。
+    """
+
+    def __init__(self, key, file_path, column, chunk_size):
+        self.key = key
+        self.file_path = file_path
+        self.column = column
+        self.chunk_size = chunk_size
+        self.status = PENDING
+        self.error = None
+        self.texts = None  # 解析対象の列（pd.Series）
+        self.total = 0
+        self.done = 0
+        self.chunks = []  # チャンクごとの TokenTable（doc_start はファイル内の行番号）
+
+    @property
+    def progress(self):
+        """進捗（0.0〜1.0）。"""
+        if self.status == DONE:
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def finished(self):
+        """解析が完了または失敗した場合は True。"""
+        return self.status in (DONE, FAILED)
+
+    def document(self, index):
+        """
+        指定した行の形態素解析結果を返します。
+
+        Args:
+            index (int): 行番号（0始まり）。解析済みの行のみ指定できます。
+
+        Returns:
+            list[tuple]: analyze_text と同じ形式の形態素解析結果。
+
+        Raises:
+            IndexError: 指定した行がまだ解析されていない場合。
+        """
+        if not 0 <= index < self.done:
+            raise IndexError(f"行 {index} はまだ解析されていません（解析済み: {self.done}行）。")
+        chunk = self.chunks[index // self.chunk_size]
+        return chunk.document(index - chunk.doc_start)
+
+
+class AnalysisJobManager:
+    """
+    形態素解析ジョブをバックグラウンドのスレッドで1つずつ実行し、結果を保持するクラス。
+    ジョブは (ファイルの内容ハッシュ, 列名, 辞書の識別子) をキーにして、同じファイルの再解析を避けます。
+    形態素解析器を複数のスレッドから同時に使わないよう、ワーカースレッドは1つだけです。
+    解析器のキャッシュに永続キャッシュを指定しておくと、チャンクごとに結果が保存されるため、
+    アプリを再起動した場合も解析済みのチャンクはキャッシュから読み込まれ、続きから再開できます。
+    """
+
+    def __init__(self, analyzer, chunk_size=500):
+        """
+        Args:
+            analyzer (MorphologicalAnalyzer): 形態素解析器。
+            chunk_size (int, optional): 1回に解析する行数（進捗の更新単位）。デフォルトは 500。
+        """
+        self.analyzer = analyzer
+        self.chunk_size = chunk_size
+        self._jobs = {}
+        self._digests = {}  # (パス, 更新時刻, サイズ) → 内容ハッシュ
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+
+    def job_key(self, file_path, column):
+        """
+        ジョブのキー (ファイルの内容ハッシュ, 列名, 辞書の識別子) を返します。
+        内容ハッシュは更新時刻とサイズが変わらない限り再計算しません。
+        """
+        stat = os.stat(file_path)
+        stamp = (file_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            digest = self._digests[stamp] = file_digest(file_path)
+        return digest, column, self.analyzer.dictionary_id
+
+    def get(self, file_path, column):
+        """
+        登録済みのジョブを返します。未登録の場合は None。
+        """
+        with self._lock:
+            return self._jobs.get(self.job_key(file_path, column))
+
+    def submit(self, file_path, column):
+        """
+        ジョブを登録します。同じキーのジョブが登録済みの場合（失敗したものを除く）はそれを返します。
+
+        Args:
+            file_path (str): CSVファイルのパス。
+            column (str): 解析する列名。
+
+        Returns:
+            AnalysisJob: 登録したジョブ。
+        """
+        key = self.job_key(file_path, column)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                return job
+            job = AnalysisJob(key, file_path, column, self.chunk_size)
+            self._jobs[key] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.status = RUNNING
+        try:
+            df = self.analyzer.load_csv(job.file_path)
+            if job.column not in df.columns:
+                raise ValueError(f"指定された列名 '{job.column}' はDataFrameに存在しません。利用可能な列: {df.columns.tolist()}")
+            job.texts = df[job.column]
+            job.total = len(job.texts)
+            for start in range(0, job.total, self.chunk_size):
+                token_lists = self.analyzer.analyze_texts(job.texts.iloc[start:start + self.chunk_size])
+                job.chunks.append(TokenTable.from_token_lists(token_lists, doc_start=start))
+                job.done = start + len(token_lists)
+            job.status = DONE
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+
+
+def export_job(job, path, file_format="csv"):
+    """
+    解析結果を、文書表（documents）とトークン表（tokens）の2つのファイルを含むzipとして書き出します。
+    トークン表は元のテキストを含まず、doc_id で文書表と結び付けます。
+    トークン表はチャンクごとに追記するため、全トークンを1つのDataFrameにまとめることはありません。
+
+    Args:
+        job (AnalysisJob): 完了したジョブ。
+        path (str): 出力するzipファイルのパス。
+        file_format (str, optional): zip内のファイル形式。'csv' または 'parquet'。デフォルトは 'csv'。
+
+    Raises:
+        ValueError: file_format が不正な場合。
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"file_format には {EXPORT_FORMATS} のいずれかを指定してください: {file_format}")
+    lengths = [np.diff(chunk.offsets) for chunk in job.chunks]
+    documents = pd.DataFrame({
+        DOC_ID_COLUMN: np.arange(job.done, dtype=np.int32),
+        "text": job.texts.iloc[:job.done].fillna("").astype(str).to_numpy(),
+        "n_tokens": np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64),
+    })
+
+    with tempfile.TemporaryDirectory() as workdir:
+        documents_path = os.path.join(workdir, f"documents.{file_format}")
+        tokens_path = os.path.join(workdir, f"tokens.{file_format}")
+        if file_format == "csv":
+            documents.rename(columns=DOCUMENT_LABELS).to_csv(documents_path, index=False, encoding="utf-8-sig")
+        else:
+            documents.to_parquet(documents_path, index=False)
+        with TokenTableWriter(tokens_path, file_format, labels=file_format == "csv") as writer:
+            for chunk in job.chunks:
+                writer.write(chunk)
+
+        # Parquetは圧縮済みのため、zipでは圧縮しない
+        compression = zipfile.ZIP_DEFLATED if file_format == "csv" else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, "w", compression=compression) as archive:
+            archive.write(documents_path, os.path.basename(documents_path))
+            archive.write(tokens_path, os.path.basename(tokens_path))
@@ -0,0 +1,334 @@
+# 形態素解析・感情スコアをまとめて提供するローカルHTTPサービス
+#
+# 使用例:
+#   python src/utils/analysis_service.py --port 8765 --workers 4
+#   python src/utils/analysis_service.py --backend sudachi --pn-lexicon data/processed/pn_ja.pnlx --cache tokens.sqlite
+#
+# アプリやスクリプトはそれぞれ MeCab / Sudachi を初期化して辞書を読み込み、1件ずつ解析していました。
+# このサービスは辞書を読み込んだワーカープロセスを常駐させ、同時に届いた1件ずつのリクエストを
+# 待ち時間の上限（--max-wait-ms）以内でまとめて1回の analyze_texts で解析します（マイクロバッチ）。
+# クライアントは analysis_client.AnalysisClient を使います（サービスに接続できない場合はプロセス内で解析）。
+#
+# エンドポイント:
+#   GET  /health        状態・辞書の識別子・バッチの統計
+#   POST /analyze       {"text": "...", "fields": [...], "pos_filter": [...], "score": true} → {"tokens": [...], "score": 0.1}
+#   POST /analyze/bulk  1行1件のNDJSON（{"text": "..."} または文字列）→ 入力と同じ順序のNDJSON。
+#                       fields・pos_filter（カンマ区切り）・score はクエリ文字列で指定します。
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from urllib.parse import parse_qs, urlparse
+from morphological_analyzer import MorphologicalAnalyzer, _field_indices
+from sentiment_scorer import BatchSentimentScorer
+from tokenizer_backends import BACKENDS, project_tokens
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# /analyze/bulk で1回の analyze_texts に渡す件数
+BULK_CHUNK_SIZE = 500
+
+
+class MicroBatcher:
+    """
+    個別に届いた要求をキューにため、件数の上限または待ち時間の上限に達した時点でまとめて処理するクラス。
+    処理は専用のスレッド1つで行うため、処理関数（形態素解析器）を複数のスレッドから同時に使うことはありません。
+    """
+
+    def __init__(self, handler, max_batch_size=64, max_wait=0.005):
+        """
+        Args:
+            handler (callable): 要求のリストを受け取り、同じ順序の結果のリストを返す関数。
+            max_batch_size (int, optional): 1回にまとめる要求の数の上限。デフォルトは 64。
+            max_wait (float, optional): 最初の要求が届いてから処理を始めるまでの待ち時間の上限（秒）。デフォルトは 0.005。
+        """
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.n_batches = 0
+        self.n_requests = 0
+        self._queue = Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request):
+        """
+        要求を登録します。
+
+        Returns:
+            concurrent.futures.Future: 処理結果を受け取る Future。
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher は終了しています。")
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def close(self):
+        """
+        キューに残っている要求を処理してからスレッドを終了します。
+        """
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # バッチを処理してから終了する
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        self.n_batches += 1
+        self.n_requests += len(batch)
+        try:
+            results = self.handler([request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+class AnalysisService:
+    """
+    形態素解析器（と感情極性辞書）を保持し、1件ずつの要求はマイクロバッチで、まとめた要求はそのまま解析するクラス。
+    解析器は1つのロックで保護し、並列化は常駐のワーカープロセス（MorphologicalAnalyzer.start_pool）で行います。
+    """
+
+    def __init__(self, analyzer, lexicon=None, workers=1, max_batch_size=64, max_wait=0.005):
+        """
+        Args:
+            analyzer (MorphologicalAnalyzer): 形態素解析器。
+            lexicon (PolarityLexicon, optional): 感情極性辞書。None の場合は score を指定した要求はエラーになります。
+            workers (int, optional): 常駐させるワーカープロセス数。1 の場合はサービスのプロセス内で解析します。
+            max_batch_size (int, optional): マイクロバッチの件数の上限。
+            max_wait (float, optional): マイクロバッチの待ち時間の上限（秒）。
+        """
+        self.analyzer = analyzer
+        self.scorer = BatchSentimentScorer(lexicon) if lexicon is not None else None
+        self.workers = workers
+        self._lock = threading.Lock()
+        if workers > 1:
+            analyzer.start_pool(workers)
+        self.batcher = MicroBatcher(self._handle_batch, max_batch_size, max_wait)
+
+    def info(self):
+        """
+        サービスの状態を返します（/health の応答）。
+        """
+        return {
+            "status": "ok",
+            "backend": self.analyzer.backend_name,
+            "dictionary_id": self.analyzer.dictionary_id,
+            "preprocess_steps": list(self.analyzer.preprocessor.steps),
+            "workers": self.workers,
+            "score": self.scorer is not None,
+            "batches": self.batcher.n_batches,
+            "requests": self.batcher.n_requests,
+        }
+
+    def analyze(self, text, fields=None, pos_filter=None, score=False):
+        """
+        1件のテキストを解析します。同時に届いた他の要求とまとめて解析されます。
+
+        Returns:
+            dict: tokens（と score を指定した場合は score）を含む辞書。
+
+        Raises:
+            ValueError: fields が不正な場合、または感情極性辞書がないのに score を指定した場合。
+        """
+        request = self._make_request(fields, pos_filter, score)
+        return self.batcher.submit((text, *request)).result()
+
+    def analyze_many(self, texts, fields=None, pos_filter=None, score=False):
+        """
+        複数のテキストをまとめて解析します。マイクロバッチは経由しません。
+
+        Returns:
+            list[dict]: 入力と同じ順序の、tokens（と score）を含む辞書のリスト。
+        """
+        indices, pos_filter, score = self._make_request(fields, pos_filter, score)
+        with self._lock:
+            token_lists = self.analyzer.analyze_texts(texts, workers=self.workers)
+        return self._respond(token_lists, [(indices, pos_filter, score)] * len(token_lists))
+
+    def close(self):
+        """
+        マイクロバッチのスレッドとワーカープロセスを終了します。
+        """
+        self.batcher.close()
+        self.analyzer.close_pool()
+
+    def _make_request(self, fields, pos_filter, score):
+        if score and self.scorer is None:
+            raise ValueError("感情極性辞書が読み込まれていないため score は使用できません（--pn-lexicon を指定してください）。")
+        indices = _field_indices(fields) if fields is not None else None
+        return indices, set(pos_filter) if pos_filter is not None else None, bool(score)
+
+    def _handle_batch(self, requests):
+        # マイクロバッチ: 要求ごとに fields などが異なっても、解析は全要素で1回にまとめ、結果を要求ごとに絞り込む
+        with self._lock:
+            token_lists = self.analyzer.analyze_texts([text for text, *_ in requests], workers=self.workers)
+        return self._respond(token_lists, [options for _, *options in requests])
+
+    def _respond(self, token_lists, options):
+        scores = None
+        if any(score for _, _, score in options):
+            scores = self.scorer.score(token_lists).scores
+        responses = []
+        for i, (tokens, (indices, pos_filter, score)) in enumerate(zip(token_lists, options)):
+            if indices is not None or pos_filter is not None:
+                tokens = project_tokens(tokens, indices or _field_indices(None), pos_filter)
+            response = {"tokens": tokens}
+            if score:
+                response["score"] = float(scores[i])
+            responses.append(response)
+        return responses
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    AnalysisService のHTTPハンドラ。サービスは server.service に設定します。
+    """
+
+    protocol_version = "HTTP/1.1"
+    # 応答のヘッダと本文が別々の小さなパケットになるため、Nagle アルゴリズムによる遅延（約40ミリ秒）を避ける
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, self.server.service.info())
+        else:
+            self._send_json(404, {"error": f"不明なパスです: {self.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if url.path == "/analyze":
+                request = json.loads(body)
+                response = self.server.service.analyze(request["text"], request.get("fields"),
+                                                       request.get("pos_filter"), request.get("score", False))
+                self._send_json(200, response)
+            elif url.path == "/analyze/bulk":
+                self._send_bulk(body, parse_qs(url.query))
+            else:
+                self._send_json(404, {"error": f"不明なパスです: {self.path}"})
+        except (ValueError, KeyError, TypeError) as e:  # json.JSONDecodeError は ValueError のサブクラス
+            self._send_json(400, {"error": f"リクエストが不正です: {e}"})
+        except Exception as e:  # 解析器の障害など（クライアントはプロセス内の解析に切り替える）
+            self._send_json(500, {"error": f"解析に失敗しました: {e}"})
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_bulk(self, body, query):
+        texts = []
+        for line in body.decode("utf-8").splitlines():
+            if line.strip():
+                item = json.loads(line)
+                texts.append(item["text"] if isinstance(item, dict) else item)
+        fields = query["fields"][0].split(",") if "fields" in query else None
+        pos_filter = query["pos_filter"][0].split(",") if "pos_filter" in query else None
+        score = query.get("score", ["0"])[0].lower() in ("1", "true", "yes")
+        service = self.server.service
+        chunks = [texts[start:start + BULK_CHUNK_SIZE] for start in range(0, len(texts), BULK_CHUNK_SIZE)] or [[]]
+        # 最初のチャンクは応答を書き始める前に解析する（引数の誤りや解析器の障害は do_POST がエラーの応答で返す）
+        responses = service.analyze_many(chunks[0], fields, pos_filter, score)
+
+        # 結果はチャンクごとに書き出す（全件の応答を1つの文字列にまとめない）
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, chunk in enumerate(chunks):
+                if i > 0:
+                    responses = service.analyze_many(chunk, fields, pos_filter, score)
+                data = "".join(json.dumps(response, ensure_ascii=False) + "\n" for response in responses).encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        except Exception:
+            # 状態コードは送信済みのため、終端のチャンクを送らずに接続を閉じる（クライアントは応答が途中で切れたことを検出する）
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        # 1リクエストごとのアクセスログは出力しない（負荷試験で標準エラー出力が律速にならないようにする）
+        pass
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    """
+    リクエストを接続ごとのスレッドで受け付けるHTTPサーバー。
+    """
+
+    daemon_threads = True
+    # 多数のクライアントが同時に接続しても拒否されないよう、接続待ちのキューを標準（5）より大きくする
+    request_queue_size = 128
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    サービスを提供するHTTPサーバーを作成します。
+
+    Returns:
+        ServiceHTTPServer: serve_forever() で起動するサーバー。
+    """
+    server = ServiceHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="形態素解析・感情スコアのローカルHTTPサービス")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="待ち受けるポート")
+    parser.add_argument("--backend", default="mecab", choices=BACKENDS, help="形態素解析バックエンド")
+    parser.add_argument("--dictionary-path", default="", help="MeCabの辞書パス")
+    parser.add_argument("--cache", help="解析結果の永続キャッシュ（SQLiteファイル）のパス")
+    parser.add_argument("--pn-lexicon", help="コンパイル済み感情極性辞書のパス（score を使う場合）")
+    parser.add_argument("--workers", type=int, default=1, help="常駐させるワーカープロセス数")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="マイクロバッチの件数の上限")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="マイクロバッチの待ち時間の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    lexicon = None
+    if args.pn_lexicon:
+        from pn_lexicon import PolarityLexicon
+        lexicon = PolarityLexicon.load(args.pn_lexicon)
+    analyzer = MorphologicalAnalyzer(dictionary_path=args.dictionary_path, cache=args.cache, backend=args.backend)
+    service = AnalysisService(analyzer, lexicon, args.workers, args.max_batch_size, args.max_wait_ms / 1000)
+    server = create_server(service, args.host, args.port)
+    print(f"http://{args.host}:{args.port} で待ち受けています（ワーカー {args.workers}、Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
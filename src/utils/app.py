@@ -1,30 +1,47 @@
 # 形態素解析アプリ
 import streamlit as st
 import pandas as pd
+import math
 import os
-from 形態素解析.morphological_analyzer import MorphologicalAnalyzer # 作成したクラスをインポート
+import tempfile
+import time
+from 形態素解析.analysis_client import AnalysisClient, make_analyzer
+from 形態素解析.ingest import is_excel_file
+from 形態素解析.analysis_jobs import AnalysisJobManager, DONE, FAILED, export_job
+from 形態素解析.token_table import TOKEN_FIELDS, TOKEN_FIELD_LABELS
 
 # --- 定数設定 ---
 TARGET_DIR = "2025 講義名" # CSVファイルが格納されているディレクトリ
 DEFAULT_COLUMN_NAME = "自由記述欄" # デフォルトで解析対象とする列名
+CACHE_PATH = os.path.join(TARGET_DIR, ".cache", "tokens.sqlite") # 形態素解析結果の永続キャッシュ（再起動後も解析を続きから再開できる）
+PROGRESS_POLL_SECONDS = 0.5 # 解析中に進捗表示を更新する間隔
+PAGE_SIZES = [10, 20, 50] # 解析結果の1ページあたりの表示件数の候補
+EXPORT_FORMATS = {"CSV (zip)": "csv", "Parquet (zip)": "parquet"} # エクスポート形式の表示名と形式
 
 @st.cache_resource # MeCabの初期化はリソース消費が大きいのでキャッシュする
 def get_analyzer(dictionary_path=""):
-    """MorphologicalAnalyzerのインスタンスを返す関数。"""
+    """MorphologicalAnalyzer（解析サービスが指定されている場合は AnalysisClient）のインスタンスを返す関数。"""
     try:
-        return MorphologicalAnalyzer(dictionary_path=dictionary_path)
+        # 解析サービスが指定されている場合はサービスで解析する（接続できない場合はこのプロセス内で解析）
+        return make_analyzer(dictionary_path=dictionary_path, cache=CACHE_PATH)
     except RuntimeError as e:
         st.error(f"MeCabの初期化に失敗しました。MeCabが正しくインストールされ、設定されているか確認してください。エラー: {e}")
         return None
 
+@st.cache_resource # 解析ジョブと結果は再実行（スライダー操作など）をまたいで保持する
+def get_job_manager(dictionary_path=""):
+    """バックグラウンドで形態素解析を行うジョブ管理のインスタンスを返す関数。"""
+    return AnalysisJobManager(get_analyzer(dictionary_path))
+
 @st.cache_data # ファイルリストの取得はキャッシュ可能
 def get_csv_files(directory):
-    """指定されたディレクトリ内のCSVファイルのリストを返す関数。"""
+    """指定されたディレクトリ内のCSVファイル・Excelブック（ロックファイルを除く）のリストを返す関数。"""
     if not os.path.isdir(directory):
         st.error(f"指定されたディレクトリが見つかりません: {directory}")
         return []
     try:
-        files = [f for f in os.listdir(directory) if f.endswith('.csv') and os.path.isfile(os.path.join(directory, f))]
+        files = [f for f in os.listdir(directory)
+                 if (f.endswith('.csv') or is_excel_file(f)) and os.path.isfile(os.path.join(directory, f))]
         return files
     except Exception as e:
         st.error(f"ファイルリストの取得中にエラーが発生しました: {e}")
@@ -40,10 +57,16 @@ mecab_dic_path = st.sidebar.text_input("MeCab辞書パス (オプション)", ""
 # MorphologicalAnalyzerの準備
 analyzer = get_analyzer(mecab_dic_path)
 
-if analyzer:
+if isinstance(analyzer, AnalysisClient):
+    if analyzer.info() is not None:
+        st.sidebar.success(f"解析サービスに接続しました: {analyzer.url}")
+    else:
+        st.sidebar.warning(f"解析サービス（{analyzer.url}）に接続できないため、このプロセス内で解析します")
+elif analyzer:
     st.sidebar.success("MeCab解析器の準備完了")
 else:
     st.stop() # 解析器が準備できなければアプリを停止
+job_manager = get_job_manager(mecab_dic_path)
 
 # 1. 解析対象ディレクトリの確認とファイル選択
 st.header("1. ファイル選択")
@@ -53,6 +76,11 @@ if not csv_files:
     st.warning(f"'{TARGET_DIR}' ディレクトリ内にCSVファイルが見つかりませんでした。")
     st.stop()
 
+# 起動時の事前解析（デフォルトの列をバックグラウンドで順に解析し、ファイルを選んだときにすぐ結果を表示する）
+if st.sidebar.checkbox("ファイルを事前に解析する", value=False, help=f"'{TARGET_DIR}' 内の全ファイルの '{DEFAULT_COLUMN_NAME}' 列をバックグラウンドで解析します"):
+    for csv_file in csv_files:
+        job_manager.submit(os.path.join(TARGET_DIR, csv_file), DEFAULT_COLUMN_NAME)
+
 selected_file = st.selectbox("解析するCSVファイルを選択してください:", csv_files, index=None, placeholder="ファイルを選択")
 
 if selected_file:
@@ -78,103 +106,69 @@ if selected_file:
             st.write(f"解析対象列: `{column_to_analyze}`")
 
             # 3. 形態素解析の実行と結果表示
-            if st.button(f"'{column_to_analyze}' 列の形態素解析を実行", type="primary"):
+            # 解析はバックグラウンドで行い、結果は (ファイルの内容ハッシュ, 列名, 辞書) ごとに保持する
+            job = job_manager.get(file_path, column_to_analyze)
+            if job is None:
+                if st.button(f"'{column_to_analyze}' 列の形態素解析を実行", type="primary"):
+                    job = job_manager.submit(file_path, column_to_analyze)
+
+            if job is not None:
                 st.header("3. 形態素解析結果")
-                with st.spinner("形態素解析を実行中..."):
-                    try:
-                        analysis_results = analyzer.analyze_column(df, column_to_analyze)
-                        
-                        # 解析結果の表示（最初の数件のテキストと解析結果を表示）
-                        num_preview_rows = st.slider("表示する先頭行数", 1, min(len(df), 50), min(len(df), 5))
-
-                        for i in range(min(num_preview_rows, len(df))):
-                            original_text = df[column_to_analyze].iloc[i]
-                            result_list = analysis_results[i]
-
-                            with st.expander(f"テキスト {i+1}: 「{str(original_text)[:50]}{'...' if len(str(original_text)) > 50 else ''}」の解析結果", expanded=False):
-                                if pd.isna(original_text) or not str(original_text).strip():
-                                    st.write("(元のテキストが空または欠損値です)")
-                                elif not result_list:
-                                    st.write("(解析結果が空です。前処理後、テキストが空白になった可能性があります。)")
-                                else:
-                                    # (表層形, 品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音)
-                                    result_df_data = []
-                                    for token in result_list:
-                                        result_df_data.append({
-                                            "表層形": token[0],
-                                            "品詞": token[1],
-                                            "品詞細分類1": token[2],
-                                            "品詞細分類2": token[3],
-                                            "品詞細分類3": token[4],
-                                            "活用型": token[5],
-                                            "活用形": token[6],
-                                            "原形": token[7],
-                                            "読み": token[8],
-                                            "発音": token[9],
-                                        })
-                                    st.dataframe(pd.DataFrame(result_df_data), use_container_width=True)
-                        
-                        st.success("形態素解析が完了しました。")
-
-                        # 全解析結果をダウンロード可能にする (オプション)
-                        # 全テキストと全解析結果を結合したDataFrameを作成
-                        # これは非常に大きなデータになる可能性があるので注意
-                        # ここでは、表示されている件数分だけのダウンロードにするか、全件にするかなどを検討できる
-                        # 簡単な例として、全解析結果のリストをCSVでダウンロードする案
-                        
-                        # 全解析結果を一つのDataFrameにまとめる (より詳細な出力のため)
-                        # 各トークンを独立した行として出力する場合
-                        all_tokens_list = []
-                        for doc_idx, doc_results in enumerate(analysis_results):
-                            original_text_for_doc = str(df[column_to_analyze].iloc[doc_idx])
-                            if pd.isna(original_text_for_doc) or not original_text_for_doc.strip():
-                                all_tokens_list.append({
-                                    "ドキュメントID": doc_idx + 1,
-                                    "元のテキスト": original_text_for_doc,
-                                    "表層形": "(空テキスト)", "品詞": "-", "品詞細分類1": "-", "品詞細分類2": "-", "品詞細分類3": "-", 
-                                    "活用型": "-", "活用形": "-", "原形": "-", "読み": "-", "発音": "-"
-                                })
-                                continue
-                            if not doc_results:
-                                all_tokens_list.append({
-                                    "ドキュメントID": doc_idx + 1,
-                                    "元のテキスト": original_text_for_doc,
-                                    "表層形": "(解析結果なし)", "品詞": "-", "品詞細分類1": "-", "品詞細分類2": "-", "品詞細分類3": "-", 
-                                    "活用型": "-", "活用形": "-", "原形": "-", "読み": "-", "発音": "-"
-                                })
-                                continue
-                            for token in doc_results:
-                                all_tokens_list.append({
-                                    "ドキュメントID": doc_idx + 1,
-                                    "元のテキスト": original_text_for_doc, # 各トークン行に元のテキストも追加
-                                    "表層形": token[0],
-                                    "品詞": token[1],
-                                    "品詞細分類1": token[2],
-                                    "品詞細分類2": token[3],
-                                    "品詞細分類3": token[4],
-                                    "活用型": token[5],
-                                    "活用形": token[6],
-                                    "原形": token[7],
-                                    "読み": token[8],
-                                    "発音": token[9],
-                                })
-                        
-                        if all_tokens_list:
-                            full_analysis_df = pd.DataFrame(all_tokens_list)
-                            csv_export = full_analysis_df.to_csv(index=False).encode('utf-8-sig') # BOM付きUTF-8
+                if job.status == FAILED:
+                    st.error(f"形態素解析中にエラーが発生しました: {job.error}")
+                elif job.status != DONE:
+                    st.progress(job.progress, text=f"形態素解析を実行中... {job.done}/{job.total or '-'} 行")
+                    # 画面を定期的に再実行して進捗を更新する（解析自体はバックグラウンドで続く）
+                    time.sleep(PROGRESS_POLL_SECONDS)
+                    st.rerun()
+                else:
+                    # 解析結果の表示（表示中のページの文書だけを描画する）
+                    page_col, size_col = st.columns(2)
+                    page_size = size_col.selectbox("1ページの表示件数", PAGE_SIZES, index=0)
+                    n_pages = max(1, math.ceil(job.total / page_size))
+                    page = page_col.number_input(f"ページ (全{n_pages}ページ)", min_value=1, max_value=n_pages, value=1, step=1)
+                    first = (page - 1) * page_size
+                    last = min(first + page_size, job.total)
+                    st.caption(f"{first + 1}〜{last} 件目 / 全 {job.total} 件")
+
+                    token_labels = [TOKEN_FIELD_LABELS[name] for name in TOKEN_FIELDS]
+                    for i in range(first, last):
+                        original_text = job.texts.iloc[i]
+                        result_list = job.document(i)
+
+                        with st.expander(f"テキスト {i+1}: 「{str(original_text)[:50]}{'...' if len(str(original_text)) > 50 else ''}」の解析結果", expanded=False):
+                            if pd.isna(original_text) or not str(original_text).strip():
+                                st.write("(元のテキストが空または欠損値です)")
+                            elif not result_list:
+                                st.write("(解析結果が空です。前処理後、テキストが空白になった可能性があります。)")
+                            else:
+                                # (表層形, 品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音)
+                                st.dataframe(pd.DataFrame(result_list, columns=token_labels), use_container_width=True)
+
+                    st.success("形態素解析が完了しました。")
+
+                    # 全解析結果のエクスポート
+                    # 文書表（元のテキスト）とトークン表（doc_idで結合）に分けてチャンクごとに書き出し、
+                    # ボタンが押されたときだけファイルを作成する
+                    st.subheader("全解析結果のエクスポート")
+                    export_label = st.radio("出力形式", list(EXPORT_FORMATS), horizontal=True)
+                    export_key = (job.key, export_label)
+                    if st.button("エクスポートファイルを作成"):
+                        with st.spinner("エクスポートファイルを作成中..."):
+                            fd, export_path = tempfile.mkstemp(suffix=".zip")
+                            os.close(fd)
+                            export_job(job, export_path, EXPORT_FORMATS[export_label])
+                        st.session_state["export"] = (export_key, export_path)
+
+                    export = st.session_state.get("export")
+                    if export is not None and export[0] == export_key and os.path.isfile(export[1]):
+                        with open(export[1], "rb") as f:
                             st.download_button(
-                                label="全解析結果をCSVでダウンロード",
-                                data=csv_export,
-                                file_name=f"{selected_file.replace('.csv', '')}_{column_to_analyze}_analyzed.csv",
-                                mime='text/csv',
+                                label="全解析結果をダウンロード",
+                                data=f,
+                                file_name=f"{os.path.splitext(selected_file)[0]}_{column_to_analyze}_analyzed.zip",
+                                mime="application/zip",
                             )
-                        else:
-                            st.info("ダウンロードする解析結果がありませんでした。")
-
-                    except ValueError as e:
-                        st.error(f"形態素解析中にエラーが発生しました: {e}")
-                    except Exception as e:
-                        st.error(f"予期せぬエラーが発生しました: {e}")
 
     except FileNotFoundError as e:
         st.error(f"ファイル読み込みエラー: {e}")
@@ -186,6 +180,15 @@ if selected_file:
 else:
     st.info("ファイルを選択すると、解析オプションが表示されます。")
 
+# --- 処理時間の内訳 (環境変数 ANALYZER_INSTRUMENT=1 のときのみ) ---
+if analyzer and analyzer.instrumentation.enabled:
+    with st.sidebar.expander("処理時間の内訳"):
+        snapshot = analyzer.instrumentation.snapshot()
+        if snapshot["timers"]:
+            st.dataframe(pd.DataFrame.from_dict(snapshot["timers"], orient="index"))
+        if snapshot["counters"]:
+            st.json(snapshot["counters"])
+
 # --- フッター情報など (オプション) ---
 st.sidebar.markdown("---")
 st.sidebar.info("これはCSVファイル内のテキストを形態素解析するStreamlitアプリケーションです。") 
\ No newline at end of file
@@ -0,0 +1,26 @@
+# 自由記述から内容語（名詞・動詞・形容詞・形容動詞）の原形を取り出すトークン化
+#
+# rating_word_analyzer（TF-IDF）・incremental_trainer（ハッシュ特徴量）・word_embeddings（Word2Vec）は
+# 同じトークン列を使うため、ここの tokenize_corpus でそろえます。
+
+# 特徴量に使う品詞
+CONTENT_POS = ('名詞', '動詞', '形容詞', '形容動詞')
+
+
+def tokenize_corpus(analyzer, texts, workers=1):
+    """
+    コーパス全体を1回だけ形態素解析し、文書ごとの内容語の原形のリストを返します。
+    解析は analyze_texts で行うため、キャッシュと並列処理がそのまま使えます。
+    表層形と原形・内容語だけを取り出すため、キャッシュを使わない場合は要素を絞った高速な解析になります。
+
+    Args:
+        analyzer (MorphologicalAnalyzer): 形態素解析器。
+        texts (list[str]): 自由記述のリスト。
+        workers (int, optional): ワーカープロセス数。デフォルトは 1。
+
+    Returns:
+        list[list[str]]: 文書ごとの原形のリスト。
+    """
+    token_lists = analyzer.analyze_texts(texts, workers=workers, fields=["surface", "base_form"],
+                                         pos_filter=set(CONTENT_POS))
+    return [[base_form if base_form else surface for surface, base_form in tokens] for tokens in token_lists]
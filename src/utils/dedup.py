@@ -0,0 +1,232 @@
+# 自由記述の重複・ほぼ重複（コピー＆ペーストの言い換え、別の学部のスクレイピング結果との重なり）の検出
+#
+# 使用例:
+#   python src/utils/dedup.py data/processed/evaluations
+#   python src/utils/dedup.py data/processed/evaluations --threshold 0.7 --output data/processed/clusters.parquet
+#
+# 1. 正規化したテキストが完全に一致するコメントをまとめます（「特になし」「ありがとうございました。」など）。
+# 2. 残った異なりテキストごとに文字 n-gram の MinHash を計算し、LSH（バンドごとのハッシュ表）で候補の組を作ります。
+#    同じバケットのテキストの組（大きすぎるバケットは先頭のテキストとの組だけ）のうち、MinHash から推定した
+#    Jaccard 係数が閾値以上のものだけをつなぎ、連結成分を1つのクラスタとします。
+# 全組み合わせを比較しないため、処理時間はコメント数にほぼ比例します。
+# 後段の処理はクラスタごとに代表の1件だけを解析し、クラスタの件数を重みとして使えます。
+import argparse
+import re
+import zlib
+import neologdn
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from ingest import load_evaluations
+
+# 追加する列
+DEDUP_COLUMNS = ["cluster_id", "is_representative", "cluster_size"]
+
+# 重複の判定で無視する空白・句読点・括弧など
+_IGNORED_PATTERN = re.compile(r"[\s、。，．,.!！?？・…‥「」『』（）()\[\]【】〈〉《》〜~\"'“”‘’:：;；/／]+")
+# MinHash の計算で一度に処理する異なりテキスト数（中間の配列の大きさを抑える）
+_BATCH_SIZE = 2000
+# LSH のバケット内のすべての組を調べるバケットの大きさの上限（これより大きいバケットは先頭のテキストとの組だけを調べる）
+_MAX_BUCKET_SIZE = 64
+
+
+def normalize_for_dedup(text):
+    """
+    重複の判定用にテキストを正規化します（neologdn による表記の統一、英字の小文字化、空白・句読点の除去）。
+
+    Args:
+        text (str): 自由記述。欠損値は空文字列として扱います。
+
+    Returns:
+        str: 正規化したテキスト。
+    """
+    if not isinstance(text, str):
+        return ""
+    return _IGNORED_PATTERN.sub("", neologdn.normalize(text).lower())
+
+
+def lsh_parameters(num_perm, threshold):
+    """
+    Jaccard 係数が threshold のときに候補になる確率がおよそ 1/2 になるよう、バンド数と1バンドの行数を決めます。
+
+    Args:
+        num_perm (int): MinHash の長さ。
+        threshold (float): ほぼ重複とみなす Jaccard 係数の閾値。
+
+    Returns:
+        tuple[int, int]: (バンド数, 1バンドの行数)。bands * rows <= num_perm。
+    """
+    candidates = [(num_perm // rows, rows) for rows in range(1, num_perm + 1)]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class MinHasher:
+    """
+    文字 n-gram の集合の MinHash を計算するクラス。
+    n-gram は CRC32 でハッシュし、乗算シフト法（a * x + b の上位32ビット）で num_perm 通りの置換を模擬します。
+    乱数シードが同じであれば、実行ごとに同じ MinHash になります。
+    """
+
+    def __init__(self, num_perm=128, ngram=3, seed=42):
+        """
+        Args:
+            num_perm (int, optional): MinHash の長さ。デフォルトは 128。
+            ngram (int, optional): 文字 n-gram の長さ。デフォルトは 3。
+            seed (int, optional): 置換の係数の乱数シード。
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # 奇数
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        """
+        テキストの文字 n-gram のハッシュ値を返します。n 文字未満のテキストはテキスト全体を1つの n-gram とします。
+        """
+        n = self.ngram
+        grams = {text[i:i + n] for i in range(len(text) - n + 1)} or {text}
+        return [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+
+    def signatures(self, texts):
+        """
+        テキストごとの MinHash を計算します。
+
+        Args:
+            texts (list[str]): 正規化済みのテキスト。
+
+        Returns:
+            np.ndarray: (テキスト数, num_perm) の uint32 の配列。
+        """
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), _BATCH_SIZE):
+            hashes = [self.shingles(text) for text in texts[start:start + _BATCH_SIZE]]
+            lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64, count=len(hashes))
+            values = np.fromiter((v for h in hashes for v in h), dtype=np.uint64, count=int(lengths.sum()))
+            # (n-gram数, num_perm) の置換後のハッシュ値を、テキストごとの区間で最小値に集約する（uint64 の桁あふれは意図どおり）
+            permuted = ((values[:, None] * self._a + self._b) >> np.uint64(32)).astype(np.uint32)
+            bounds = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            result[start:start + len(hashes)] = np.minimum.reduceat(permuted, bounds, axis=0)
+        return result
+
+
+def _near_duplicate_labels(signatures, threshold, bands, rows):
+    # LSH のバンドごとに同じバケットに入ったテキストを候補とし、推定 Jaccard 係数が閾値以上の組をつないで連結成分を求める。
+    # _MAX_BUCKET_SIZE 件以下のバケットはすべての組を調べる。それより大きいバケット（「特になし」の言い換えなどが集まったもの）は
+    # 組の数が件数の2乗で増えるため、先頭のテキストとそれ以外のテキストの組だけを調べる（星型の近似）。
+    # 星型では先頭と似ていないテキスト同士が閾値以上でもつながらないことがあり、その分だけ再現率が下がる
+    # （ほかのバンドで同じバケットに入ればつながる）。
+    n = len(signatures)
+    firsts, members = [], []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, bucket = np.unique(keys, return_inverse=True)
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+        ends = np.r_[starts[1:], n]
+        sizes = ends - starts
+        # 並べ替えた位置ごとのバケットの先頭・末尾（末尾は含まない）
+        start_of = np.repeat(starts, sizes)
+        end_of = np.repeat(ends, sizes)
+        small = (end_of - start_of) <= _MAX_BUCKET_SIZE
+        # 小さいバケット: 位置 i と i + k（同じバケット内）の組をすべて作る
+        positions = np.flatnonzero(small)
+        for k in range(1, _MAX_BUCKET_SIZE):
+            positions = positions[positions + k < end_of[positions]]
+            if not len(positions):
+                break
+            firsts.append(order[positions])
+            members.append(order[positions + k])
+        # 大きいバケット: 先頭のテキストとそれ以外のテキストの組
+        positions = np.flatnonzero(~small & (start_of != np.arange(n)))
+        firsts.append(order[start_of[positions]])
+        members.append(order[positions])
+    firsts = np.concatenate(firsts) if firsts else np.zeros(0, dtype=np.int64)
+    members = np.concatenate(members) if members else np.zeros(0, dtype=np.int64)
+    if len(firsts):
+        pairs = np.unique(np.stack([firsts, members], axis=1), axis=0)
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        firsts, members = pairs[similarity >= threshold].T
+    graph = sparse.coo_matrix((np.ones(len(firsts), dtype=np.int8), (firsts, members)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def find_duplicates(texts, threshold=0.8, ngram=3, num_perm=128, seed=42):
+    """
+    コメントの重複・ほぼ重複のクラスタを求めます。
+
+    Args:
+        texts (Iterable[str]): 自由記述。
+        threshold (float, optional): ほぼ重複とみなす文字 n-gram の Jaccard 係数の閾値。1.0 の場合は完全一致のみ。
+                                     デフォルトは 0.8。
+        ngram (int, optional): 文字 n-gram の長さ。デフォルトは 3。
+        num_perm (int, optional): MinHash の長さ。デフォルトは 128。
+        seed (int, optional): MinHash の乱数シード。
+
+    Returns:
+        pd.DataFrame: 入力と同じ順序で DEDUP_COLUMNS の列を持つDataFrame。
+                      cluster_id はクラスタが最初に現れた順の番号、is_representative はクラスタで最初のコメントなら True、
+                      cluster_size はクラスタのコメント数です。
+    """
+    normalized = [normalize_for_dedup(text) for text in texts]
+    # 完全一致（正規化後）の重複をまとめる
+    text_codes, unique_texts = pd.factorize(pd.Series(normalized, dtype=object))
+    if threshold < 1.0 and len(unique_texts) > 1:
+        signatures = MinHasher(num_perm, ngram, seed).signatures(list(unique_texts))
+        bands, rows = lsh_parameters(num_perm, threshold)
+        labels = _near_duplicate_labels(signatures, threshold, bands, rows)[text_codes]
+    else:
+        labels = text_codes
+
+    # クラスタ番号を最初に現れた順に振り直す
+    cluster_id, _ = pd.factorize(labels)
+    cluster_id = cluster_id.astype(np.int64)
+    is_representative = np.zeros(len(cluster_id), dtype=bool)
+    is_representative[np.unique(cluster_id, return_index=True)[1]] = True
+    return pd.DataFrame({
+        "cluster_id": cluster_id,
+        "is_representative": is_representative,
+        "cluster_size": np.bincount(cluster_id)[cluster_id] if len(cluster_id) else cluster_id,
+    })
+
+
+def add_duplicate_columns(df, column="自由記述", **options):
+    """
+    DataFrame に重複のクラスタの列（DEDUP_COLUMNS）を追加したコピーを返します。
+
+    Args:
+        df (pd.DataFrame): 取り込み済みの講義評価。
+        column (str, optional): 重複を調べる列。デフォルトは '自由記述'。
+        **options: find_duplicates に渡す引数（threshold, ngram, num_perm, seed）。
+
+    Returns:
+        pd.DataFrame: 列を追加したDataFrame。
+    """
+    clusters = find_duplicates(df[column].tolist(), **options)
+    clusters.index = df.index
+    return df.assign(**{name: clusters[name] for name in DEDUP_COLUMNS})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="自由記述の重複・ほぼ重複の検出")
+    parser.add_argument("data", help="取り込み済みのParquetデータセット、または講義評価CSVのディレクトリ")
+    parser.add_argument("--threshold", type=float, default=0.8, help="ほぼ重複とみなす Jaccard 係数の閾値")
+    parser.add_argument("--ngram", type=int, default=3, help="文字 n-gram の長さ")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash の長さ")
+    parser.add_argument("--top", type=int, default=10, help="表示する大きいクラスタの数")
+    parser.add_argument("--output", help="クラスタの列を追加した結果の保存先（Parquet）")
+    args = parser.parse_args()
+
+    df = load_evaluations(args.data)
+    result = add_duplicate_columns(df, threshold=args.threshold, ngram=args.ngram, num_perm=args.num_perm)
+    n_clusters = int(result["is_representative"].sum())
+    print(f"{len(result)}件 → {n_clusters}クラスタ（重複 {len(result) - n_clusters}件）")
+    largest = result[result["is_representative"]].nlargest(args.top, "cluster_size")
+    for row in largest.itertuples():
+        print(f"{row.cluster_size}\t{row.自由記述[:50]}")
+    if args.output:
+        result.to_parquet(args.output, index=False)
+        print(f"{args.output} に保存しました。")
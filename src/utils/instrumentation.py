@@ -0,0 +1,162 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+# 計測を有効にする環境変数（1, true, yes のいずれかで有効）
+INSTRUMENT_ENV = "ANALYZER_INSTRUMENT"
+# プロファイラを有効にする環境変数（cprofile または pyinstrument）と、結果の出力先
+PROFILE_ENV = "ANALYZER_PROFILE"
+PROFILE_OUTPUT_ENV = "ANALYZER_PROFILE_OUTPUT"
+
+# 無効時に stage() が返す共有のコンテキストマネージャ（計測のオーバーヘッドをほぼゼロにする）
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    __slots__ = ("_timers", "_name", "_start")
+
+    def __init__(self, timers, name):
+        self._timers = timers
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self._start
+        total, calls = self._timers.get(self._name, (0.0, 0))
+        self._timers[self._name] = (total + elapsed, calls + 1)
+
+
+class Instrumentation:
+    """
+    処理段階ごとの累積時間とカウンタを記録するクラス。
+    無効の場合、stage() は何もしない共有オブジェクトを返し、count() はすぐに戻るため、
+    解析処理にほとんど負荷をかけません。
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled (bool, optional): 計測を有効にする場合は True。デフォルトは True。
+        """
+        self.enabled = enabled
+        self._timers = {}
+        self._counters = {}
+
+    def stage(self, name):
+        """
+        with 文で囲んだ処理の時間を指定した段階名で累積します。
+
+        Args:
+            name (str): 段階名（例: 'normalize', 'parse'）。
+
+        Returns:
+            コンテキストマネージャ。
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self._timers, name)
+
+    def count(self, name, value=1):
+        """
+        カウンタに値を加算します。
+
+        Args:
+            name (str): カウンタ名（例: 'documents', 'tokens'）。
+            value (int, optional): 加算する値。デフォルトは 1。
+        """
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        """
+        記録した時間とカウンタをすべて消去します。
+        """
+        self._timers.clear()
+        self._counters.clear()
+
+    def snapshot(self):
+        """
+        現在の計測結果を返します。
+
+        Returns:
+            dict: {'timers': {段階名: {'seconds': 累積秒, 'calls': 回数}}, 'counters': {カウンタ名: 値}}。
+        """
+        return {
+            "timers": {name: {"seconds": total, "calls": calls} for name, (total, calls) in self._timers.items()},
+            "counters": dict(self._counters),
+        }
+
+    def summary(self, title="処理時間の内訳"):
+        """
+        計測結果を表示用の文字列にまとめます。
+
+        Args:
+            title (str, optional): 見出し。
+
+        Returns:
+            str: 段階ごとの累積時間・割合・回数とカウンタの一覧。無効の場合は空文字列。
+        """
+        if not self.enabled:
+            return ""
+        lines = [f"--- {title} ---"]
+        total = sum(seconds for seconds, _ in self._timers.values())
+        for name, (seconds, calls) in sorted(self._timers.items(), key=lambda item: -item[1][0]):
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"{name:<20} {seconds:10.3f} 秒 {share:6.1f}% {calls:>10} 回")
+        for name, value in sorted(self._counters.items()):
+            lines.append(f"{name:<20} {value:>10}")
+        return "\n".join(lines)
+
+
+def instrumentation_from_env():
+    """
+    環境変数 ANALYZER_INSTRUMENT に応じて有効・無効を決めた Instrumentation を作成します。
+
+    Returns:
+        Instrumentation: 計測オブジェクト。
+    """
+    return Instrumentation(enabled=os.environ.get(INSTRUMENT_ENV, "").lower() in ("1", "true", "yes"))
+
+
+@contextmanager
+def profile_session(name="profile"):
+    """
+    環境変数 ANALYZER_PROFILE が設定されている場合に、with 文の範囲をプロファイラで計測します。
+    'cprofile' の場合は標準の cProfile、'pyinstrument' の場合はサンプリングプロファイラ pyinstrument を使います。
+    結果は ANALYZER_PROFILE_OUTPUT のパス（未設定の場合は '<name>.prof' / '<name>.html'）に保存します。
+    環境変数が未設定の場合は何もしません。
+
+    Args:
+        name (str, optional): 出力ファイル名の既定値に使う名前。
+    """
+    mode = os.environ.get(PROFILE_ENV, "").lower()
+    if mode == "cprofile":
+        import cProfile
+
+        output = os.environ.get(PROFILE_OUTPUT_ENV, f"{name}.prof")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(output)
+            print(f"プロファイル結果を {output} に保存しました。")
+    elif mode == "pyinstrument":
+        from pyinstrument import Profiler
+
+        output = os.environ.get(PROFILE_OUTPUT_ENV, f"{name}.html")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            print(f"プロファイル結果を {output} に保存しました。")
+    else:
+        yield
@@ -0,0 +1,474 @@
+# 形態素解析の結果（原形・品詞）の転置インデックスと、キーワード検索・KWIC・講義ごとの評価の集計
+#
+# 使用例:
+#   python src/utils/lemma_index.py --update "(CSV)2025 raw"                 # インデックスを作成・更新
+#   python src/utils/lemma_index.py --query '課題 多い'                       # 「課題」と「多い」を含むコメント
+#   python src/utils/lemma_index.py --query '"課題が多い" OR 宿題 -楽しい' --kwic
+#
+# インデックスは入力ファイルごとのセグメント（ファイルの内容ハッシュ名の .npz と .parquet）で構成し、
+# 内容の変わっていないファイルのセグメントは再利用します（unit_store.UnitStore）。
+# 語（原形と品詞の組）ごとのポスティングは (文書, トークンの位置) を文書・位置の順に並べ、
+# 文書番号は前のポスティングとの差分、位置は同じ文書内の前の位置との差分を、値が収まる最小の符号なし整数型で保存します。
+#
+# 検索式は空白区切りの語をすべて含む文書を返します。
+#   語1 語2         : 両方を含む（AND）
+#   語1 OR 語2      : どちらかを含む
+#   -語             : 含まない
+#   "語の並び"      : 連続して現れる（フレーズ）
+#   語/品詞         : 品詞を指定（例: 多い/形容詞）
+# 解析器を渡した場合、語とフレーズは形態素解析して原形に直してから検索します（「多かった」→「多い」）。
+import argparse
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingest import list_evaluation_files, read_evaluation_columns
+from unit_store import UnitStore, file_digest
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'processed', 'lemma_index')
+INDEX_MANIFEST = 'index.json'
+# セグメントの形式の版。形式を変えた場合は上げて作り直す
+INDEX_VERSION = 1
+# インデックスに保存する文書の列
+DOCUMENT_COLUMNS = ['講義コード', '講義名', 'rating', '自由記述']
+# セグメントの文書の表（文書の列と、文書ごとの表層形の並び）
+SEGMENT_SCHEMA = pa.schema([
+    ('講義コード', pa.string()),
+    ('講義名', pa.string()),
+    ('rating', pa.float64()),
+    ('自由記述', pa.string()),
+    ('surfaces', pa.list_(pa.string())),
+])
+# インデックスの作成に必要なトークンの要素（表層形・品詞・原形）
+INDEX_FIELDS = ['surface', 'pos', 'base_form']
+
+# 検索式の字句（"フレーズ"、OR、-否定、語）
+_QUERY_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def _lemma(surface, base_form):
+    # 原形がない（未知語など）場合は表層形を使う（content_words.tokenize_corpus と同じ）
+    return base_form if base_form and base_form != '*' else surface
+
+
+def _compact(values):
+    # 値が収まる最小の符号なし整数型に変換する
+    maximum = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+def _read_unit(path):
+    df = read_evaluation_columns(path, DOCUMENT_COLUMNS)
+    # ファイルごとにカテゴリが異なるため、文字列として保存する
+    return df.astype({'講義コード': object, '講義名': object}).reset_index(drop=True)
+
+
+def build_segment(token_lists):
+    """
+    文書ごとの形態素解析結果から、1つのセグメントのポスティングを作成します。
+
+    Args:
+        token_lists (list[list[tuple]]): 文書ごとの (表層形, 品詞, 原形) のタプルのリスト。
+
+    Returns:
+        dict: terms（「原形\\t品詞」の改行区切りをUTF-8にしたバイト列）, posting_offsets（語ごとのポスティングの範囲）,
+              doc_deltas, position_deltas（差分符号化したポスティング）の配列を持つ辞書。
+    """
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    terms = [f'{_lemma(surface, base_form)}\t{pos}' for tokens in token_lists for surface, pos, base_form in tokens]
+    codes, vocabulary = pd.factorize(pd.Series(terms, dtype=object), sort=True)
+    doc_ids = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else np.zeros(0, dtype=np.int64)
+    positions = np.arange(len(terms), dtype=np.int64) - np.repeat(starts, lengths)
+
+    # 語・文書・位置の順に並べる
+    order = np.lexsort((positions, doc_ids, codes))
+    codes, doc_ids, positions = codes[order], doc_ids[order], positions[order]
+    posting_offsets = np.searchsorted(codes, np.arange(len(vocabulary) + 1)).astype(np.int64)
+
+    term_start = np.zeros(len(codes), dtype=bool)
+    term_start[posting_offsets[:-1][posting_offsets[:-1] < len(codes)]] = True
+    doc_deltas = np.diff(doc_ids, prepend=0)
+    doc_deltas[term_start] = doc_ids[term_start]
+    # 語の先頭または文書が変わる位置では、位置を差分ではなくそのまま保存する
+    group_start = term_start | (doc_deltas != 0)
+    position_deltas = np.diff(positions, prepend=0)
+    position_deltas[group_start] = positions[group_start]
+    return {
+        'terms': np.frombuffer('\n'.join(vocabulary).encode('utf-8'), dtype=np.uint8),
+        'posting_offsets': posting_offsets,
+        'doc_deltas': _compact(doc_deltas),
+        'position_deltas': _compact(position_deltas),
+    }
+
+
+def _decode_postings(doc_deltas, position_deltas):
+    # 差分符号化したポスティングを (文書, 位置) の配列に戻す
+    if not len(doc_deltas):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    doc_ids = np.cumsum(doc_deltas, dtype=np.int64)
+    group_start = doc_deltas != 0
+    group_start[0] = True
+    cumulative = np.cumsum(position_deltas, dtype=np.int64)
+    starts = np.flatnonzero(group_start)
+    base = cumulative[starts] - position_deltas[starts].astype(np.int64)
+    positions = cumulative - base[np.cumsum(group_start) - 1]
+    return doc_ids, positions
+
+
+def write_segment(path, documents, token_lists):
+    """
+    1つの入力ファイルのセグメントを保存します（ポスティングは path.npz、文書と表層形は path.parquet）。
+
+    Args:
+        path (str): 拡張子を除いた保存先のパス。
+        documents (pd.DataFrame): DOCUMENT_COLUMNS の列を持つDataFrame。
+        token_lists (list[list[tuple]]): 文書ごとの (表層形, 品詞, 原形) のタプルのリスト。
+    """
+    with open(path + '.npz.tmp', 'wb') as f:
+        np.savez(f, **build_segment(token_lists))
+    os.replace(path + '.npz.tmp', path + '.npz')
+    table = pa.Table.from_pandas(documents, schema=pa.schema(list(SEGMENT_SCHEMA)[:-1]), preserve_index=False)
+    surfaces = pa.array([[token[0] for token in tokens] for tokens in token_lists], type=SEGMENT_SCHEMA.field('surfaces').type)
+    table = table.append_column(SEGMENT_SCHEMA.field('surfaces'), surfaces)
+    pq.write_table(table, path + '.parquet.tmp')
+    os.replace(path + '.parquet.tmp', path + '.parquet')
+
+
+def update_index(data_path, index_dir=DEFAULT_INDEX_DIR, analyzer=None, workers=1):
+    """
+    入力ファイルごとのセグメントを更新します。
+    セグメントはファイルの内容ハッシュごとに保存するため、内容の変わっていないファイルは形態素解析を省略します。
+    辞書が変わった場合はすべて作り直します。必要な列がないファイルは読み飛ばします。
+
+    Args:
+        data_path (str): 講義評価CSV・Excelのディレクトリ、または取り込み済みのParquetデータセット。
+        index_dir (str, optional): インデックスの保存先ディレクトリ。
+        analyzer (MorphologicalAnalyzer, optional): 形態素解析器。None の場合は make_analyzer で作成します。
+        workers (int, optional): 形態素解析のワーカープロセス数。
+
+    Returns:
+        dict: indexed（解析したファイル）, reused（再利用したファイル）, skipped（読み飛ばしたファイル）,
+              n_documents（文書数）を含む辞書。
+    """
+    if analyzer is None:
+        from analysis_client import make_analyzer
+        analyzer = make_analyzer()
+    store = UnitStore(os.path.join(index_dir, 'segments'), os.path.join(index_dir, INDEX_MANIFEST),
+                      {'version': INDEX_VERSION, 'dictionary_id': analyzer.dictionary_id}, ('.npz', '.parquet'))
+    summary = {'indexed': [], 'reused': [], 'skipped': [], 'n_documents': 0}
+    for unit in list_evaluation_files(data_path):
+        key = os.path.relpath(unit, data_path)
+        digest = file_digest(unit)
+        entry = store.reuse(key, digest)
+        if entry is not None:
+            summary['reused'].append(key)
+        else:
+            try:
+                documents = _read_unit(unit)
+            except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+                summary['skipped'].append(f'{key}: {e}')
+                continue
+            token_lists = analyzer.analyze_texts(documents['自由記述'].tolist(), workers=workers, fields=INDEX_FIELDS)
+            write_segment(store.path(digest), documents, token_lists)
+            summary['indexed'].append(key)
+            entry = store.record(key, digest, n_documents=len(documents))
+        summary['n_documents'] += entry['n_documents']
+
+    # 入力から消えたファイルのセグメントを削除する
+    store.prune()
+    store.save()
+    return summary
+
+
+def parse_query(query):
+    """
+    検索式を節のリストに分解します。
+
+    Args:
+        query (str): 検索式（書式はモジュールの先頭を参照）。
+
+    Returns:
+        list[dict]: 節ごとに negate（否定か）と alternatives（OR でつないだ語またはフレーズの文字列と、フレーズかどうかの組のリスト）
+                    を持つ辞書のリスト。
+
+    Raises:
+        ValueError: 検索式が空の場合、または OR の前後に語がない場合。
+    """
+    clauses = []
+    pending_or = False
+    for match in _QUERY_PATTERN.finditer(query):
+        negate, phrase, word = match.groups()
+        if word == 'OR':
+            if not clauses or clauses[-1]['negate']:
+                raise ValueError('OR の前に語を指定してください。')
+            pending_or = True
+            continue
+        if word is not None:
+            negate = '-' if word.startswith('-') and len(word) > 1 else ''
+            term, is_phrase = word[len(negate):], False
+        else:
+            term, is_phrase = phrase, True
+        if not term.strip():
+            continue
+        if pending_or:
+            if negate:
+                raise ValueError('OR の後に否定（-）は指定できません。')
+            clauses[-1]['alternatives'].append((term, is_phrase))
+            pending_or = False
+        else:
+            clauses.append({'negate': bool(negate), 'alternatives': [(term, is_phrase)]})
+    if pending_or:
+        raise ValueError('OR の後に語を指定してください。')
+    if not clauses:
+        raise ValueError('検索する語を指定してください。')
+    return clauses
+
+
+class LemmaIndex:
+    """
+    update_index で作成した転置インデックスを読み込み、検索・KWIC・講義ごとの集計を行うクラス。
+    ポスティングはセグメントごとに差分符号化したまま保持し、検索した語の分だけを復元します。
+    文書番号はインデックス全体での通し番号（マニフェストのファイル順）です。
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, analyzer=None):
+        """
+        Args:
+            index_dir (str, optional): インデックスのディレクトリ。
+            analyzer (MorphologicalAnalyzer, optional): 検索式の語を原形に直す解析器。None の場合は語をそのまま原形として検索します。
+
+        Raises:
+            FileNotFoundError: インデックスが作成されていない場合。
+        """
+        manifest_path = os.path.join(index_dir, INDEX_MANIFEST)
+        if not os.path.isfile(manifest_path):
+            raise FileNotFoundError(f'インデックスが見つかりません: {index_dir}')
+        with open(manifest_path, encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.analyzer = analyzer
+
+        self._segments = []
+        self._terms = {}  # 原形 → [(品詞, セグメントの番号, 語の番号)]
+        tables = []
+        doc_start = 0
+        for entry in self.manifest['units'].values():
+            segment_path = os.path.join(index_dir, 'segments', entry['sha256'])
+            with np.load(segment_path + '.npz') as data:
+                segment = {name: data[name] for name in data.files}
+            segment['doc_start'] = doc_start
+            terms = segment.pop('terms').tobytes().decode('utf-8')
+            for term_id, term in enumerate(terms.split('\n') if terms else []):
+                lemma, pos = term.split('\t')
+                self._terms.setdefault(lemma, []).append((pos, len(self._segments), term_id))
+            self._segments.append(segment)
+            tables.append(pq.read_table(segment_path + '.parquet'))
+            doc_start += entry['n_documents']
+
+        table = pa.concat_tables(tables) if tables else SEGMENT_SCHEMA.empty_table()
+        surfaces = table['surfaces'].combine_chunks()
+        self._surfaces = surfaces.values.to_numpy(zero_copy_only=False)
+        self._token_offsets = surfaces.offsets.to_numpy().astype(np.int64)
+        self.documents = table.drop(['surfaces']).to_pandas()
+        self.documents.index.name = 'doc_id'
+
+    @property
+    def n_documents(self):
+        """インデックスの文書数。"""
+        return len(self.documents)
+
+    def postings(self, lemma, pos=None):
+        """
+        原形（と品詞）のポスティングを返します。
+
+        Args:
+            lemma (str): 原形。
+            pos (str, optional): 品詞。None の場合はすべての品詞。
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: 文書番号・位置の順に並べた (文書番号, トークンの位置) の配列。
+        """
+        doc_parts, position_parts = [], []
+        for term_pos, segment_id, term_id in self._terms.get(lemma, ()):
+            if pos is not None and term_pos != pos:
+                continue
+            segment = self._segments[segment_id]
+            start, end = segment['posting_offsets'][term_id:term_id + 2]
+            doc_ids, positions = _decode_postings(segment['doc_deltas'][start:end], segment['position_deltas'][start:end])
+            doc_parts.append(doc_ids + segment['doc_start'])
+            position_parts.append(positions)
+        if not doc_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        doc_ids, positions = np.concatenate(doc_parts), np.concatenate(position_parts)
+        if len(doc_parts) > 1:  # 品詞の異なる語を合わせた場合は並べ直す
+            order = np.lexsort((positions, doc_ids))
+            doc_ids, positions = doc_ids[order], positions[order]
+        return doc_ids, positions
+
+    def _terms_of(self, text, is_phrase):
+        # 検索式の語を (原形, 品詞) の並びに直す
+        text, _, pos = text.rpartition('/') if not is_phrase and '/' in text.strip('/') else (text, '', '')
+        if self.analyzer is None:
+            return [(word, pos or None) for word in text.split()]
+        lemmas = [_lemma(surface, base_form) for surface, _, base_form in self.analyzer.analyze_text(text, fields=INDEX_FIELDS)]
+        if pos:
+            # 品詞を指定した語は1語として扱う（解析で分かれる場合は書いたとおりの原形で検索する）
+            return [(lemmas[0] if len(lemmas) == 1 else text, pos)]
+        return [(lemma, None) for lemma in lemmas]
+
+    def phrase_hits(self, terms):
+        """
+        語の並びが連続して現れる位置を返します。
+
+        Args:
+            terms (list[tuple[str, str or None]]): (原形, 品詞) の並び。
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: 並びの先頭の (文書番号, トークンの位置) の配列。
+        """
+        if not terms:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        doc_ids, positions = self.postings(*terms[0])
+        # (文書番号, 位置) を1つの整数にして、i 番目の語が先頭から i 個後ろにあるかを調べる
+        keys = (doc_ids << 32) | positions
+        for offset, term in enumerate(terms[1:], start=1):
+            if not len(keys):
+                break
+            next_docs, next_positions = self.postings(*term)
+            keys = keys[np.isin(keys, ((next_docs << 32) | next_positions) - offset)]
+        return keys >> 32, keys & 0xFFFFFFFF
+
+    def _clause_hits(self, clause):
+        # 節の語・フレーズの出現位置（OR でつないだものを合わせる）を (文書番号, 位置, 語数) で返す
+        parts = []
+        for text, is_phrase in clause['alternatives']:
+            terms = self._terms_of(text, is_phrase)
+            doc_ids, positions = self.phrase_hits(terms)
+            parts.append((doc_ids, positions, np.full(len(doc_ids), len(terms), dtype=np.int64)))
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def search(self, query):
+        """
+        検索式に一致する文書番号を返します。
+
+        Args:
+            query (str): 検索式（書式はモジュールの先頭を参照）。
+
+        Returns:
+            np.ndarray: 一致した文書番号（昇順）。
+
+        Raises:
+            ValueError: 検索式の書式が正しくない場合。
+        """
+        return self._search(parse_query(query))[0]
+
+    def _search(self, clauses):
+        result, hits = None, []
+        for clause in clauses:
+            if clause['negate']:
+                continue
+            clause_hits = self._clause_hits(clause)
+            hits.append(clause_hits)
+            doc_ids = np.unique(clause_hits[0])
+            result = doc_ids if result is None else np.intersect1d(result, doc_ids, assume_unique=True)
+        if result is None:  # 否定だけの検索式はすべての文書から除く
+            result = np.arange(self.n_documents)
+        for clause in clauses:
+            if clause['negate']:
+                result = np.setdiff1d(result, self._clause_hits(clause)[0], assume_unique=False)
+        return result, hits
+
+    def kwic(self, query, window=5, limit=100):
+        """
+        検索式に一致した文書の、語・フレーズが現れた箇所の前後のトークンを返します（KWIC）。
+
+        Args:
+            query (str): 検索式。
+            window (int, optional): 前後に表示するトークン数。デフォルトは 5。
+            limit (int, optional): 返す箇所の最大数。None の場合はすべて。
+
+        Returns:
+            pd.DataFrame: doc_id, 講義名, rating, left, keyword, right の列を持つDataFrame（文書番号・位置の順）。
+        """
+        result, hits = self._search(parse_query(query))
+        if hits:
+            doc_ids, positions, lengths = (np.concatenate(arrays) for arrays in zip(*hits))
+        else:
+            doc_ids = positions = lengths = np.zeros(0, dtype=np.int64)
+        mask = np.isin(doc_ids, result)
+        order = np.lexsort((positions[mask], doc_ids[mask]))[:limit]
+        doc_ids, positions, lengths = doc_ids[mask][order], positions[mask][order], lengths[mask][order]
+
+        rows = []
+        for doc_id, position, length in zip(doc_ids.tolist(), positions.tolist(), lengths.tolist()):
+            start, end = self._token_offsets[doc_id], self._token_offsets[doc_id + 1]
+            hit = start + position
+            rows.append({
+                'doc_id': doc_id,
+                'left': ''.join(self._surfaces[max(start, hit - window):hit]),
+                'keyword': ''.join(self._surfaces[hit:hit + length]),
+                'right': ''.join(self._surfaces[hit + length:min(end, hit + length + window)]),
+            })
+        snippets = pd.DataFrame(rows, columns=['doc_id', 'left', 'keyword', 'right'])
+        context = self.documents.loc[snippets['doc_id'], ['講義名', 'rating']].reset_index(drop=True)
+        return pd.concat([snippets[['doc_id']], context, snippets[['left', 'keyword', 'right']]], axis=1)
+
+    def lecture_stats(self, doc_ids):
+        """
+        文書の講義ごとの件数と評価を集計します。
+
+        Args:
+            doc_ids (np.ndarray): search が返した文書番号。
+
+        Returns:
+            pd.DataFrame: 講義コード, 講義名, matches（一致した文書数）, documents（講義の全文書数）, share（割合）,
+                          rating（一致した文書の平均評価）, rating_std の列を持つDataFrame（matches の降順）。
+        """
+        keys = ['講義コード', '講義名']
+        documents = self.documents.fillna({'講義コード': ''})
+        totals = documents.groupby(keys, sort=False).size().rename('documents')
+        matched = documents.iloc[np.asarray(doc_ids, dtype=np.int64)]
+        stats = matched.groupby(keys, sort=False)['rating'].agg(matches='size', rating='mean', rating_std='std')
+        stats = stats.join(totals)
+        stats['share'] = stats['matches'] / stats['documents']
+        stats = stats.reset_index()[keys + ['matches', 'documents', 'share', 'rating', 'rating_std']]
+        return stats.sort_values(['matches', 'share'], ascending=False, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='形態素解析の結果の転置インデックス（作成・検索）')
+    parser.add_argument('--index', default=DEFAULT_INDEX_DIR, help='インデックスのディレクトリ')
+    parser.add_argument('--update', metavar='DATA', help='講義評価のディレクトリまたはParquetデータセットからインデックスを作成・更新する')
+    parser.add_argument('--workers', type=int, default=1, help='形態素解析のワーカープロセス数')
+    parser.add_argument('--query', help='検索式')
+    parser.add_argument('--kwic', action='store_true', help='一致した箇所の前後を表示する')
+    parser.add_argument('--window', type=int, default=5, help='KWIC で前後に表示するトークン数')
+    parser.add_argument('--top', type=int, default=20, help='表示する件数')
+    args = parser.parse_args()
+
+    from analysis_client import make_analyzer
+    analyzer = make_analyzer()
+    if args.update:
+        summary = update_index(args.update, args.index, analyzer=analyzer, workers=args.workers)
+        print(f"{summary['n_documents']}件（解析 {len(summary['indexed'])}ファイル、再利用 {len(summary['reused'])}ファイル）")
+        for message in summary['skipped']:
+            print(f'読み飛ばしました: {message}')
+    if args.query:
+        index = LemmaIndex(args.index, analyzer=analyzer)
+        start = time.perf_counter()
+        doc_ids = index.search(args.query)
+        elapsed = (time.perf_counter() - start) * 1000
+        ratings = index.documents['rating']
+        print(f'{len(doc_ids)}件 / {index.n_documents}件（{elapsed:.1f} ms）'
+              f' 平均評価 {ratings.iloc[doc_ids].mean():.2f}（全体 {ratings.mean():.2f}）')
+        with pd.option_context('display.width', 200, 'display.max_colwidth', 40):
+            if args.kwic:
+                print(index.kwic(args.query, window=args.window, limit=args.top).to_string(index=False))
+            print(index.lecture_stats(doc_ids).head(args.top).to_string(index=False))
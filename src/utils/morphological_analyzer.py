@@ -1,34 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import MeCab
-import neologdn
-import demoji
+from instrumentation import instrumentation_from_env
+from text_preprocessing import DEFAULT_STEPS, TextPreprocessor
+from token_cache import TokenCache
+from token_table import TOKEN_FIELDS, TokenTable
+from tokenizer_backends import create_backend, project_tokens
+
+# 並列実行時に各ワーカープロセスが保持する解析器（ワーカーごとに1回だけ初期化する）
+_worker_analyzer = None
+
+
+def _init_worker(dictionary_path, backend="mecab", preprocess_steps=DEFAULT_STEPS):
+    """
+    ワーカープロセスの初期化関数。プロセスごとに形態素解析器を1回だけ初期化します。
+
+    Args:
+        dictionary_path (str): 親プロセスと同じMeCabの辞書パス。
+        backend (str, optional): 親プロセスと同じバックエンド名。デフォルトは 'mecab'。
+        preprocess_steps (tuple[str], optional): 親プロセスと同じ前処理の段階。
+    """
+    global _worker_analyzer
+    _worker_analyzer = MorphologicalAnalyzer(dictionary_path=dictionary_path, backend=backend,
+                                             preprocess_steps=preprocess_steps)
+
+
+def _analyze_chunk(texts):
+    """
+    ワーカープロセス内でテキストのチャンクを形態素解析します。
+
+    Args:
+        texts (list[str]): 解析対象のテキストのリスト。
+
+    Returns:
+        list[list[tuple]]: 各テキストに対する analyze_text の結果のリスト。
+    """
+    return [_worker_analyzer.analyze_text(text) for text in texts]
+
+
+def _field_indices(fields):
+    """
+    要素名のリストをタプル内の位置に変換します。None の場合は全要素の位置を返します。
+
+    Raises:
+        ValueError: 不明な要素名が含まれる場合。
+    """
+    if fields is None:
+        return tuple(range(len(TOKEN_FIELDS)))
+    unknown = [name for name in fields if name not in TOKEN_FIELDS]
+    if unknown:
+        raise ValueError(f"fields には {TOKEN_FIELDS} の要素を指定してください: {unknown}")
+    return tuple(TOKEN_FIELDS.index(name) for name in fields)
+
 
 class MorphologicalAnalyzer:
-    def __init__(self, dictionary_path=""):
+    def __init__(self, dictionary_path="", cache=None, backend="mecab", instrumentation=None,
+                 preprocess_steps=DEFAULT_STEPS):
         """
-        MeCabを初期化します。
+        形態素解析器（MeCabまたはSudachi）を初期化します。
 
         Args:
             dictionary_path (str, optional): MeCabの辞書パス。
                                             空の場合はデフォルトの辞書を使用します。
                                             例: "-d /usr/local/lib/mecab/dic/mecab-ipadic-neologd"
+            cache (TokenCache or str, optional): 解析結果のキャッシュ。
+                                                 文字列を渡した場合はそのパスのSQLiteファイルを永続キャッシュとして使用します。
+                                                 None の場合はキャッシュしません。
+            backend (str, optional): 形態素解析バックエンド。'mecab', 'sudachi'（分割単位C）,
+                                     'sudachi_a', 'sudachi_b', 'sudachi_c' のいずれか。デフォルトは 'mecab'。
+                                     どのバックエンドでも analyze_text は同じ10要素のタプルを返します。
+            instrumentation (Instrumentation, optional): 処理段階ごとの時間・件数を記録する計測オブジェクト。
+                                                         None の場合は環境変数 ANALYZER_INSTRUMENT が設定されているときだけ計測します。
+            preprocess_steps (Iterable[str], optional): 解析前の前処理の段階（text_preprocessing.PREPROCESS_STEPS の名前）。
+                                                        デフォルトは評価期間・URL・絵文字の除去と neologdn による正規化。
+
+        Raises:
+            RuntimeError: 形態素解析器の初期化に失敗した場合。
+            ValueError: バックエンド名または前処理の段階の名前が不正な場合。
         """
-        try:
-            self.tagger = MeCab.Tagger(dictionary_path)
-            self.tagger.parse("") # MeCabのウォームアップと初期化確認
-        except RuntimeError as e:
-            # エラーメッセージに辞書パスの確認を促す情報を追加
-            error_message = f"MeCabの初期化に失敗しました。mecabrcファイルや辞書パス（{dictionary_path if dictionary_path else 'デフォルト'}）が正しく設定されているか確認してください。エラー詳細: {e}"
-            if "dictionary_path" in str(e).lower() or "mecabrc" in str(e).lower():
-                 error_message += "\nシステムにMeCabと適切な辞書がインストールされているか、また環境変数 MECABRC が正しく設定されているか確認してください。"
-            raise RuntimeError(error_message) from e
+        self.dictionary_path = dictionary_path
+        self.cache = TokenCache(cache) if isinstance(cache, str) else cache
+        self.backend_name = backend
+        self.preprocessor = TextPreprocessor(preprocess_steps)
+        self.backend = create_backend(backend, dictionary_path)
+        # 従来どおり MeCab の Tagger を直接参照できるようにする（Sudachiの場合は None）
+        self.tagger = getattr(self.backend, "tagger", None)
+        # キャッシュキーに含める辞書の識別子（バックエンド・辞書ファイル・バージョン）
+        self.dictionary_id = self.backend.identity
+        # 計測（無効時はほぼ負荷なし）。バックエンド内の解析処理も同じオブジェクトに記録する
+        self.instrumentation = instrumentation if instrumentation is not None else instrumentation_from_env()
+        self.backend.instrumentation = self.instrumentation
+        # start_pool で起動した常駐のワーカープロセス
+        self._pool = None
+        self._pool_workers = None
 
     def load_csv(self, file_path_or_buffer, encoding='utf-8'):
         """
         CSVファイルを読み込み、Pandas DataFrameとして返します。
+        Excelブック（.xlsx）のパスの場合は ingest.read_excel_evaluations で読み込みます（Parquetのキャッシュを使います）。
 
         Args:
-            file_path_or_buffer (str or file-like object): CSVファイルのパスまたはバッファ。
+            file_path_or_buffer (str or file-like object): CSVファイル・Excelブックのパス、またはCSVのバッファ。
             encoding (str, optional): ファイルのエンコーディング。デフォルトは 'utf-8'。
 
         Returns:
@@ -39,94 +111,346 @@ class MorphologicalAnalyzer:
             Exception: CSVファイルの読み込み中にその他のエラーが発生した場合。
         """
         try:
-            df = pd.read_csv(file_path_or_buffer, encoding=encoding)
+            if isinstance(file_path_or_buffer, str) and file_path_or_buffer.lower().endswith(".xlsx"):
+                # ingest（openpyxl・pyarrow）はExcelブックを読み込むときだけ読み込む
+                from ingest import read_excel_evaluations
+
+                with self.instrumentation.stage("excel_read"):
+                    df = read_excel_evaluations(file_path_or_buffer)
+            else:
+                with self.instrumentation.stage("csv_read"):
+                    df = pd.read_csv(file_path_or_buffer, encoding=encoding)
+            if isinstance(file_path_or_buffer, str):
+                self.instrumentation.count("bytes_read", os.path.getsize(file_path_or_buffer))
             return df
         except FileNotFoundError:
             raise FileNotFoundError(f"指定されたファイルが見つかりません: {file_path_or_buffer}")
         except Exception as e:
             raise Exception(f"CSVファイルの読み込み中にエラーが発生しました: {e}")
 
+    def iter_analyze_csv(self, file_path, column_name, chunksize=10000, encoding='utf-8', workers=1):
+        """
+        CSVファイルをチャンク単位で読み込み、指定した列を形態素解析しながら順に返します。
+        ファイル全体をメモリに読み込まないため、メモリ使用量はチャンクサイズに比例した一定量に収まります。
+
+        使用例:
+            with TokenTableWriter("tokens.parquet") as writer:
+                for chunk_df, tokens in analyzer.iter_analyze_csv("data.csv", "自由記述"):
+                    writer.write(tokens)
+
+        Args:
+            file_path (str or file-like object): CSVファイルのパスまたはバッファ。
+            column_name (str): 形態素解析を行いたい列の名前。
+            chunksize (int, optional): 1回に読み込む行数。デフォルトは 10000。
+            encoding (str, optional): ファイルのエンコーディング。デフォルトは 'utf-8'。
+            workers (int, optional): チャンク内の解析に使うワーカープロセス数。デフォルトは 1。
+
+        Yields:
+            tuple[pd.DataFrame, TokenTable]: 読み込んだチャンクと、その解析結果。
+                                             TokenTable の doc_id はファイル先頭からの通し番号です。
+
+        Raises:
+            FileNotFoundError: ファイルが見つからない場合。
+            ValueError: 指定された列名がCSVファイルに存在しない場合。
+        """
+        try:
+            reader = pd.read_csv(file_path, encoding=encoding, chunksize=chunksize)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"指定されたファイルが見つかりません: {file_path}")
+
+        if isinstance(file_path, str):
+            self.instrumentation.count("bytes_read", os.path.getsize(file_path))
+
+        doc_start = 0
+        with reader:
+            while True:
+                with self.instrumentation.stage("csv_read"):
+                    chunk_df = next(reader, None)
+                if chunk_df is None:
+                    break
+                if column_name not in chunk_df.columns:
+                    raise ValueError(f"指定された列名 '{column_name}' はCSVファイルに存在しません。利用可能な列: {chunk_df.columns.tolist()}")
+                results = self.analyze_texts(chunk_df[column_name], workers=workers)
+                yield chunk_df, TokenTable.from_token_lists(results, doc_start=doc_start)
+                doc_start += len(chunk_df)
+
     def _preprocess_text(self, text):
         """
-        形態素解析の前にテキストを前処理します。
+        形態素解析の前にテキストを前処理します（preprocess_steps で指定した段階を順に適用）。
+        - 自由記述の先頭の評価期間の除去
+        - URLの除去
+        - 絵文字・記号の除去（コンパイル済みの文字クラス1つで照合）
         - NEologdによる正規化
-        - demojiによる絵文字の処理（説明文に置換）
 
         Args:
             text (str): 前処理対象のテキスト。
 
         Returns:
-            str: 前処理後のテキスト。
+            str: 前処理後のテキスト。文字列でない場合（NaNなど）は空文字列。
         """
-        if not isinstance(text, str):
-            return "" # 文字列でない場合は空文字列を返す（NaNなどを考慮）
-        
-        text = str(text) # 明示的に文字列に変換
-        text = neologdn.normalize(text)
-        # text = demoji.replace_string(text, " ") # 絵文字をコロンで囲まれた名前に置換。見つからない場合は第二引数の文字列。
-        return text
+        with self.instrumentation.stage("normalize"):
+            return self.preprocessor(text)
 
-    def analyze_text(self, text):
+    def preprocess_texts(self, texts):
+        """
+        複数のテキストをまとめて前処理します。同じテキストは1回だけ処理します。
+
+        Args:
+            texts (Iterable[str]): 前処理対象のテキスト。
+
+        Returns:
+            list[str]: 入力と同じ順序の前処理後のテキスト。
+        """
+        with self.instrumentation.stage("normalize"):
+            return self.preprocessor.normalize_many(texts)
+
+    def analyze_text(self, text, fields=None, pos_filter=None):
         """
         単一のテキスト文字列を形態素解析し、結果をタプルのリストとして返します。
         各タプルは (表層形, 品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音) の形式です。
         読みや発音がない場合はNoneとなります。
+        fields または pos_filter を指定した場合は、指定した品詞のトークンの指定した要素だけを返します。
+        キャッシュを使わない場合は、必要な要素だけを取り出す高速な解析（MeCabでは出力形式 -F による一括解析）を使います。
 
         Args:
             text (str): 解析対象のテキスト。
+            fields (list[str], optional): 返す要素名（TOKEN_FIELDS の要素。例: ['surface', 'pos', 'base_form']）。
+                                          None の場合は10要素すべて。
+            pos_filter (set[str], optional): 残す品詞（例: {'名詞', '動詞'}）。None の場合はすべて残します。
 
         Returns:
             list[tuple]: 形態素解析結果のリスト。
                          BOS/EOSノードは除外されます。
                          解析対象が空文字列や空白のみの場合は空リストを返します。
+
+        Raises:
+            ValueError: fields に不明な要素名が含まれる場合。
         """
+        projection = fields is not None or pos_filter is not None
+        indices = _field_indices(fields) if projection else None
+        self.instrumentation.count("documents")
         processed_text = self._preprocess_text(text)
         if not processed_text.strip(): # 前処理後、空または空白のみになった場合
             return []
 
-        node = self.tagger.parseToNode(processed_text)
+        if self.cache is None:
+            if projection:
+                return self._parse_fields(processed_text, indices, pos_filter)
+            return self._parse(processed_text)
+
+        key = self.cache.make_key(processed_text, self.dictionary_id)
+        results = self.cache.get(key)
+        if results is None:
+            self.instrumentation.count("cache_misses")
+            results = self._parse(processed_text)
+            self.cache.put(key, results)
+        else:
+            self.instrumentation.count("cache_hits")
+        if projection:
+            # キャッシュには全要素の結果を保存しているため、取り出してから絞り込む
+            return project_tokens(results, indices, pos_filter)
+        return list(results)
+
+    def _parse(self, processed_text):
+        """
+        前処理済みのテキストをバックエンドで解析し、タプルのリストに変換します。
+
+        Args:
+            processed_text (str): _preprocess_text で前処理したテキスト。
+
+        Returns:
+            list[tuple]: analyze_text と同じ形式の形態素解析結果。
+        """
+        results = self.backend.parse(processed_text)
+        self.instrumentation.count("tokens", len(results))
+        return results
+
+    def _parse_fields(self, processed_text, indices, pos_filter):
+        """
+        前処理済みのテキストをバックエンドで解析し、指定した要素だけのタプルのリストに変換します。
+        """
+        results = self.backend.parse_fields(processed_text, indices, pos_filter)
+        self.instrumentation.count("tokens", len(results))
+        return results
+
+    def analyze_texts(self, texts, workers=1, chunksize=None, as_table=False, fields=None, pos_filter=None):
+        """
+        複数のテキストをまとめて形態素解析します。
+        同じテキストは1回だけ解析され、キャッシュが有効な場合はキャッシュにない分だけを解析します。
+        workers が2以上の場合はプロセスプールで並列に解析します。
+        各ワーカーは同じバックエンド・辞書パスで形態素解析器を1回だけ初期化し、チャンク単位でテキストを処理します。
+
+        Args:
+            texts (iterable): 解析対象のテキストのイテラブル。欠損値 (NaN, None) は空文字列として扱います。
+            workers (int, optional): ワーカープロセス数。1の場合は逐次処理。
+                                     None の場合はCPUコア数を使用します。デフォルトは 1。
+            chunksize (int, optional): 1回のタスクでワーカーに渡すテキスト数。
+                                       None の場合はテキスト数とワーカー数から自動で決定します。
+            as_table (bool, optional): True の場合、結果を列指向の TokenTable で返します。デフォルトは False。
+            fields (list[str], optional): 返す要素名。詳細は analyze_text を参照。
+            pos_filter (set[str], optional): 残す品詞。詳細は analyze_text を参照。
+
+        Returns:
+            list[list[tuple]] or TokenTable: 入力と同じ順序の形態素解析結果のリスト。
+                                             各要素は analyze_text の返り値と同じ形式です。
+
+        Raises:
+            ValueError: fields に不明な要素名が含まれる場合、または fields / pos_filter と as_table を同時に指定した場合。
+        """
+        projection = fields is not None or pos_filter is not None
+        if projection and as_table:
+            raise ValueError("fields / pos_filter を指定した場合は as_table を使用できません。")
+        indices = _field_indices(fields) if projection else None
+        texts = [str(text) if pd.notna(text) else "" for text in texts]
+        instrumentation = self.instrumentation
+
+        if projection and self.cache is None and workers == 1:
+            # キャッシュも並列処理も使わない場合は、必要な要素だけを取り出す高速な解析を使う
+            projected = {text: self.analyze_text(text, fields, pos_filter) for text in dict.fromkeys(texts)}
+            instrumentation.count("documents", len(texts) - len(projected))
+            return [list(projected[text]) for text in texts]
+        instrumentation.count("documents", len(texts))
+
+        # 同じテキストは1回だけ解析し、結果を元の位置に展開する（「特になし」などの定型文対策）
+        results_by_text = {}
+        distinct = list(dict.fromkeys(texts))
+        if self.cache is None:
+            keys_by_text = dict.fromkeys(distinct)
+        else:
+            # キャッシュキーを作るため、異なりテキストをまとめて前処理する
+            keys_by_text = {}
+            for text, processed_text in zip(distinct, self.preprocess_texts(distinct)):
+                if not processed_text.strip():
+                    results_by_text[text] = []
+                    continue
+                keys_by_text[text] = self.cache.make_key(processed_text, self.dictionary_id)
+
+        if self.cache is not None:
+            with instrumentation.stage("cache_lookup"):
+                cached = self.cache.get_many(list(keys_by_text.values()))
+            instrumentation.count("cache_hits", len(cached))
+            instrumentation.count("cache_misses", len(keys_by_text) - len(cached))
+            for text, key in list(keys_by_text.items()):
+                if key in cached:
+                    results_by_text[text] = cached[key]
+                    del keys_by_text[text]
+
+        pending = list(keys_by_text.items())
+        pending_results = self._analyze_uncached([text for text, _ in pending], workers, chunksize)
+        for (text, _), results in zip(pending, pending_results):
+            results_by_text[text] = results
+        if self.cache is not None:
+            with instrumentation.stage("cache_store"):
+                self.cache.put_many((key, results) for (_, key), results in zip(pending, pending_results))
+                self.cache.flush()
+
+        if as_table:
+            return TokenTable.from_token_lists([results_by_text[text] for text in texts])
+        if projection:
+            projected = {text: project_tokens(results, indices, pos_filter) for text, results in results_by_text.items()}
+            return [list(projected[text]) for text in texts]
+        return [list(results_by_text[text]) for text in texts]
+
+    def _analyze_uncached(self, texts, workers, chunksize):
+        """
+        キャッシュを介さずにテキストのリストを解析します。必要に応じてプロセスプールを使用します。
+
+        Args:
+            texts (list[str]): 解析対象のテキストのリスト。
+            workers (int): ワーカープロセス数。None の場合はCPUコア数。
+            chunksize (int): ワーカーに1回で渡すテキスト数。None の場合は自動で決定します。
+
+        Returns:
+            list[list[tuple]]: 入力と同じ順序の形態素解析結果のリスト。
+        """
+        pool = self._pool
+        if pool is not None:
+            workers = self._pool_workers
+        elif workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(texts) <= 1:
+            return [self._analyze_without_cache(text) for text in texts]
+
+        if chunksize is None:
+            # ワーカーあたり4チャンク程度になるように分割し、負荷の偏りを抑える
+            chunksize = max(1, -(-len(texts) // (workers * 4)))
+        chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+
         results = []
-        while node:
-            if node.surface: # 表層形が存在するノードのみ (BOS/EOSノード対策)
-                features = node.feature.split(',')
-                surface = node.surface
-                
-                # featuresの要素数は9個と仮定するが、辞書によっては少ない場合があるため、安全にアクセス
-                # (品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音)
-                # 読み(features[7])と発音(features[8])は存在しない場合 '*' になることがあるのでNoneに変換
-                
-                token_info = [surface] + features[:7] # 表層形 + 7つの素性
-                
-                # 読みと発音の処理
-                if len(features) > 7 and features[7] != '*':
-                    token_info.append(features[7])
-                else:
-                    token_info.append(None) # 読みがない場合
-                
-                if len(features) > 8 and features[8] != '*':
-                    token_info.append(features[8])
-                else:
-                    token_info.append(None) # 発音がない場合
-                
-                # 不足している特徴量があればNoneで埋める (最大9個の特徴量 + 表層形 = 10要素)
-                while len(token_info) < 10:
-                    token_info.append(None)
-
-                results.append(tuple(token_info))
-            node = node.next
+        # ワーカー内の計測は親プロセスに集計されないため、並列解析全体の時間を記録する
+        with self.instrumentation.stage("parallel_analyze"):
+            if pool is not None:
+                # executor.map は投入順に結果を返すため、入力と同じ順序が保たれる
+                for chunk_results in pool.map(_analyze_chunk, chunks):
+                    results.extend(chunk_results)
+            else:
+                with self._create_pool(workers) as executor:
+                    for chunk_results in executor.map(_analyze_chunk, chunks):
+                        results.extend(chunk_results)
+        self.instrumentation.count("tokens", sum(len(tokens) for tokens in results))
         return results
 
-    def analyze_column(self, df, column_name):
+    def _create_pool(self, workers):
+        # 親プロセスと同じ辞書・バックエンド・前処理で解析器を初期化するワーカープロセスのプール
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(self.dictionary_path, self.backend_name, self.preprocessor.steps))
+
+    def start_pool(self, workers=None):
+        """
+        解析用のワーカープロセスを起動し、辞書を読み込んだ状態で常駐させます。
+        起動後の analyze_texts は workers の指定に関わらずこのプールで並列に解析するため、
+        呼び出しごとにワーカーを起動して辞書を読み込み直す時間がかかりません（解析サービスなど、繰り返し呼び出す場合向け）。
+
+        Args:
+            workers (int, optional): ワーカープロセス数。None の場合はCPUコア数。
+        """
+        if self._pool is not None:
+            return
+        workers = workers or os.cpu_count() or 1
+        self._pool = self._create_pool(workers)
+        self._pool_workers = workers
+        # 各ワーカーに空のタスクを渡し、辞書の読み込みを起動時に済ませる
+        list(self._pool.map(_analyze_chunk, [[""]] * workers))
+
+    def close_pool(self):
+        """
+        start_pool で起動したワーカープロセスを終了します。
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_workers = None
+
+    def _analyze_without_cache(self, text):
+        """キャッシュを参照せずに単一のテキストを解析します。"""
+        processed_text = self._preprocess_text(text)
+        if not processed_text.strip():
+            return []
+        return self._parse(processed_text)
+
+    def cache_stats(self):
+        """
+        解析結果キャッシュのヒット数・ミス数を返します。
+
+        Returns:
+            dict or None: TokenCache.stats の返り値。キャッシュを使用していない場合は None。
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    def analyze_column(self, df, column_name, workers=1, chunksize=None, as_table=False):
         """
         DataFrameの指定された列に含まれる各テキストを形態素解析します。
 
         Args:
             df (pd.DataFrame): 対象のDataFrame。
             column_name (str): 形態素解析を行いたい列の名前。
+            workers (int, optional): 並列解析に使うワーカープロセス数。デフォルトは 1（逐次処理）。
+            chunksize (int, optional): ワーカーに1回で渡す行数。詳細は analyze_texts を参照。
+            as_table (bool, optional): True の場合、結果を列指向の TokenTable で返します。デフォルトは False。
 
         Returns:
-            list[list[tuple]]: DataFrameの各行に対する形態素解析結果のリスト。
-                               各内部リストは analyze_text の返り値と同じ形式です。
+            list[list[tuple]] or TokenTable: DataFrameの各行に対する形態素解析結果のリスト。
+                                             各内部リストは analyze_text の返り値と同じ形式です。
 
         Raises:
             ValueError: 指定された列名がDataFrameに存在しない場合。
@@ -134,12 +458,8 @@ class MorphologicalAnalyzer:
         if column_name not in df.columns:
             raise ValueError(f"指定された列名 '{column_name}' はDataFrameに存在しません。利用可能な列: {df.columns.tolist()}")
 
-        all_analysis_results = []
-        for text_content in df[column_name]:
-            # Pandasの欠損値 (NaN) やその他の非文字列型を安全に処理
-            analysis_result = self.analyze_text(str(text_content) if pd.notna(text_content) else "")
-            all_analysis_results.append(analysis_result)
-        return all_analysis_results
+        # Pandasの欠損値 (NaN) やその他の非文字列型は analyze_texts 内で安全に処理される
+        return self.analyze_texts(df[column_name], workers=workers, chunksize=chunksize, as_table=as_table)
 
 if __name__ == '__main__':
     # --- このクラスの簡単な使用例 ---
@@ -0,0 +1,77 @@
+# キーワード検索ページ（形態素解析の結果の転置インデックスを使う）
+import streamlit as st
+import os
+import time
+from 形態素解析.morphological_analyzer import MorphologicalAnalyzer
+from 形態素解析.lemma_index import DEFAULT_INDEX_DIR, INDEX_MANIFEST, LemmaIndex, update_index
+
+# --- 定数設定 ---
+DEFAULT_DATA_DIR = "(CSV)2025 raw" # インデックスを作成する講義評価のディレクトリ（またはParquetデータセット）
+KWIC_LIMIT = 200 # KWICで表示する箇所の最大数
+QUERY_HELP = "空白区切りの語をすべて含むコメントを検索します。「語1 OR 語2」でどちらか、「-語」で除外、\"...\" で連続した語の並び、「語/品詞」で品詞を指定します。"
+
+@st.cache_resource # MeCabの初期化はリソース消費が大きいのでキャッシュする
+def get_query_analyzer():
+    """検索式の語を原形に直すMorphologicalAnalyzerのインスタンスを返す関数。"""
+    return MorphologicalAnalyzer()
+
+@st.cache_resource # インデックスの読み込みは1回だけ行う（更新されたらマニフェストの更新日時が変わり読み込み直す）
+def get_index(index_dir, manifest_mtime):
+    """転置インデックスを読み込んで返す関数。"""
+    return LemmaIndex(index_dir, analyzer=get_query_analyzer())
+
+st.title("キーワード検索")
+
+# 0. インデックスの設定・更新
+st.sidebar.header("インデックス設定")
+index_dir = st.sidebar.text_input("インデックスのディレクトリ", DEFAULT_INDEX_DIR)
+data_dir = st.sidebar.text_input("講義評価のディレクトリ", DEFAULT_DATA_DIR, help="CSV・Excelブックのディレクトリ、または取り込み済みのParquetデータセット")
+if st.sidebar.button("インデックスを作成・更新"):
+    if not os.path.isdir(data_dir):
+        st.sidebar.error(f"指定されたディレクトリが見つかりません: {data_dir}")
+    else:
+        with st.spinner("インデックスを更新中... (変更のないファイルは再利用します)"):
+            summary = update_index(data_dir, index_dir, analyzer=get_query_analyzer())
+        st.sidebar.success(f"{summary['n_documents']}件（解析 {len(summary['indexed'])}ファイル、再利用 {len(summary['reused'])}ファイル）")
+        for message in summary["skipped"]:
+            st.sidebar.warning(f"読み飛ばしました: {message}")
+
+manifest_path = os.path.join(index_dir, INDEX_MANIFEST)
+if not os.path.isfile(manifest_path):
+    st.info("インデックスがありません。サイドバーの「インデックスを作成・更新」を実行してください。")
+    st.stop()
+index = get_index(index_dir, os.path.getmtime(manifest_path))
+st.caption(f"インデックス: {index.n_documents}件のコメント（{len(index.manifest['units'])}ファイル）")
+
+# 1. 検索
+query = st.text_input("検索式", placeholder='例: 課題 多い / "課題が多い" OR 宿題 -楽しい', help=QUERY_HELP)
+if query:
+    try:
+        start = time.perf_counter()
+        doc_ids = index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+    except ValueError as e:
+        st.error(f"検索式のエラー: {e}")
+        st.stop()
+
+    ratings = index.documents["rating"]
+    count_col, rating_col, all_col = st.columns(3)
+    count_col.metric("該当コメント", f"{len(doc_ids)}件")
+    rating_col.metric("平均評価（該当）", f"{ratings.iloc[doc_ids].mean():.2f}" if len(doc_ids) else "-")
+    all_col.metric("平均評価（全体）", f"{ratings.mean():.2f}")
+    st.caption(f"検索時間: {elapsed:.1f} ms")
+
+    kwic_tab, lecture_tab, document_tab = st.tabs(["KWIC", "講義別の集計", "コメント"])
+    with kwic_tab:
+        window = st.slider("前後のトークン数", min_value=1, max_value=20, value=5)
+        st.dataframe(index.kwic(query, window=window, limit=KWIC_LIMIT), use_container_width=True, hide_index=True)
+    with lecture_tab:
+        st.dataframe(index.lecture_stats(doc_ids), use_container_width=True, hide_index=True,
+                     column_config={"share": st.column_config.NumberColumn("割合", format="%.3f"),
+                                    "rating": st.column_config.NumberColumn("平均評価", format="%.2f"),
+                                    "rating_std": st.column_config.NumberColumn("評価の標準偏差", format="%.2f"),
+                                    "matches": "該当件数", "documents": "コメント数"})
+    with document_tab:
+        st.dataframe(index.documents.iloc[doc_ids[:KWIC_LIMIT]], use_container_width=True)
+else:
+    st.info("検索式を入力すると、該当するコメントと講義ごとの評価を表示します。")
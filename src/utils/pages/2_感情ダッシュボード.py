@@ -0,0 +1,65 @@
+# 感情ダッシュボードページ（講義・学科・学期・年度ごとの要約を表示する。分析結果の行は読み込まない）
+import streamlit as st
+import os
+from 形態素解析.sentiment_cubes import CUBE_MANIFEST, DEFAULT_CUBE_DIR, LEVEL_LABELS, LEVELS, load_cube, update_cubes
+
+# --- 定数設定 ---
+DEFAULT_ANALYSIS_DIR = os.path.join("(CSV)2025 raw", "analysis") # batch_analyze の出力先（*_analysis.csv）
+STAT_LABELS = {"count": "件数", "mean": "平均感情スコア", "variance": "分散", "std": "標準偏差", "q10": "10%点", "q25": "25%点",
+               "q50": "中央値", "q75": "75%点", "q90": "90%点", "rating": "平均評価ポイント",
+               "top_positive": "上位のポジティブ表現", "top_negative": "上位のネガティブ表現"} # 要約の列の表示名
+
+@st.cache_data # 要約は小さいので読み込んだ結果をキャッシュする（更新されたらマニフェストの更新日時が変わり読み込み直す）
+def get_cubes(cube_dir, manifest_mtime):
+    """LEVELS のすべての単位の要約を読み込んで返す関数。"""
+    return {level: load_cube(level, cube_dir) for level in LEVELS}
+
+st.title("感情ダッシュボード")
+
+# 0. 要約の設定・更新
+st.sidebar.header("集計設定")
+cube_dir = st.sidebar.text_input("要約のディレクトリ", DEFAULT_CUBE_DIR)
+analysis_dir = st.sidebar.text_input("分析結果のディレクトリ", DEFAULT_ANALYSIS_DIR, help="*_analysis.csv（または分析結果のExcelブック）のディレクトリ")
+if st.sidebar.button("要約を作成・更新"):
+    if not os.path.exists(analysis_dir):
+        st.sidebar.error(f"指定されたディレクトリが見つかりません: {analysis_dir}")
+    else:
+        with st.spinner("要約を更新中... (変更のないファイルは再利用します)"):
+            summary = update_cubes(analysis_dir, cube_dir)
+        st.sidebar.success(f"{summary['n_rows']}件（集計 {len(summary['aggregated'])}ファイル、再利用 {len(summary['reused'])}ファイル）")
+        for message in summary["skipped"]:
+            st.sidebar.warning(f"読み飛ばしました: {message}")
+
+manifest_path = os.path.join(cube_dir, CUBE_MANIFEST)
+if not os.path.isfile(manifest_path):
+    st.info("要約がありません。サイドバーの「要約を作成・更新」を実行してください。")
+    st.stop()
+cubes = get_cubes(cube_dir, os.path.getmtime(manifest_path))
+
+departments = sorted(cubes["department"]["学科"].dropna())
+selected = st.multiselect("学科", departments, default=departments)
+
+# 1. 学科ごとの比較
+st.header("1. 学科ごとの比較")
+department = cubes["department"][cubes["department"]["学科"].isin(selected)]
+st.bar_chart(department.set_index("学科")["mean"], y_label="平均感情スコア")
+st.dataframe(department.rename(columns=STAT_LABELS), use_container_width=True, hide_index=True)
+
+# 2. 講義ごとの感情スコアと平均評価ポイント
+st.header("2. 講義ごとの感情スコアと平均評価ポイント")
+min_count = st.slider("最小件数", min_value=1, max_value=50, value=5, help="コメントがこの件数未満の講義は表示しません")
+lecture = cubes["lecture"][cubes["lecture"]["学科"].isin(selected) & (cubes["lecture"]["count"] >= min_count)]
+if len(lecture) > 1:
+    st.metric("相関係数（平均感情スコアと平均評価ポイント）", f"{lecture['mean'].corr(lecture['rating']):.3f}")
+    st.scatter_chart(lecture, x="rating", y="mean", color="学科", size="count", x_label="平均評価ポイント", y_label="平均感情スコア")
+st.dataframe(lecture.sort_values("mean").rename(columns=STAT_LABELS), use_container_width=True, hide_index=True)
+
+# 3. 年度・学期ごとの推移
+st.header("3. 年度・学期ごとの推移")
+trend = cubes["department_year"][cubes["department_year"]["学科"].isin(selected)].dropna(subset=["academic_year"])
+if trend.empty:
+    st.info("評価期間（評価開始日）のある分析結果がないため、年度ごとの推移は表示できません。")
+else:
+    st.line_chart(trend.pivot(index="academic_year", columns="学科", values="mean"), x_label="年度", y_label="平均感情スコア")
+level = st.radio("単位", ["semester", "year"], format_func=LEVEL_LABELS.get, horizontal=True)
+st.dataframe(cubes[level].rename(columns=STAT_LABELS), use_container_width=True, hide_index=True)
@@ -0,0 +1,333 @@
+import argparse
+import os
+import struct
+import time
+import numpy as np
+import pandas as pd
+
+# コンパイル済み感情極性辞書のファイル形式
+#   ヘッダ: マジック(4バイト), バージョン, キー数, 表層形キー数, キー幅(バイト)
+#   本体  : 固定長バイト列のキー配列（UTF-8, 昇順）, float32 のスコア配列
+# キー配列は固定長なので np.memmap で開くだけで np.searchsorted による二分探索ができる。
+MAGIC = b"PNLX"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sIQQI")
+# キーの要素（表層形・読み・品詞）の区切り文字
+KEY_SEP = "\t"
+
+
+def make_key(surface, reading=None, pos=None):
+    """
+    辞書のキー文字列を作成します。
+
+    Args:
+        surface (str): 表層形。
+        reading (str, optional): 読み。指定する場合は pos も必要です。
+        pos (str, optional): 品詞。
+
+    Returns:
+        str: 「表層形」「表層形\\t品詞」「表層形\\t読み\\t品詞」のいずれかの形式のキー。
+    """
+    if pos is None:
+        return surface
+    if reading is None:
+        return f"{surface}{KEY_SEP}{pos}"
+    return f"{surface}{KEY_SEP}{reading}{KEY_SEP}{pos}"
+
+
+def parse_pn_dic(dic_path, encoding="shift-jis"):
+    """
+    単語感情極性対応表（pn_ja.dic）を読み込みます。
+    各行は「表層形:読み:品詞:スコア」の形式です。
+
+    Args:
+        dic_path (str): pn_ja.dic のパス。
+        encoding (str, optional): ファイルのエンコーディング。デフォルトは 'shift-jis'。
+
+    Returns:
+        list[tuple[str, str, str, float]]: (表層形, 読み, 品詞, スコア) のリスト。ファイル内の順序を保ちます。
+
+    Raises:
+        FileNotFoundError: ファイルが見つからない場合。
+    """
+    if not os.path.isfile(dic_path):
+        raise FileNotFoundError(f"感情極性辞書が見つかりません: {dic_path}")
+    entries = []
+    with open(dic_path, encoding=encoding, errors="replace") as f:
+        for line in f:
+            parts = line.rstrip("\r\n").rsplit(":", 3)
+            if len(parts) < 4:
+                continue
+            surface, reading, pos, score = parts
+            try:
+                entries.append((surface, reading, pos, float(score)))
+            except ValueError:
+                continue
+    return entries
+
+
+def compile_pn_dic(dic_path, artifact_path, encoding="shift-jis"):
+    """
+    pn_ja.dic をコンパイル済みのバイナリ辞書に変換します。初回に1度だけ実行すれば十分です。
+    同じキーが複数回現れた場合は、従来の load_pn_table と同じく後に出現したスコアを採用します。
+
+    Args:
+        dic_path (str): 入力の pn_ja.dic のパス。
+        artifact_path (str): 出力するバイナリ辞書のパス。
+        encoding (str, optional): 入力ファイルのエンコーディング。デフォルトは 'shift-jis'。
+
+    Returns:
+        int: 登録したキーの数。
+    """
+    return write_lexicon(parse_pn_dic(dic_path, encoding=encoding), artifact_path)
+
+
+def write_lexicon(entries, artifact_path):
+    """
+    (表層形, 読み, 品詞, スコア) のリストからバイナリ辞書を作成します。
+    表層形のみ・表層形+品詞・表層形+読み+品詞の3種類のキーを登録します。
+
+    Args:
+        entries (iterable[tuple[str, str, str, float]]): 辞書の項目。
+        artifact_path (str): 出力先のパス。
+
+    Returns:
+        int: 登録したキーの数。
+    """
+    scores = {}
+    surfaces = set()
+    for surface, reading, pos, score in entries:
+        surfaces.add(surface)
+        scores[make_key(surface)] = score
+        scores[make_key(surface, pos=pos)] = score
+        scores[make_key(surface, reading, pos)] = score
+
+    encoded = sorted((key.encode("utf-8"), score) for key, score in scores.items())
+    width = max((len(key) for key, _ in encoded), default=1)
+    keys = np.array([key for key, _ in encoded], dtype=f"S{width}")
+    values = np.array([score for _, score in encoded], dtype=np.float32)
+
+    directory = os.path.dirname(os.path.abspath(artifact_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(artifact_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), len(surfaces), width))
+        f.write(keys.tobytes())
+        f.write(values.tobytes())
+    return len(keys)
+
+
+class PolarityLexicon:
+    """
+    コンパイル済みの感情極性辞書。
+    ファイルをメモリマップで開くため読み込みは一瞬で終わり、
+    複数のワーカープロセスで同じファイルを開いてもOSのページキャッシュが共有されコピーは発生しません。
+    従来の pn_dict（表層形→スコアの辞書）と同じく `word in lexicon` / `lexicon[word]` で参照できます。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): compile_pn_dic で作成したバイナリ辞書のパス。
+
+        Raises:
+            FileNotFoundError: ファイルが見つからない場合。
+            ValueError: ファイル形式が正しくない場合。
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"コンパイル済みの感情極性辞書が見つかりません: {path}")
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"感情極性辞書のファイル形式が正しくありません: {path}")
+        magic, version, n_keys, n_words, width = _HEADER.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"感情極性辞書のファイル形式が正しくありません: {path}（再コンパイルしてください）")
+
+        self.path = path
+        self.n_words = n_words
+        self.keys = np.memmap(path, dtype=f"S{width}", mode="r", offset=_HEADER.size, shape=(n_keys,))
+        self.scores = np.memmap(path, dtype=np.float32, mode="r",
+                                offset=_HEADER.size + n_keys * width, shape=(n_keys,))
+
+    @classmethod
+    def load(cls, path):
+        """
+        バイナリ辞書を開きます。
+
+        Args:
+            path (str): compile_pn_dic で作成したバイナリ辞書のパス。
+
+        Returns:
+            PolarityLexicon: 辞書。
+        """
+        return cls(path)
+
+    def __reduce__(self):
+        # プロセス間で受け渡す際は配列をコピーせず、受け取り側で同じファイルを開き直す
+        return (self.__class__, (self.path,))
+
+    def __len__(self):
+        return self.n_words
+
+    def __contains__(self, surface):
+        return self._index(make_key(surface)) is not None
+
+    def __getitem__(self, surface):
+        index = self._index(make_key(surface))
+        if index is None:
+            raise KeyError(surface)
+        return float(self.scores[index])
+
+    def get(self, surface, default=None, reading=None, pos=None):
+        """
+        スコアを取得します。読み・品詞が指定された場合は、より詳細なキーから順に探します。
+
+        Args:
+            surface (str): 表層形。
+            default (optional): 見つからない場合の返り値。デフォルトは None。
+            reading (str, optional): 読み。
+            pos (str, optional): 品詞。
+
+        Returns:
+            float: スコア。見つからない場合は default。
+        """
+        candidates = []
+        if pos is not None:
+            if reading is not None:
+                candidates.append(make_key(surface, reading, pos))
+            candidates.append(make_key(surface, pos=pos))
+        candidates.append(make_key(surface))
+        for key in candidates:
+            index = self._index(key)
+            if index is not None:
+                return float(self.scores[index])
+        return default
+
+    def lookup_many(self, surfaces, pos=None):
+        """
+        複数の語のスコアをまとめて取得します（np.searchsorted による一括二分探索）。
+
+        Args:
+            surfaces (list[str]): 表層形のリスト。
+            pos (list[str], optional): 各語の品詞のリスト。指定した場合は「表層形+品詞」のキーで探します。
+
+        Returns:
+            np.ndarray: float32 のスコア配列。辞書にない語は NaN。
+        """
+        if pos is None:
+            keys = [make_key(surface) for surface in surfaces]
+        else:
+            keys = [make_key(surface, pos=p) for surface, p in zip(surfaces, pos)]
+        result = np.full(len(keys), np.nan, dtype=np.float32)
+        if not keys or len(self.keys) == 0:
+            return result
+        encoded = np.array([key.encode("utf-8") for key in keys], dtype=object)
+        # 辞書のキー幅より長い語は辞書に存在しない
+        fits = np.array([len(key) <= self.keys.itemsize for key in encoded], dtype=bool)
+        query = np.array(encoded[fits].tolist(), dtype=self.keys.dtype) if fits.any() else np.array([], dtype=self.keys.dtype)
+        positions = np.searchsorted(self.keys, query)
+        positions = np.minimum(positions, len(self.keys) - 1)
+        matched = self.keys[positions] == query
+        found = np.flatnonzero(fits)[matched]
+        result[found] = self.scores[positions[matched]]
+        return result
+
+    def to_dict(self):
+        """
+        表層形→スコアの通常の辞書に変換します（従来の pn_dict と同じ形式）。
+
+        Returns:
+            dict[str, float]: 表層形とスコアの辞書。
+        """
+        result = {}
+        sep = KEY_SEP.encode("utf-8")
+        for key, score in zip(self.keys.tolist(), self.scores.tolist()):
+            if sep not in key:
+                result[key.decode("utf-8")] = score
+        return result
+
+    def _index(self, key):
+        encoded = key.encode("utf-8")
+        if len(encoded) > self.keys.itemsize or len(self.keys) == 0:
+            return None
+        index = int(np.searchsorted(self.keys, encoded))
+        if index < len(self.keys) and self.keys[index] == encoded:
+            return index
+        return None
+
+
+def load_pn_table_iterrows(dic_path, encoding="shift-jis"):
+    """
+    従来の load_pn_table と同じ方法（read_csv + iterrows）で辞書を作成します。ベンチマークの比較用です。
+
+    Args:
+        dic_path (str): pn_ja.dic のパス。
+        encoding (str, optional): ファイルのエンコーディング。
+
+    Returns:
+        dict[str, float]: 表層形とスコアの辞書。
+    """
+    pndic = pd.read_csv(dic_path, encoding=encoding, names=['word_type_score'])
+    pn_dict = {}
+    for _, row in pndic.iterrows():
+        parts = row['word_type_score'].split(':')
+        if len(parts) >= 2:
+            word = parts[0]
+            score = float(parts[3]) if len(parts) > 3 and parts[3] != "0" else 0.0
+            pn_dict[word] = score
+    return pn_dict
+
+
+def benchmark_load(dic_path, artifact_path, repeat=3):
+    """
+    従来の iterrows による読み込みと、コンパイル済み辞書の読み込み時間を比較します。
+
+    Args:
+        dic_path (str): pn_ja.dic のパス。
+        artifact_path (str): コンパイル済み辞書のパス。存在しない場合は作成します。
+        repeat (int, optional): 計測回数。最短時間を採用します。デフォルトは 3。
+
+    Returns:
+        dict: iterrows_sec, compiled_sec, speedup を含む辞書。
+    """
+    if not os.path.isfile(artifact_path):
+        compile_pn_dic(dic_path, artifact_path)
+
+    def measure(func):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    iterrows_sec = measure(lambda: load_pn_table_iterrows(dic_path))
+    compiled_sec = measure(lambda: PolarityLexicon.load(artifact_path))
+    return {
+        "iterrows_sec": iterrows_sec,
+        "compiled_sec": compiled_sec,
+        "speedup": iterrows_sec / compiled_sec if compiled_sec else float("inf"),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="単語感情極性対応表のコンパイルとベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser("compile", help="pn_ja.dic をバイナリ辞書に変換します")
+    compile_parser.add_argument("dic_path", help="入力の pn_ja.dic のパス")
+    compile_parser.add_argument("artifact_path", help="出力するバイナリ辞書のパス")
+
+    bench_parser = subparsers.add_parser("bench", help="読み込み時間を従来の方法と比較します")
+    bench_parser.add_argument("dic_path", help="pn_ja.dic のパス")
+    bench_parser.add_argument("artifact_path", help="バイナリ辞書のパス")
+
+    args = parser.parse_args()
+    if args.command == "compile":
+        n_keys = compile_pn_dic(args.dic_path, args.artifact_path)
+        print(f"感情極性辞書をコンパイルしました: {args.artifact_path}（キー数: {n_keys}）")
+    else:
+        result = benchmark_load(args.dic_path, args.artifact_path)
+        print(f"iterrows による読み込み: {result['iterrows_sec'] * 1000:.1f} ms")
+        print(f"コンパイル済み辞書の読み込み: {result['compiled_sec'] * 1000:.3f} ms")
+        print(f"高速化倍率: {result['speedup']:.0f} 倍")
@@ -0,0 +1,226 @@
+import pickle
+from collections import deque
+import numpy as np
+
+
+def token_key(token):
+    """
+    トークンから照合に使う (見出し語, 品詞) の組を取り出します。
+
+    Args:
+        token: analyze_text のタプル、SudachiPyの Morpheme、または文字列。
+
+    Returns:
+        tuple[str, str or None]: (見出し語, 品詞)。
+            タプルは原形（ない場合は表層形）と品詞、Morpheme は正規化表記と品詞大分類を使います。
+    """
+    if isinstance(token, tuple):
+        base = token[7] if len(token) > 7 and token[7] not in (None, '*') else token[0]
+        return base, token[1] if len(token) > 1 else None
+    if hasattr(token, "normalized_form"):
+        return token.normalized_form(), token.part_of_speech()[0]
+    return token, None
+
+
+class PolarityMatcher:
+    """
+    見出し語の並びで感情極性辞書を照合するマッチャー。
+    辞書の各項目をトークン列（見出し語の並び）に変換し、トークン単位のAho-Corasickオートマトンを1度だけ構築します。
+    文書は1回の線形走査で照合されるため、辞書の項目数が数十万件になっても1トークンあたりの処理量は変わりません。
+    活用形（「楽しかった」→「楽しい」）は見出し語で、複数語の表現（「気が利く」）はトークン列で一致します。
+    """
+
+    def __init__(self):
+        # オートマトンの状態。状態0が根
+        self._goto = [{}]
+        self._fail = [0]
+        # 状態で終わるパターン（自身と失敗リンク先を含む）の (パターン長, パターンID) のリスト
+        self._outputs = [[]]
+        # パターンID -> {品詞: 項目ID}。品詞を問わない項目はキー None
+        self._pattern_entries = []
+        # 項目ID -> 表示名, スコア
+        self.labels = []
+        self.scores = []
+        self._compiled = False
+
+    @classmethod
+    def from_entries(cls, entries, tokenize, key=token_key):
+        """
+        感情極性辞書の項目からマッチャーを構築します。
+
+        Args:
+            entries (iterable[tuple[str, str, str, float]]): parse_pn_dic が返す (表層形, 読み, 品詞, スコア) の項目。
+            tokenize (callable): 文字列をトークンのリストに変換する関数。文書の解析と同じ解析器を使ってください。
+            key (callable, optional): トークンから (見出し語, 品詞) を取り出す関数。デフォルトは token_key。
+
+        Returns:
+            PolarityMatcher: 構築済みのマッチャー。
+        """
+        matcher = cls()
+        for surface, _, pos, score in entries:
+            lemmas = [key(token)[0] for token in tokenize(surface)]
+            if lemmas:
+                matcher.add(lemmas, score, pos=pos, label=surface)
+        matcher.compile()
+        return matcher
+
+    def add(self, lemmas, score, pos=None, label=None):
+        """
+        パターンを1件追加します。追加後は compile を呼び出してください。
+        同じ見出し語列・品詞の項目が複数ある場合は後から追加したものが優先されます。
+
+        Args:
+            lemmas (list[str]): パターンの見出し語の並び。
+            score (float): 極性スコア。
+            pos (str, optional): 先頭トークンの品詞。None の場合は品詞を問いません。
+            label (str, optional): 説明に表示する名前。None の場合は見出し語を連結した文字列。
+        """
+        state = 0
+        for lemma in lemmas:
+            next_state = self._goto[state].get(lemma)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][lemma] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+
+        own = [pattern_id for length, pattern_id in self._outputs[state] if length == len(lemmas)]
+        if own:
+            pattern_id = own[0]
+        else:
+            pattern_id = len(self._pattern_entries)
+            self._pattern_entries.append({})
+            self._outputs[state].append((len(lemmas), pattern_id))
+
+        entry_id = len(self.labels)
+        self.labels.append(label if label is not None else "".join(lemmas))
+        self.scores.append(float(score))
+        self._pattern_entries[pattern_id][pos] = entry_id
+        self._compiled = False
+
+    def compile(self):
+        """
+        失敗リンクを計算し、オートマトンを照合可能な状態にします。
+        """
+        # 各状態の自身のパターン（失敗リンク経由の出力を除く）から作り直す
+        depth = [0] * len(self._goto)
+        own_outputs = [[] for _ in self._goto]
+        queue = deque([0])
+        while queue:
+            state = queue.popleft()
+            for next_state in self._goto[state].values():
+                depth[next_state] = depth[state] + 1
+                queue.append(next_state)
+        for state, outputs in enumerate(self._outputs):
+            own_outputs[state] = [output for output in outputs if output[0] == depth[state]]
+
+        self._fail = [0] * len(self._goto)
+        self._outputs = own_outputs
+        queue = deque()
+        for next_state in self._goto[0].values():
+            queue.append(next_state)
+        while queue:
+            state = queue.popleft()
+            for lemma, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and lemma not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(lemma, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+                queue.append(next_state)
+        self._compiled = True
+
+    def __len__(self):
+        return len(self.labels)
+
+    def match(self, tokens, key=token_key, strict_pos=False):
+        """
+        文書のトークン列を1回走査し、重ならない最長一致の項目を返します。
+
+        Args:
+            tokens (list): 文書のトークンのリスト。
+            key (callable, optional): トークンから (見出し語, 品詞) を取り出す関数。デフォルトは token_key。
+            strict_pos (bool, optional): True の場合、品詞が一致しない項目は採用しません。
+                                         False の場合は品詞が一致する項目を優先し、なければ同じ見出し語の項目を使います。
+
+        Returns:
+            list[tuple[int, int, int]]: (開始位置, 終了位置(含まない), 項目ID) のリスト。開始位置の昇順です。
+        """
+        if not self._compiled:
+            self.compile()
+
+        keys = [key(token) for token in tokens]
+        candidates = []
+        state = 0
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        for position, (lemma, _) in enumerate(keys):
+            while state and lemma not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(lemma, 0)
+            for length, pattern_id in outputs[state]:
+                candidates.append((position - length + 1, -length, pattern_id))
+
+        # 左端優先・最長一致で重ならないものを選ぶ
+        candidates.sort()
+        matches = []
+        covered_until = 0
+        for start, negative_length, pattern_id in candidates:
+            if start < covered_until:
+                continue
+            entry_id = self._resolve(pattern_id, keys[start][1], strict_pos)
+            if entry_id is None:
+                continue
+            end = start - negative_length
+            matches.append((start, end, entry_id))
+            covered_until = end
+        return matches
+
+    def _resolve(self, pattern_id, pos, strict_pos):
+        entries = self._pattern_entries[pattern_id]
+        if pos in entries:
+            return entries[pos]
+        if None in entries:
+            return entries[None]
+        if strict_pos:
+            return None
+        # 品詞が一致しない場合は最後に登録された項目を使う（従来の表層形の辞書と同じ優先順位）
+        return max(entries.values())
+
+    def match_ids(self, tokens, key=token_key, strict_pos=False):
+        """
+        match の結果のうち項目IDだけを出現順に返します。
+
+        Returns:
+            np.ndarray: 項目IDの int64 配列。
+        """
+        return np.array([entry_id for _, _, entry_id in self.match(tokens, key=key, strict_pos=strict_pos)],
+                        dtype=np.int64)
+
+    def save(self, path):
+        """
+        構築済みのマッチャーをファイルに保存します。辞書の再解析を省略するために使います。
+
+        Args:
+            path (str): 保存先のパス。
+        """
+        if not self._compiled:
+            self.compile()
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """
+        save で保存したマッチャーを読み込みます。
+
+        Args:
+            path (str): ファイルのパス。
+
+        Returns:
+            PolarityMatcher: マッチャー。
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,317 @@
+# 感情分析の結果を講義・学科・学期・年度ごとに集計した要約（キューブ）の作成と差分更新
+#
+# 使用例:
+#   python src/utils/sentiment_cubes.py "data/raw/2025/analysis"            # *_analysis.csv のディレクトリ
+#   python src/utils/sentiment_cubes.py . --level department               # Book1.xlsx のような分析結果のブック
+#
+# 入力は test2.process_csv_file / batch_analyze の *_analysis.csv（講義名・平均評価ポイント・感情スコア・
+# ポジティブ表現・ネガティブ表現・評価開始日）と、同じ列のシートを持つExcelブックです。
+# 学科はファイル名（シート名）の「extracted_<学科>_analysis」から、年度・学期は評価開始日から求めます。
+#
+# 入力ファイルごとに、最も細かい単位（学科・講義・年度・学期）の部分集計を作成してParquetで保存します。
+# 部分集計は件数・合計・二乗和・感情スコアのヒストグラム・感情表現の出現回数で、足し合わせるだけで上位の単位にまとまるため、
+# 内容の変わっていないファイルの部分集計は再利用し、各単位の要約は部分集計を足し合わせて作り直します。
+# 分位点はヒストグラム（SCORE_RANGE を HISTOGRAM_BINS 等分）から求めるため、誤差はビンの幅（0.01）以下です。
+import argparse
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingest import LECTURE_PATTERN, RATING_PATTERN, detect_encoding, is_excel_file, list_input_files, read_raw_excel
+from unit_store import UnitStore, file_digest
+
+DEFAULT_CUBE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'processed', 'sentiment_cubes')
+CUBE_MANIFEST = 'cubes.json'
+# 部分集計の形式の版。形式を変えた場合は上げて作り直す
+CUBE_VERSION = 1
+
+# 分析結果の列（講義名・平均評価ポイントは ingest と同じ形式）
+SCORE_COLUMN = '感情スコア'
+WORD_COLUMNS = {'positive': 'ポジティブ表現', 'negative': 'ネガティブ表現'}
+PERIOD_COLUMN = '評価開始日'
+# 部分集計の単位（最も細かい単位）
+CELL_KEYS = ['学科', '講義コード', '講義名', 'academic_year', 'semester']
+# 要約を作成する単位と、その列
+LEVELS = {
+    'lecture': ['学科', '講義コード', '講義名'],
+    'department': ['学科'],
+    'semester': ['academic_year', 'semester'],
+    'year': ['academic_year'],
+    'department_year': ['学科', 'academic_year'],
+}
+LEVEL_LABELS = {'lecture': '講義', 'department': '学科', 'semester': '学期', 'year': '年度', 'department_year': '学科×年度'}
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+HISTOGRAM_BINS = 200
+SCORE_RANGE = (-1.0, 1.0)
+# 要約に残す感情表現の数
+TOP_WORDS = 10
+
+# 「extracted_情報工学_analysis」→ 情報工学
+_DEPARTMENT_PATTERN = re.compile(r'^(?:extracted_)?(?P<学科>.+?)(?:_analysis)?$')
+# 「社会(-0.82), や(-0.28)」の1つの感情表現
+_WORD_PATTERN = re.compile(r'(?:^|,\s*)(?P<word>[^,]+?)\((?P<value>-?[0-9.]+)\)')
+
+
+def department_of(name):
+    """
+    分析結果のファイル名（拡張子を除く）またはシート名から学科名を求めます。
+
+    Args:
+        name (str): 「extracted_<学科>_analysis」形式の名前。
+
+    Returns:
+        str: 学科名。形式が異なる場合は名前をそのまま返します。
+    """
+    return _DEPARTMENT_PATTERN.match(name).group('学科')
+
+
+def list_analysis_files(path):
+    """
+    分析結果のファイル（CSV・Excelブック）を列挙します。path がファイルの場合はそのファイルだけを返します。
+
+    Returns:
+        list[str]: ファイルのパス（名前順）。
+    """
+    return [path] if os.path.isfile(path) else list_input_files(path)
+
+
+def read_analysis_file(path):
+    """
+    分析結果のファイルを1つ読み込み、集計に使う列に分解します。感情スコアがない行は除きます。
+
+    Args:
+        path (str): *_analysis.csv、または分析結果のシートを持つExcelブックのパス。
+
+    Returns:
+        pd.DataFrame: CELL_KEYS・rating・感情スコア・ポジティブ表現・ネガティブ表現の列を持つDataFrame。
+
+    Raises:
+        ValueError: 感情スコアの列がない場合。
+    """
+    if is_excel_file(path):
+        df = read_raw_excel(path, extra_columns=[SCORE_COLUMN, *WORD_COLUMNS.values(), PERIOD_COLUMN])
+        departments = df['source'].str.split('#', n=1).str[1].map(department_of)
+    else:
+        df = pd.read_csv(path, encoding=detect_encoding(path), dtype=str)
+        departments = department_of(os.path.splitext(os.path.basename(path))[0])
+    if SCORE_COLUMN not in df.columns or '講義名' not in df.columns:
+        raise ValueError(f'必要な列がありません: {SCORE_COLUMN}, 講義名')
+
+    lecture = df['講義名'].fillna('').astype(str).str.extract(LECTURE_PATTERN)
+    rating = df['平均評価ポイント'].astype(str).str.extract(RATING_PATTERN)['rating'] if '平均評価ポイント' in df.columns else None
+    start = pd.to_datetime(df[PERIOD_COLUMN], format='%Y/%m/%d', errors='coerce') if PERIOD_COLUMN in df.columns \
+        else pd.Series(pd.NaT, index=df.index)
+    result = pd.DataFrame({
+        '学科': departments,
+        # 講義コードがない行は講義名をそのまま使う（ingest.parse_evaluations と同じ）
+        '講義コード': lecture['講義コード'].fillna(''),
+        '講義名': lecture['講義名'].fillna(df['講義名'].fillna('').astype(str).str.strip()),
+        # 年度（4月始まり）と学期（4〜9月に始まる評価期間は前期、それ以外は後期）。期間がない行は欠損値
+        'academic_year': (start.dt.year - (start.dt.month < 4)).astype('Int16'),
+        'semester': pd.Series(np.where(start.dt.month.between(4, 9), '前期', '後期'), index=df.index).where(start.notna()),
+        'rating': pd.to_numeric(rating, errors='coerce') if rating is not None else np.nan,
+        SCORE_COLUMN: pd.to_numeric(df[SCORE_COLUMN], errors='coerce'),
+    }, index=df.index)
+    for column in WORD_COLUMNS.values():
+        result[column] = df[column].fillna('') if column in df.columns else ''
+    return result.dropna(subset=[SCORE_COLUMN]).reset_index(drop=True)
+
+
+def _histogram_bins(scores):
+    low, high = SCORE_RANGE
+    bins = np.floor((scores - low) / (high - low) * HISTOGRAM_BINS).astype(np.int64)
+    return np.clip(bins, 0, HISTOGRAM_BINS - 1)
+
+
+def partial_aggregates(rows):
+    """
+    分析結果の行を最も細かい単位（CELL_KEYS）で部分集計します。
+
+    Args:
+        rows (pd.DataFrame): read_analysis_file の返り値。
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (統計量, 感情表現)。
+            統計量は CELL_KEYS と count, score_sum, score_sumsq, rating_sum, rating_count, histogram（HISTOGRAM_BINS 個の件数）の列、
+            感情表現は CELL_KEYS と polarity, word, count の列を持ちます。
+    """
+    groups = rows.groupby(CELL_KEYS, dropna=False, sort=False)
+    scores = rows[SCORE_COLUMN].to_numpy(dtype=np.float64)
+    stats = rows.assign(score_sumsq=scores ** 2, rating_count=rows['rating'].notna()).groupby(
+        CELL_KEYS, dropna=False, sort=False).agg(
+        count=(SCORE_COLUMN, 'size'), score_sum=(SCORE_COLUMN, 'sum'), score_sumsq=('score_sumsq', 'sum'),
+        rating_sum=('rating', 'sum'), rating_count=('rating_count', 'sum'))
+    # 単位ごとのヒストグラム（単位の番号は groupby と同じ順）
+    histogram = np.zeros((len(stats), HISTOGRAM_BINS), dtype=np.int64)
+    np.add.at(histogram, (groups.ngroup().to_numpy(), _histogram_bins(scores)), 1)
+    stats['histogram'] = list(histogram)
+
+    frames = []
+    for polarity, column in WORD_COLUMNS.items():
+        words = rows[column].str.extractall(_WORD_PATTERN)['word'].str.strip()
+        if not len(words):
+            continue
+        keys = rows[CELL_KEYS].iloc[words.index.get_level_values(0)].reset_index(drop=True)
+        counts = keys.assign(polarity=polarity, word=words.to_numpy()).groupby(
+            [*CELL_KEYS, 'polarity', 'word'], dropna=False, sort=False).size().rename('count')
+        frames.append(counts.reset_index())
+    words = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[*CELL_KEYS, 'polarity', 'word', 'count'])
+    return stats.reset_index(), words
+
+
+def build_cube(stats, words, keys):
+    """
+    部分集計を keys の単位に足し合わせ、要約（件数・平均・分散・分位点・平均評価・上位の感情表現）を作成します。
+
+    Args:
+        stats (pd.DataFrame): partial_aggregates の統計量（複数ファイル分を連結したもの）。
+        words (pd.DataFrame): partial_aggregates の感情表現（同上）。
+        keys (list[str]): 集計の単位の列。
+
+    Returns:
+        pd.DataFrame: keys と count, mean, variance, std, q10〜q90, rating, top_positive, top_negative の列を持つDataFrame。
+    """
+    groups = stats.groupby(keys, dropna=False, sort=True)
+    cube = groups[['count', 'score_sum', 'score_sumsq', 'rating_sum', 'rating_count']].sum()
+    histogram = np.zeros((len(cube), HISTOGRAM_BINS), dtype=np.int64)
+    if len(stats):
+        np.add.at(histogram, groups.ngroup().to_numpy(), np.stack(stats['histogram'].to_numpy()))
+
+    count = cube['count'].to_numpy(dtype=np.float64)
+    cube['mean'] = cube['score_sum'] / count
+    # 不偏分散（1件の単位は欠損値）。丸め誤差で負にならないよう0で下限を切る
+    variance = (cube['score_sumsq'] - cube['score_sum'] ** 2 / count) / (count - 1)
+    cube['variance'] = variance.clip(lower=0).where(count > 1)
+    cube['std'] = np.sqrt(cube['variance'])
+    low, high = SCORE_RANGE
+    width = (high - low) / HISTOGRAM_BINS
+    cumulative = np.cumsum(histogram, axis=1)
+    for q in QUANTILES:
+        # 累積件数が q * 件数 に達したビンの中央の値
+        index = (cumulative < (q * count)[:, None]).sum(axis=1)
+        cube[f'q{round(q * 100)}'] = low + (np.minimum(index, HISTOGRAM_BINS - 1) + 0.5) * width
+    cube['rating'] = cube['rating_sum'] / cube['rating_count'].where(cube['rating_count'] > 0)
+    cube = cube.drop(columns=['score_sum', 'score_sumsq', 'rating_sum', 'rating_count']).reset_index()
+
+    for polarity in WORD_COLUMNS:
+        column = f'top_{polarity}'
+        selected = words[words['polarity'] == polarity]
+        if not len(selected):
+            cube[column] = ''
+            continue
+        counts = selected.groupby([*keys, 'word'], dropna=False)['count'].sum().reset_index()
+        counts = counts.sort_values('count', ascending=False, kind='stable').groupby(keys, dropna=False).head(TOP_WORDS)
+        labels = counts['word'] + '(' + counts['count'].astype(str) + ')'
+        top = labels.groupby([counts[key] for key in keys], dropna=False, sort=False).agg(', '.join).rename(column)
+        cube = cube.merge(top.reset_index(), on=keys, how='left')
+        cube[column] = cube[column].fillna('')
+    return cube
+
+
+def update_cubes(analysis_path, cube_dir=DEFAULT_CUBE_DIR):
+    """
+    分析結果のファイルごとの部分集計を更新し、LEVELS の各単位の要約を作り直します。
+    部分集計はファイルの内容ハッシュごとに保存するため、内容の変わっていないファイルは読み込みを省略します。
+    感情スコアの列がないファイルは読み飛ばします。
+
+    Args:
+        analysis_path (str): 分析結果のディレクトリ、またはファイル。
+        cube_dir (str, optional): 部分集計と要約の保存先ディレクトリ。
+
+    Returns:
+        dict: aggregated（集計したファイル）, reused（再利用したファイル）, skipped（読み飛ばしたファイル）,
+              n_rows（集計した行数）を含む辞書。
+    """
+    store = UnitStore(os.path.join(cube_dir, 'partials'), os.path.join(cube_dir, CUBE_MANIFEST),
+                      {'version': CUBE_VERSION}, ('.stats.parquet', '.words.parquet'))
+    base_dir = analysis_path if os.path.isdir(analysis_path) else os.path.dirname(analysis_path)
+    summary = {'aggregated': [], 'reused': [], 'skipped': [], 'n_rows': 0}
+    for path in list_analysis_files(analysis_path):
+        key = os.path.relpath(path, base_dir)
+        digest = file_digest(path)
+        entry = store.reuse(key, digest)
+        if entry is not None:
+            summary['reused'].append(key)
+        else:
+            try:
+                rows = read_analysis_file(path)
+            except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+                summary['skipped'].append(f'{key}: {e}')
+                continue
+            stats, words = partial_aggregates(rows)
+            partial_path = store.path(digest)
+            for name, frame in (('stats', stats), ('words', words)):
+                pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), f'{partial_path}.{name}.parquet.tmp')
+                os.replace(f'{partial_path}.{name}.parquet.tmp', f'{partial_path}.{name}.parquet')
+            summary['aggregated'].append(key)
+            entry = store.record(key, digest, rows=len(rows))
+        summary['n_rows'] += entry['rows']
+
+    # 入力から消えたファイルの部分集計を削除する
+    store.prune()
+
+    cube_paths = [os.path.join(cube_dir, f'{level}.parquet') for level in LEVELS]
+    if not store.changed() and all(os.path.isfile(path) for path in cube_paths):
+        return summary  # 入力が変わっていなければ要約もそのまま使う（マニフェストの更新日時も変えない）
+
+    # 部分集計を足し合わせて各単位の要約を作り直す（部分集計は行数に比べて小さいため、すべて読み込んでも軽い）
+    partials = [store.path(entry['sha256']) for entry in store.units.values()]
+    stats = pd.concat([pd.read_parquet(f'{path}.stats.parquet') for path in partials],
+                      ignore_index=True) if partials else partial_aggregates(_empty_rows())[0]
+    words = pd.concat([pd.read_parquet(f'{path}.words.parquet') for path in partials],
+                      ignore_index=True) if partials else partial_aggregates(_empty_rows())[1]
+    for keys, cube_path in zip(LEVELS.values(), cube_paths):
+        build_cube(stats, words, keys).to_parquet(cube_path + '.tmp', index=False)
+        os.replace(cube_path + '.tmp', cube_path)
+
+    store.save()
+    return summary
+
+
+def _empty_rows():
+    columns = {key: pd.Series(dtype=object) for key in CELL_KEYS}
+    columns.update(academic_year=pd.Series(dtype='Int16'), rating=pd.Series(dtype=np.float64),
+                   **{SCORE_COLUMN: pd.Series(dtype=np.float64)}, **{c: pd.Series(dtype=object) for c in WORD_COLUMNS.values()})
+    return pd.DataFrame(columns)
+
+
+def load_cube(level, cube_dir=DEFAULT_CUBE_DIR):
+    """
+    update_cubes で作成した要約を読み込みます。
+
+    Args:
+        level (str): LEVELS の単位の名前。
+        cube_dir (str, optional): 要約のディレクトリ。
+
+    Returns:
+        pd.DataFrame: build_cube と同じ列を持つDataFrame。
+
+    Raises:
+        ValueError: 不明な単位の名前の場合。
+        FileNotFoundError: 要約が作成されていない場合。
+    """
+    if level not in LEVELS:
+        raise ValueError(f'level には {tuple(LEVELS)} のいずれかを指定してください: {level}')
+    path = os.path.join(cube_dir, f'{level}.parquet')
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f'要約が見つかりません: {path}')
+    return pd.read_parquet(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='感情分析の結果の講義・学科・学期・年度ごとの要約（作成・差分更新）')
+    parser.add_argument('analysis', help='分析結果（*_analysis.csv・Excelブック）のディレクトリ、またはファイル')
+    parser.add_argument('--cubes', default=DEFAULT_CUBE_DIR, help='部分集計と要約の保存先ディレクトリ')
+    parser.add_argument('--level', choices=list(LEVELS), default='department', help='表示する単位')
+    parser.add_argument('--top', type=int, default=20, help='表示する件数')
+    args = parser.parse_args()
+
+    summary = update_cubes(args.analysis, args.cubes)
+    print(f"{summary['n_rows']}件（集計 {len(summary['aggregated'])}ファイル、再利用 {len(summary['reused'])}ファイル）")
+    for message in summary['skipped']:
+        print(f'読み飛ばしました: {message}')
+    cube = load_cube(args.level, args.cubes)
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 40):
+        print(cube.sort_values('count', ascending=False).head(args.top).to_string(index=False))
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from instrumentation import instrumentation_from_env
+from polarity_matcher import token_key
+
+# スコアの正規化方法
+#   token_mean  : 合計スコア / 文書の全トークン数（従来の analyze_sentiment と同じ）
+#   matched_mean: 合計スコア / 辞書に一致したトークン数
+#   sum         : 合計スコア
+NORMALIZATIONS = ("token_mean", "matched_mean", "sum")
+
+
+def _default_key(token):
+    # analyze_text のタプルなら表層形、文字列ならそのまま使う
+    return token[0] if isinstance(token, tuple) else token
+
+
+class SentimentResult:
+    """
+    BatchSentimentScorer.score の結果。
+    文書ごとのスコアと文書×語の出現回数行列を保持し、一致した語の説明は explain で必要な行だけ作成します。
+    """
+
+    def __init__(self, scores, matrix, vocabulary, weights, codes, offsets):
+        """
+        Args:
+            scores (np.ndarray): 文書ごとのスコア。
+            matrix (scipy.sparse.csr_matrix): 文書×語の出現回数行列。
+            vocabulary (np.ndarray): 行列の列に対応する語。
+            weights (np.ndarray): 各語の極性スコア。辞書にない語は NaN。
+            codes (np.ndarray): 全文書の語IDを連結した配列（出現順）。
+            offsets (np.ndarray): 文書 i の語IDが codes[offsets[i]:offsets[i+1]] であることを表す配列。
+        """
+        self.scores = scores
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.weights = weights
+        self._codes = codes
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self.scores)
+
+    def explain(self, rows=None):
+        """
+        指定した行について、一致した感情表現を「語(スコア)」形式の文字列で返します。
+
+        Args:
+            rows (int or list[int], optional): 説明を作成する行。None の場合はすべての行。
+
+        Returns:
+            dict or list[dict]: {"positive": [...], "negative": [...]} 形式の辞書。
+                                rows に整数を渡した場合は辞書、それ以外はリストを返します。
+        """
+        single = isinstance(rows, (int, np.integer))
+        if rows is None:
+            rows = range(len(self.scores))
+        elif single:
+            rows = [rows]
+
+        explanations = []
+        for row in rows:
+            found_words = {"positive": [], "negative": []}
+            for code in self._codes[self._offsets[row]:self._offsets[row + 1]]:
+                score = self.weights[code]
+                if score > 0:
+                    found_words["positive"].append(f"{self.vocabulary[code]}({score:.2f})")
+                elif score < 0:
+                    found_words["negative"].append(f"{self.vocabulary[code]}({score:.2f})")
+            explanations.append(found_words)
+        return explanations[0] if single else explanations
+
+
+class BatchSentimentScorer:
+    """
+    感情極性辞書を用いて、複数文書の感情スコアをまとめて計算するクラス。
+    コーパス全体のトークンを語IDに変換して文書×語の疎行列を作り、スコアを1回の行列演算で求めます。
+    PolarityMatcher を指定した場合は、見出し語・複数語表現の一致結果を語IDとして同じ計算を行います。
+    """
+
+    def __init__(self, lexicon=None, key=None, matcher=None, strict_pos=False, instrumentation=None):
+        """
+        Args:
+            lexicon (PolarityLexicon or dict, optional): 語→スコアの感情極性辞書。表層形で照合します。
+            key (callable, optional): トークンから辞書を引く語を取り出す関数。
+                                      None の場合、タプルは表層形（先頭要素）、文字列はそのまま使います。
+                                      matcher を使う場合は (見出し語, 品詞) を返す関数を指定します。
+            matcher (PolarityMatcher, optional): 見出し語と品詞で照合するマッチャー。指定した場合は lexicon より優先します。
+            strict_pos (bool, optional): matcher 使用時に品詞の一致を必須にする場合は True。デフォルトは False。
+            instrumentation (Instrumentation, optional): 処理段階ごとの時間・件数を記録する計測オブジェクト。
+                                                         None の場合は環境変数 ANALYZER_INSTRUMENT が設定されているときだけ計測します。
+
+        Raises:
+            ValueError: lexicon と matcher のどちらも指定されていない場合。
+        """
+        if lexicon is None and matcher is None:
+            raise ValueError("lexicon または matcher のどちらかを指定してください。")
+        self.lexicon = lexicon
+        self.matcher = matcher
+        self.strict_pos = strict_pos
+        self.key = key
+        self.instrumentation = instrumentation if instrumentation is not None else instrumentation_from_env()
+
+    def score(self, token_lists, normalize="token_mean"):
+        """
+        文書ごとの感情スコアを計算します。
+
+        Args:
+            token_lists (list[list]): 文書ごとのトークンのリスト。トークンは語の文字列または analyze_text のタプル。
+            normalize (str, optional): 正規化方法。'token_mean', 'matched_mean', 'sum' のいずれか。
+                                       デフォルトは 'token_mean'（従来の analyze_sentiment と同じ）。
+
+        Returns:
+            SentimentResult: スコアと出現回数行列を保持する結果。
+
+        Raises:
+            ValueError: normalize の値が不正な場合。
+        """
+        if normalize not in NORMALIZATIONS:
+            raise ValueError(f"normalize には {NORMALIZATIONS} のいずれかを指定してください: {normalize}")
+
+        instrumentation = self.instrumentation
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+        instrumentation.count("documents", len(lengths))
+        instrumentation.count("tokens", int(lengths.sum()))
+        with instrumentation.stage("pn_lookup"):
+            if self.matcher is not None:
+                codes, counts, vocabulary, weights = self._encode_matches(token_lists)
+            else:
+                codes, counts, vocabulary, weights = self._encode_tokens(token_lists)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        with instrumentation.stage("score_matrix"):
+            doc_index = np.repeat(np.arange(len(counts)), counts)
+            matrix = sparse.csr_matrix(
+                (np.ones(len(codes), dtype=np.float64), (doc_index, codes)),
+                shape=(len(counts), len(vocabulary)),
+            )
+
+            matched = ~np.isnan(weights)
+            totals = matrix @ np.where(matched, weights, 0.0)
+            if normalize == "sum":
+                scores = totals
+            else:
+                denominators = lengths if normalize == "token_mean" else matrix @ matched.astype(np.float64)
+                scores = np.divide(totals, denominators, out=np.zeros_like(totals), where=denominators > 0)
+        return SentimentResult(scores, matrix, vocabulary, weights, codes, offsets)
+
+    def _encode_tokens(self, token_lists):
+        # 全トークンを語IDに変換する（語彙はコーパス内の異なり語）
+        key = self.key or _default_key
+        counts = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+        words = [key(token) for tokens in token_lists for token in tokens]
+        codes, vocabulary = pd.factorize(pd.Series(words, dtype=object), sort=False)
+        vocabulary = np.asarray(vocabulary, dtype=object)
+        return codes, counts, vocabulary, self._lookup(vocabulary)
+
+    def _encode_matches(self, token_lists):
+        # 一致した辞書項目のIDを語IDとして使う（語彙は辞書の全項目）
+        key = self.key or token_key
+        matches = [self.matcher.match_ids(tokens, key=key, strict_pos=self.strict_pos) for tokens in token_lists]
+        counts = np.fromiter((len(ids) for ids in matches), dtype=np.int64, count=len(matches))
+        codes = np.concatenate(matches) if matches else np.zeros(0, dtype=np.int64)
+        vocabulary = np.asarray(self.matcher.labels, dtype=object)
+        weights = np.asarray(self.matcher.scores, dtype=np.float64)
+        return codes, counts, vocabulary, weights
+
+    def _lookup(self, vocabulary):
+        if hasattr(self.lexicon, "lookup_many"):
+            return self.lexicon.lookup_many(vocabulary.tolist()).astype(np.float64)
+        return np.array([self.lexicon.get(word, np.nan) for word in vocabulary], dtype=np.float64)
@@ -0,0 +1,114 @@
+import re
+import neologdn
+
+# 絵文字・記号とみなすコードポイントの範囲（両端を含む）
+# demoji.replace_string は絵文字ごとの選択肢を並べた巨大な正規表現を1件ずつ適用するため遅く、
+# ここでは範囲を1つの文字クラスにまとめた正規表現をプロセスごとに1回だけコンパイルします。
+EMOJI_RANGES = (
+    (0x200D, 0x200D),    # ゼロ幅接合子（絵文字の組み合わせ）
+    (0x20E3, 0x20E3),    # 囲みキーキャップ
+    (0x2190, 0x21FF),    # 矢印
+    (0x2300, 0x23FF),    # その他の技術用記号（⌚⏰ など）
+    (0x2500, 0x25FF),    # 罫線・ブロック・幾何学模様（■□◆○△ など）
+    (0x2600, 0x27BF),    # その他の記号・装飾記号（★☆♪✨✓ など）
+    (0x2900, 0x297F),    # 補助矢印B
+    (0x2B00, 0x2BFF),    # その他の記号と矢印（⭐⬆ など）
+    (0x3030, 0x3030),    # 〰
+    (0x303D, 0x303D),    # 〽
+    (0x3297, 0x3297),    # ㊗
+    (0x3299, 0x3299),    # ㊙
+    (0xFE00, 0xFE0F),    # 異体字セレクタ
+    (0x1F000, 0x1FAFF),  # 麻雀牌〜絵文字・絵記号（国旗の地域指示子、肌の色を含む）
+    (0xE0020, 0xE007F),  # タグ文字（地域の旗）
+)
+EMOJI_PATTERN = re.compile("[" + "".join(
+    re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+    for start, end in EMOJI_RANGES) + "]+")
+URL_PATTERN = re.compile(r"(?:https?|ftp)://[^\s　]+|www\.[^\s　]+")
+# スクレイピングした自由記述の先頭の「2024/12/20（金）　～　2025/01/16（木） / 」（ingest.COMMENT_PATTERN と同じ形式）
+DATE_PREFIX_PATTERN = re.compile(
+    r"^\s*\d{4}/\d{2}/\d{2}（[月火水木金土日]）[\s　]*～[\s　]*\d{4}/\d{2}/\d{2}（[月火水木金土日]）[\s　]*/[\s　]*"
+)
+
+
+def strip_date_prefix(text):
+    """自由記述の先頭の評価期間を取り除きます。"""
+    return DATE_PREFIX_PATTERN.sub("", text, count=1)
+
+
+def remove_urls(text):
+    """URLを空白に置き換えます。"""
+    return URL_PATTERN.sub(" ", text)
+
+
+def remove_emoji(text):
+    """絵文字・記号を空白に置き換えます（前後の語がつながらないようにするため）。"""
+    return EMOJI_PATTERN.sub(" ", text)
+
+
+# 前処理の段階。名前 → テキスト1件を変換する関数
+PREPROCESS_STEPS = {
+    "date_prefix": strip_date_prefix,
+    "url": remove_urls,
+    "emoji": remove_emoji,
+    "neologdn": neologdn.normalize,
+}
+# デフォルトの前処理。neologdn は置き換えで生じた余分な空白も取り除くため最後に実行する
+DEFAULT_STEPS = ("date_prefix", "url", "emoji", "neologdn")
+
+
+class TextPreprocessor:
+    """
+    形態素解析の前にテキストへ適用する前処理のパイプライン。
+    段階は PREPROCESS_STEPS の名前で指定し、指定した順に適用します。
+    """
+
+    def __init__(self, steps=DEFAULT_STEPS):
+        """
+        Args:
+            steps (Iterable[str], optional): 適用する段階の名前。デフォルトは DEFAULT_STEPS。
+
+        Raises:
+            ValueError: 不明な段階の名前が含まれる場合。
+        """
+        steps = tuple(steps)
+        unknown = [name for name in steps if name not in PREPROCESS_STEPS]
+        if unknown:
+            raise ValueError(f"steps には {tuple(PREPROCESS_STEPS)} の要素を指定してください: {unknown}")
+        self.steps = steps
+        self._functions = [PREPROCESS_STEPS[name] for name in steps]
+
+    def __call__(self, text):
+        """
+        テキスト1件に前処理を適用します。
+
+        Args:
+            text (str): 前処理対象のテキスト。文字列でない場合（NaNなど）は空文字列として扱います。
+
+        Returns:
+            str: 前処理後のテキスト。
+        """
+        if not isinstance(text, str):
+            return ""
+        for function in self._functions:
+            text = function(text)
+        return text
+
+    def normalize_many(self, texts):
+        """
+        複数のテキストにまとめて前処理を適用します。
+        同じテキストは1回だけ処理し、段階ごとに全テキストへ map で適用するため、1件ずつ呼び出すより高速です。
+
+        Args:
+            texts (Iterable[str]): 前処理対象のテキスト。文字列でない要素は空文字列として扱います。
+
+        Returns:
+            list[str]: 入力と同じ順序の前処理後のテキスト。
+        """
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        distinct = list(dict.fromkeys(texts))
+        processed = distinct
+        for function in self._functions:
+            processed = list(map(function, processed))
+        by_text = dict(zip(distinct, processed))
+        return [by_text[text] for text in texts]
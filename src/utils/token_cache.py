@@ -0,0 +1,265 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+# SQLiteのプレースホルダ数の上限を超えないように一括取得するキー数
+_BATCH_SIZE = 500
+# 永続キャッシュの値の形式。Pythonのバージョン間で読み書きできるプロトコルに固定する
+_PICKLE_PROTOCOL = 4
+# get / put で1件ずつ読み書きする場合に、最終アクセス時刻の反映とサイズ上限の確認（flush）を行う間隔（件数）
+_FLUSH_INTERVAL = 100
+
+
+class TokenCache:
+    """
+    形態素解析結果のキャッシュ。
+    メモリ上のLRUキャッシュと、SQLiteファイルによる永続キャッシュの2層で構成されます。
+    キーは前処理後のテキストと辞書の識別子から作るハッシュ値です。
+    永続キャッシュの値はpickleで保存するため、信頼できないキャッシュファイルは読み込まないでください。
+    """
+
+    def __init__(self, path=None, max_memory_items=10000, max_disk_bytes=512 * 1024 * 1024):
+        """
+        キャッシュを初期化します。
+
+        Args:
+            path (str, optional): 永続キャッシュとして使うSQLiteファイルのパス。
+                                  None の場合はメモリ上のキャッシュのみを使用します。
+            max_memory_items (int, optional): メモリ上に保持する解析結果の最大件数。デフォルトは 10000。
+            max_disk_bytes (int, optional): 永続キャッシュに保存する解析結果の合計サイズの上限（バイト）。
+                                            上限を超えた場合は最終アクセスが古いものから削除します。
+                                            デフォルトは 512MB。
+        """
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        # 永続キャッシュで見つかったキーの最終アクセス時刻。読み込みのたびに書き込まず、書き込みの確定時にまとめて反映する
+        self._touched = {}
+        self._since_flush = 0  # 前回の flush 以降に get / put で読み書きした件数
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            # Streamlitなど複数スレッドから同じインスタンスを使う場合を考慮する
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tokens_last_access ON tokens (last_access)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(processed_text, dictionary_id):
+        """
+        前処理後のテキストと辞書の識別子からキャッシュキーを作成します。
+
+        Args:
+            processed_text (str): _preprocess_text で前処理したテキスト。
+            dictionary_id (str): 辞書を識別する文字列（辞書パスやバージョンなど）。
+
+        Returns:
+            str: SHA-1ハッシュの16進文字列。
+        """
+        return hashlib.sha1(f"{dictionary_id}\0{processed_text}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        キャッシュから解析結果を取得します。
+
+        Args:
+            key (str): make_key で作成したキー。
+
+        Returns:
+            list[tuple] or None: キャッシュされた解析結果。存在しない場合は None。
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+
+        if self._conn is not None:
+            row = self._conn.execute("SELECT value FROM tokens WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touched[key] = time.time()
+                result = pickle.loads(row[0])
+                self._remember(key, result)
+                self.disk_hits += 1
+                self._count_single_access()
+                return result
+
+        self.misses += 1
+        return None
+
+    def get_many(self, keys):
+        """
+        複数のキーの解析結果をまとめて取得します。永続キャッシュは一括クエリで参照します。
+
+        Args:
+            keys (iterable[str]): make_key で作成したキーのイテラブル。
+
+        Returns:
+            dict: キャッシュに存在したキーと解析結果の辞書。存在しないキーは含まれません。
+        """
+        found = {}
+        missing = []
+        # 同じキーが複数回含まれていてもヒット数・ミス数は1回として数える
+        for key in dict.fromkeys(keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                found[key] = self._memory[key]
+            else:
+                missing.append(key)
+
+        disk_found = 0
+        if self._conn is not None and missing:
+            now = time.time()
+            for start in range(0, len(missing), _BATCH_SIZE):
+                batch = missing[start:start + _BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM tokens WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value in rows:
+                    result = pickle.loads(value)
+                    self._remember(key, result)
+                    found[key] = result
+                    self._touched[key] = now
+                disk_found += len(rows)
+
+        self.disk_hits += disk_found
+        self.misses += len(missing) - disk_found
+        return found
+
+    def put(self, key, result):
+        """
+        解析結果をキャッシュに保存します。
+        1件ずつ解析する場合にも結果が失われないように、永続キャッシュへの書き込みはすぐに確定します。
+        get / put が _FLUSH_INTERVAL 件に達するたびに flush し、最終アクセス時刻の反映とサイズ上限の確認を行います。
+
+        Args:
+            key (str): make_key で作成したキー。
+            result (list[tuple]): analyze_text の解析結果。
+        """
+        self._remember(key, result)
+        if self._conn is not None:
+            value = pickle.dumps(result, protocol=_PICKLE_PROTOCOL)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tokens (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._conn.commit()
+            self._count_single_access()
+
+    def put_many(self, items):
+        """
+        複数の解析結果をまとめてキャッシュに保存します。書き込みは flush で確定します。
+
+        Args:
+            items (iterable[tuple[str, list[tuple]]]): キーと解析結果の組のイテラブル。
+        """
+        rows = []
+        now = time.time()
+        for key, result in items:
+            self._remember(key, result)
+            value = pickle.dumps(result, protocol=_PICKLE_PROTOCOL)
+            rows.append((key, value, len(value), now))
+        if self._conn is not None and rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tokens (key, value, size, last_access) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def flush(self):
+        """
+        永続キャッシュへの書き込みを確定し、サイズ上限を超えた分を削除します。
+        """
+        if self._conn is None:
+            return
+        self._write_touched()
+        self._evict()
+        self._conn.commit()
+        self._since_flush = 0
+
+    def clear(self):
+        """
+        メモリ上と永続キャッシュの内容をすべて削除します。
+        """
+        self._memory.clear()
+        self._touched.clear()
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM tokens")
+            self._conn.commit()
+
+    def close(self):
+        """
+        書き込みを確定してSQLiteの接続を閉じます。
+        """
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        """
+        キャッシュのヒット数・ミス数を返します。
+
+        Returns:
+            dict: memory_hits, disk_hits, misses, hit_rate, memory_items, disk_bytes を含む辞書。
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes(),
+        }
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _count_single_access(self):
+        self._since_flush += 1
+        if self._since_flush >= _FLUSH_INTERVAL:
+            self.flush()
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE tokens SET last_access = ? WHERE key = ?",
+                                   [(now, key) for key, now in self._touched.items()])
+            self._touched.clear()
+
+    def _disk_bytes(self):
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tokens").fetchone()[0]
+
+    def _evict(self):
+        excess = self._disk_bytes() - self.max_disk_bytes
+        if excess <= 0:
+            return
+        # 最終アクセスが古いものから、超過分のサイズに達するまで削除する
+        removed = 0
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM tokens ORDER BY last_access"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        self._conn.executemany("DELETE FROM tokens WHERE key = ?", keys)
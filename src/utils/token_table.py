@@ -0,0 +1,333 @@
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# analyze_text が返すタプルの各要素の列名（タプル内の順序と同じ）
+TOKEN_FIELDS = (
+    "surface",           # 表層形
+    "pos",               # 品詞
+    "pos_detail1",       # 品詞細分類1
+    "pos_detail2",       # 品詞細分類2
+    "pos_detail3",       # 品詞細分類3
+    "conjugation_type",  # 活用型
+    "conjugation_form",  # 活用形
+    "base_form",         # 原形
+    "reading",           # 読み
+    "pronunciation",     # 発音
+)
+
+# 画面表示やCSV出力に使う日本語の列名
+TOKEN_FIELD_LABELS = {
+    "surface": "表層形",
+    "pos": "品詞",
+    "pos_detail1": "品詞細分類1",
+    "pos_detail2": "品詞細分類2",
+    "pos_detail3": "品詞細分類3",
+    "conjugation_type": "活用型",
+    "conjugation_form": "活用形",
+    "base_form": "原形",
+    "reading": "読み",
+    "pronunciation": "発音",
+}
+
+# 種類が少なく同じ値が繰り返される列。辞書符号化（カテゴリ型）で保持する
+CATEGORICAL_FIELDS = ("pos", "pos_detail1", "pos_detail2", "pos_detail3", "conjugation_type", "conjugation_form")
+
+DOC_ID_COLUMN = "doc_id"
+
+
+class TokenTable:
+    """
+    コーパス全体の形態素解析結果を列指向で保持するクラス。
+    品詞などの列は辞書符号化したArrow配列、表層形・原形などは文字列のArrowバッファで保持し、
+    各文書のトークン範囲は整数のオフセット配列で表します。
+    analyze_column が返すタプルのリストのリストと同じように、文書単位で添字アクセス・反復できます。
+    """
+
+    def __init__(self, table, offsets, doc_start=0):
+        """
+        Args:
+            table (pa.Table): doc_id 列と TOKEN_FIELDS の各列を持つArrowテーブル。
+            offsets (np.ndarray): 長さ「文書数+1」の int64 配列。文書 i のトークンは offsets[i]:offsets[i+1]。
+            doc_start (int, optional): 最初の文書の doc_id。チャンク単位で作成する場合に使用します。
+        """
+        self.table = table
+        self.offsets = offsets
+        self.doc_start = doc_start
+
+    @classmethod
+    def from_token_lists(cls, token_lists, doc_start=0):
+        """
+        analyze_column の返り値（タプルのリストのリスト）から TokenTable を作成します。
+
+        Args:
+            token_lists (list[list[tuple]]): 文書ごとの形態素解析結果。
+            doc_start (int, optional): 最初の文書に割り当てる doc_id。デフォルトは 0。
+
+        Returns:
+            TokenTable: 作成されたテーブル。
+        """
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        doc_ids = np.repeat(np.arange(doc_start, doc_start + len(lengths), dtype=np.int32), lengths)
+        all_tokens = [token for tokens in token_lists for token in tokens]
+        columns = list(zip(*all_tokens)) if all_tokens else [()] * len(TOKEN_FIELDS)
+
+        arrays = [pa.array(doc_ids, type=pa.int32())]
+        for name, values in zip(TOKEN_FIELDS, columns):
+            array = pa.array(values, type=pa.string())
+            if name in CATEGORICAL_FIELDS:
+                array = array.dictionary_encode()
+            arrays.append(array)
+        table = pa.Table.from_arrays(arrays, names=[DOC_ID_COLUMN, *TOKEN_FIELDS])
+        return cls(table, offsets, doc_start=doc_start)
+
+    @property
+    def n_documents(self):
+        """文書数。"""
+        return len(self.offsets) - 1
+
+    @property
+    def n_tokens(self):
+        """全文書のトークン数の合計。"""
+        return self.table.num_rows
+
+    def __len__(self):
+        return self.n_documents
+
+    def __getitem__(self, index):
+        return self.document(index)
+
+    def __iter__(self):
+        for index in range(self.n_documents):
+            yield self.document(index)
+
+    def document(self, index):
+        """
+        指定した文書のトークンを analyze_text と同じタプルのリストとして返します。
+
+        Args:
+            index (int): 文書の位置（0始まり。doc_start は含めない）。
+
+        Returns:
+            list[tuple]: 形態素解析結果のリスト。
+        """
+        if index < 0:
+            index += self.n_documents
+        if not 0 <= index < self.n_documents:
+            raise IndexError(f"文書番号 {index} は範囲外です（文書数: {self.n_documents}）。")
+        start, stop = int(self.offsets[index]), int(self.offsets[index + 1])
+        sliced = self.table.slice(start, stop - start)
+        columns = [sliced.column(name).to_pylist() for name in TOKEN_FIELDS]
+        return list(zip(*columns))
+
+    def column(self, name):
+        """
+        指定した列をArrowの配列として返します（コピーは発生しません）。
+
+        Args:
+            name (str): TOKEN_FIELDS のいずれか、または 'doc_id'。
+
+        Returns:
+            pa.ChunkedArray: 列のデータ。
+        """
+        return self.table.column(name)
+
+    def to_pandas(self, labels=False):
+        """
+        トークン単位のDataFrameに変換します。
+        Arrowのメモリをそのまま参照する pd.ArrowDtype の列になるため、データのコピーは発生しません。
+
+        Args:
+            labels (bool, optional): True の場合、列名を日本語（表層形, 品詞, ...）にします。デフォルトは False。
+
+        Returns:
+            pd.DataFrame: doc_id 列と TOKEN_FIELDS の各列を持つDataFrame。
+        """
+        df = self.table.to_pandas(types_mapper=pd.ArrowDtype)
+        if labels:
+            df = df.rename(columns=TOKEN_FIELD_LABELS)
+        return df
+
+    def to_token_lists(self):
+        """
+        analyze_column と同じタプルのリストのリストに戻します。
+
+        Returns:
+            list[list[tuple]]: 文書ごとの形態素解析結果。
+        """
+        columns = [self.table.column(name).to_pylist() for name in TOKEN_FIELDS]
+        tokens = list(zip(*columns))
+        return [tokens[self.offsets[i]:self.offsets[i + 1]] for i in range(self.n_documents)]
+
+    def save_parquet(self, path):
+        """
+        Parquetファイルとして保存します。文書数と doc_start はファイルのメタデータに記録します。
+
+        Args:
+            path (str): 保存先のパス。
+        """
+        metadata = dict(self.table.schema.metadata or {})
+        metadata[b"n_documents"] = str(self.n_documents).encode()
+        metadata[b"doc_start"] = str(self.doc_start).encode()
+        pq.write_table(self.table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load_parquet(cls, path):
+        """
+        save_parquet で保存したファイルを読み込みます。MeCabは使用しません。
+
+        Args:
+            path (str): Parquetファイルのパス。
+
+        Returns:
+            TokenTable: 読み込まれたテーブル。
+        """
+        table = pq.read_table(path, read_dictionary=list(CATEGORICAL_FIELDS))
+        # TokenTableWriter はスキーマではなくファイルのメタデータに記録するため、ファイル側から読む
+        metadata = pq.read_metadata(path).metadata or {}
+        doc_ids = table.column(DOC_ID_COLUMN).to_numpy()
+        doc_start = int(metadata.get(b"doc_start", doc_ids.min() if len(doc_ids) else 0))
+        n_documents = int(metadata.get(b"n_documents", doc_ids.max() - doc_start + 1 if len(doc_ids) else 0))
+        return cls(table, _offsets_from_doc_ids(doc_ids, doc_start, n_documents), doc_start=doc_start)
+
+    def memory_usage(self):
+        """
+        テーブルが使用するメモリ量（バイト）を返します。
+
+        Returns:
+            int: Arrowバッファとオフセット配列の合計バイト数。
+        """
+        return self.table.nbytes + self.offsets.nbytes
+
+
+def _offsets_from_doc_ids(doc_ids, doc_start, n_documents):
+    counts = np.bincount(doc_ids - doc_start, minlength=n_documents)
+    offsets = np.zeros(n_documents + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def token_lists_memory_usage(token_lists):
+    """
+    タプルのリストのリストが使用するメモリ量を概算します。
+    同じ文字列オブジェクトは一度だけ数えます。
+
+    Args:
+        token_lists (list[list[tuple]]): analyze_column の返り値。
+
+    Returns:
+        int: 概算のバイト数。
+    """
+    total = sys.getsizeof(token_lists)
+    seen = set()
+    for tokens in token_lists:
+        total += sys.getsizeof(tokens)
+        for token in tokens:
+            total += sys.getsizeof(token)
+            for value in token:
+                if value is not None and id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+    return total
+
+
+def memory_report(token_lists, table=None):
+    """
+    タプルのリスト形式と TokenTable のトークンあたりのメモリ使用量を比較します。
+
+    Args:
+        token_lists (list[list[tuple]]): analyze_column の返り値。
+        table (TokenTable, optional): 比較対象のテーブル。None の場合は token_lists から作成します。
+
+    Returns:
+        dict: n_tokens, tuple_bytes, table_bytes, tuple_bytes_per_token, table_bytes_per_token を含む辞書。
+    """
+    if table is None:
+        table = TokenTable.from_token_lists(token_lists)
+    tuple_bytes = token_lists_memory_usage(token_lists)
+    table_bytes = table.memory_usage()
+    n_tokens = max(table.n_tokens, 1)
+    return {
+        "n_tokens": table.n_tokens,
+        "tuple_bytes": tuple_bytes,
+        "table_bytes": table_bytes,
+        "tuple_bytes_per_token": tuple_bytes / n_tokens,
+        "table_bytes_per_token": table_bytes / n_tokens,
+    }
+
+
+class TokenTableWriter:
+    """
+    TokenTable をCSVまたはParquetファイルへ順に追記するライタ。
+    iter_analyze_csv と組み合わせることで、コーパス全体をメモリに載せずに解析結果を書き出せます。
+    """
+
+    def __init__(self, path, file_format=None, labels=False):
+        """
+        Args:
+            path (str): 出力先のパス。
+            file_format (str, optional): 'parquet' または 'csv'。None の場合は拡張子から判定します。
+            labels (bool, optional): CSV出力時に列名を日本語にする場合は True。デフォルトは False。
+
+        Raises:
+            ValueError: 出力形式が判定できない場合。
+        """
+        if file_format is None:
+            file_format = "csv" if path.lower().endswith(".csv") else "parquet" if path.lower().endswith(".parquet") else None
+        if file_format not in ("csv", "parquet"):
+            raise ValueError(f"出力形式を判定できません: {path}（'csv' または 'parquet' を指定してください）")
+        self.path = path
+        self.file_format = file_format
+        self.labels = labels
+        self.n_documents = 0
+        self.n_tokens = 0
+        self.doc_start = None
+        self._parquet_writer = None
+        self._csv_started = False
+
+    def write(self, table):
+        """
+        TokenTable を1つ追記します。
+
+        Args:
+            table (TokenTable): 書き込む解析結果。
+        """
+        if self.file_format == "parquet":
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.table.schema)
+            self._parquet_writer.write_table(table.table)
+        else:
+            df = table.to_pandas(labels=self.labels)
+            if self._csv_started:
+                df.to_csv(self.path, mode="a", header=False, index=False, encoding="utf-8")
+            else:
+                df.to_csv(self.path, index=False, encoding="utf-8-sig")  # BOM付きUTF-8
+                self._csv_started = True
+        if self.doc_start is None:
+            self.doc_start = table.doc_start
+        self.n_documents += table.n_documents
+        self.n_tokens += table.n_tokens
+
+    def close(self):
+        """
+        ファイルを閉じます。Parquetの場合は save_parquet と同じく文書数と doc_start をメタデータに記録します。
+        """
+        if self._parquet_writer is not None:
+            # トークンのない文書が末尾にあっても load_parquet で文書数が変わらないようにする
+            self._parquet_writer.add_key_value_metadata({
+                "n_documents": str(self.n_documents),
+                "doc_start": str(self.doc_start),
+            })
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
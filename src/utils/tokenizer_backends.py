@@ -0,0 +1,290 @@
+from importlib import metadata
+from operator import itemgetter
+from instrumentation import Instrumentation
+
+# 利用できるバックエンド名。sudachi は分割単位Cと同じ
+BACKENDS = ("mecab", "sudachi", "sudachi_a", "sudachi_b", "sudachi_c")
+
+# タプル内で '*' を None に置き換える要素の位置（読み・発音）
+_OPTIONAL_INDICES = (8, 9)
+
+
+def project_tokens(tokens, indices, pos_filter=None):
+    """
+    10要素のタプルのリストから、指定した品詞のトークンの指定した要素だけを取り出します。
+
+    Args:
+        tokens (list[tuple]): analyze_text と同じ形式の形態素解析結果。
+        indices (tuple[int]): 取り出す要素の位置（0: 表層形, 1: 品詞, ..., 9: 発音）。
+        pos_filter (set[str], optional): 残す品詞の集合。None の場合はすべて残します。
+
+    Returns:
+        list[tuple]: 指定した要素だけのタプルのリスト。
+    """
+    return [tuple(token[i] for i in indices) for token in tokens
+            if pos_filter is None or token[1] in pos_filter]
+
+
+class MeCabBackend:
+    """
+    MeCabによる形態素解析バックエンド。IPADIC形式の素性をそのままタプルに変換します。
+    """
+
+    name = "mecab"
+    # MorphologicalAnalyzer が自身の計測オブジェクトに差し替える
+    instrumentation = Instrumentation(enabled=False)
+
+    def __init__(self, dictionary_path=""):
+        """
+        Args:
+            dictionary_path (str, optional): MeCabの辞書パス。空の場合はデフォルトの辞書を使用します。
+
+        Raises:
+            RuntimeError: MeCabの初期化に失敗した場合。
+        """
+        import MeCab  # バックエンドを選んだときだけ読み込む
+
+        self.dictionary_path = dictionary_path
+        try:
+            self.tagger = MeCab.Tagger(dictionary_path)
+            self.tagger.parse("") # MeCabのウォームアップと初期化確認
+        except RuntimeError as e:
+            # エラーメッセージに辞書パスの確認を促す情報を追加
+            error_message = f"MeCabの初期化に失敗しました。mecabrcファイルや辞書パス（{dictionary_path if dictionary_path else 'デフォルト'}）が正しく設定されているか確認してください。エラー詳細: {e}"
+            if "dictionary_path" in str(e).lower() or "mecabrc" in str(e).lower():
+                 error_message += "\nシステムにMeCabと適切な辞書がインストールされているか、また環境変数 MECABRC が正しく設定されているか確認してください。"
+            raise RuntimeError(error_message) from e
+
+        # キャッシュキーに含める辞書の識別子（辞書パスと実際に読み込まれた辞書ファイル・バージョン）
+        info = self.tagger.dictionary_info()
+        self.identity = f"{dictionary_path}|{info.filename}|{info.version}"
+        self._projections = {}  # parse_fields の要素の組み合わせ → (Tagger, 取り出し関数)
+        # 出力形式（-F）で素性を取り出せるのはIPADIC形式（既知語の素性が9個）の辞書だけ。
+        # UniDicなどは '*' と空文字列の素性を出力形式で区別できないため、parse_fields でも通常の解析を使う
+        probe = self.tagger.parseToNode("日本").next
+        self.supports_projection = len(probe.feature.split(",")) == 9
+
+    def spec(self):
+        """ワーカープロセスで同じバックエンドを作成するための (名前, 辞書パス)。"""
+        return self.name, self.dictionary_path
+
+    def parse(self, processed_text):
+        """
+        前処理済みのテキストを解析し、タプルのリストに変換します。
+
+        Args:
+            processed_text (str): 前処理済みのテキスト。
+
+        Returns:
+            list[tuple]: (表層形, 品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音) のリスト。
+        """
+        with self.instrumentation.stage("parse"):
+            node = self.tagger.parseToNode(processed_text)
+        with self.instrumentation.stage("features"):
+            return self._collect(node)
+
+    def _projection(self, indices):
+        """
+        parse_fields 用の Tagger と、出力行から要素を取り出す関数を作成します（要素の組み合わせごとに1回だけ作成）。
+        既知語は「表層形<TAB>品詞<TAB>必要な素性...」の形式で必要な素性だけを出力し、
+        未知語は素性の数が辞書によって異なるため「表層形<TAB><TAB>全素性」の形式で出力します。
+        """
+        projection = self._projections.get(indices)
+        if projection is None:
+            import MeCab
+
+            # 出力する素性の位置（タプル内の位置 1〜9 が素性 0〜8 に対応する。品詞は絞り込みに使うため常に出力する）
+            columns = sorted({1, *(i for i in indices if i > 0)})
+            node_format = "\\\\t".join(["%m"] + [f"%f[{i - 1}]" for i in columns])
+            # 引数の文字列はMeCab側で1回エスケープが解除されるため、\t や \n は二重にエスケープする。
+            # 辞書の dicrc で output-format-type が指定されている場合（UniDicなど）に備えて -O '' で無効にする
+            tagger = MeCab.Tagger(f"{self.dictionary_path} -O '' -F{node_format}\\\\n -U%m\\\\t\\\\t%H\\\\n -E\\\\n")
+            positions = [0 if i == 0 else 1 + columns.index(i) for i in indices]
+            projection = self._projections[indices] = (tagger, itemgetter(*positions) if len(positions) > 1 else
+                                                      (lambda values, position=positions[0]: (values[position],)))
+        return projection
+
+    def parse_fields(self, processed_text, indices, pos_filter=None):
+        """
+        前処理済みのテキストを1回の parse() で解析し、指定した要素だけのタプルのリストに変換します。
+        ノードを1つずつたどらず、出力形式（-F）で必要な素性だけを書き出した文字列をまとめて分割するため、parse より高速です。
+        品詞の絞り込みはタプルを作る前に行います。
+        IPADIC形式でない辞書（supports_projection が False）の場合は parse の結果から取り出します。
+
+        Args:
+            processed_text (str): 前処理済みのテキスト。
+            indices (tuple[int]): 取り出す要素の位置（0: 表層形, 1: 品詞, ..., 9: 発音）。
+            pos_filter (set[str], optional): 残す品詞の集合。None の場合はすべて残します。
+
+        Returns:
+            list[tuple]: 指定した要素だけのタプルのリスト。parse の結果を project_tokens で絞り込んだものと同じです。
+        """
+        if not self.supports_projection:
+            return project_tokens(self.parse(processed_text), indices, pos_filter)
+        tagger, getter = self._projection(indices)
+        with self.instrumentation.stage("parse"):
+            output = tagger.parse(processed_text)
+        if output is None:  # 既知語の素性が足りないなど、出力形式を適用できない場合は通常の解析に戻す
+            return project_tokens(self.parse(processed_text), indices, pos_filter)
+
+        with self.instrumentation.stage("features"):
+            # %f[N] は素性が '*' の場合に空文字列を出力するため、parse と同じ値（読み・発音は None、それ以外は '*'）に戻す
+            fills = tuple(None if i == 0 or i in _OPTIONAL_INDICES else "*" for i in indices)
+            restore = any(i > 0 for i in indices)
+            results = []
+            for line in output.split("\n"):
+                if not line:
+                    continue
+                values = line.split("\t")
+                if values[1] == "":
+                    # 未知語: 全素性から parse と同じ10要素を作ってから取り出す（素性が足りない分は None）
+                    token = ([values[0]] + values[2].split(",")[:9] + [None] * 9)[:10]
+                    if pos_filter is None or token[1] in pos_filter:
+                        results.append(tuple(None if i in _OPTIONAL_INDICES and token[i] == "*" else token[i]
+                                             for i in indices))
+                    continue
+                if pos_filter is not None and values[1] not in pos_filter:
+                    continue
+                token = getter(values)
+                results.append(tuple(value or fill for value, fill in zip(token, fills)) if restore else token)
+            return results
+
+    def _collect(self, node):
+        # parseToNode が返したノード列をたどり、素性をタプルに変換する
+        results = []
+        while node:
+            if node.surface: # 表層形が存在するノードのみ (BOS/EOSノード対策)
+                features = node.feature.split(',')
+                surface = node.surface
+
+                # featuresの要素数は9個と仮定するが、辞書によっては少ない場合があるため、安全にアクセス
+                # (品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音)
+                # 読み(features[7])と発音(features[8])は存在しない場合 '*' になることがあるのでNoneに変換
+
+                token_info = [surface] + features[:7] # 表層形 + 7つの素性
+
+                # 読みと発音の処理
+                if len(features) > 7 and features[7] != '*':
+                    token_info.append(features[7])
+                else:
+                    token_info.append(None) # 読みがない場合
+
+                if len(features) > 8 and features[8] != '*':
+                    token_info.append(features[8])
+                else:
+                    token_info.append(None) # 発音がない場合
+
+                # 不足している特徴量があればNoneで埋める (最大9個の特徴量 + 表層形 = 10要素)
+                while len(token_info) < 10:
+                    token_info.append(None)
+
+                results.append(tuple(token_info))
+            node = node.next
+        return results
+
+
+class SudachiBackend:
+    """
+    SudachiPyによる形態素解析バックエンド。
+    品詞情報（6要素）を品詞〜活用形に、辞書形を原形に、読みを読みに対応させ、MeCabと同じ10要素のタプルを返します。
+    Sudachiには発音の情報がないため、発音は常に None です。
+    """
+
+    # MorphologicalAnalyzer が自身の計測オブジェクトに差し替える
+    instrumentation = Instrumentation(enabled=False)
+
+    def __init__(self, split_mode="C"):
+        """
+        Args:
+            split_mode (str, optional): 分割単位。'A'（短単位）, 'B'（中単位）, 'C'（長単位）のいずれか。デフォルトは 'C'。
+
+        Raises:
+            ValueError: 分割単位が不正な場合。
+            RuntimeError: Sudachiの初期化に失敗した場合。
+        """
+        split_mode = split_mode.upper()
+        if split_mode not in ("A", "B", "C"):
+            raise ValueError(f"Sudachiの分割単位は 'A', 'B', 'C' のいずれかを指定してください: {split_mode}")
+        try:
+            from sudachipy import dictionary, tokenizer  # バックエンドを選んだときだけ読み込む
+
+            self.tokenizer = dictionary.Dictionary().create()
+            self.mode = getattr(tokenizer.Tokenizer.SplitMode, split_mode)
+        except Exception as e:
+            raise RuntimeError(f"Sudachiの初期化に失敗しました。sudachipy と sudachidict_core がインストールされているか確認してください。エラー詳細: {e}") from e
+
+        self.split_mode = split_mode
+        self.name = f"sudachi_{split_mode.lower()}"
+        try:
+            dictionary_version = metadata.version("sudachidict_core")
+        except metadata.PackageNotFoundError:
+            dictionary_version = "unknown"
+        self.identity = f"sudachi|{split_mode}|{dictionary_version}"
+
+    def spec(self):
+        """ワーカープロセスで同じバックエンドを作成するための (名前, 辞書パス)。"""
+        return self.name, ""
+
+    def parse(self, processed_text):
+        """
+        前処理済みのテキストを解析し、MeCabバックエンドと同じ形式のタプルのリストに変換します。
+
+        Args:
+            processed_text (str): 前処理済みのテキスト。
+
+        Returns:
+            list[tuple]: (表層形, 品詞, 品詞細分類1, 品詞細分類2, 品詞細分類3, 活用型, 活用形, 原形, 読み, 発音) のリスト。
+        """
+        with self.instrumentation.stage("parse"):
+            morphemes = self.tokenizer.tokenize(processed_text, self.mode)
+        with self.instrumentation.stage("features"):
+            return self._collect(morphemes)
+
+    def parse_fields(self, processed_text, indices, pos_filter=None):
+        """
+        前処理済みのテキストを解析し、指定した要素だけのタプルのリストに変換します。
+
+        Args:
+            processed_text (str): 前処理済みのテキスト。
+            indices (tuple[int]): 取り出す要素の位置（0: 表層形, 1: 品詞, ..., 9: 発音）。
+            pos_filter (set[str], optional): 残す品詞の集合。None の場合はすべて残します。
+
+        Returns:
+            list[tuple]: 指定した要素だけのタプルのリスト。
+        """
+        return project_tokens(self.parse(processed_text), indices, pos_filter)
+
+    def _collect(self, morphemes):
+        # Morpheme を MeCab と同じ形式のタプルに変換する
+        results = []
+        for morpheme in morphemes:
+            surface = morpheme.surface()
+            if not surface.strip(): # MeCabと同様に空白は形態素として扱わない
+                continue
+            reading = morpheme.reading_form()
+            results.append((surface, *morpheme.part_of_speech(), morpheme.dictionary_form(),
+                            reading if reading else None, None))
+        return results
+
+
+def create_backend(backend="mecab", dictionary_path=""):
+    """
+    バックエンド名から形態素解析バックエンドを作成します。
+
+    Args:
+        backend (str, optional): 'mecab', 'sudachi'（分割単位C）, 'sudachi_a', 'sudachi_b', 'sudachi_c' のいずれか。
+        dictionary_path (str, optional): MeCabの辞書パス。Sudachiでは使用しません。
+
+    Returns:
+        MeCabBackend or SudachiBackend: バックエンド。
+
+    Raises:
+        ValueError: バックエンド名が不正な場合。
+    """
+    if backend == "mecab":
+        return MeCabBackend(dictionary_path)
+    if backend == "sudachi":
+        return SudachiBackend("C")
+    if backend in ("sudachi_a", "sudachi_b", "sudachi_c"):
+        return SudachiBackend(backend[-1])
+    raise ValueError(f"バックエンドは {BACKENDS} のいずれかを指定してください: {backend}")
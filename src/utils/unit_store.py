@@ -0,0 +1,130 @@
+# 入力ファイル（単位）ごとの処理結果を、ファイルの内容ハッシュで管理するための共通処理
+#
+# 取り込み（ingest）・逐次学習（incremental_trainer）・単語ベクトル（word_embeddings）・検索インデックス（lemma_index）・
+# 感情の要約（sentiment_cubes）・バッチ分析（batch_analyze）は、いずれも入力ファイルの内容が変わったかどうかを
+# SHA-256 で判定します。ハッシュの計算方法をそろえるため、ここの file_digest を使います。
+# 処理結果をファイルの内容ハッシュの名前で保存し、変わっていないファイルの結果を再利用する処理は UnitStore にまとめています。
+import hashlib
+import json
+import os
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    ファイル内容のSHA-256ハッシュを計算します。
+
+    Args:
+        path (str): ファイルのパス。
+        chunk_size (int, optional): 1回に読み込むバイト数。
+
+    Returns:
+        str: 16進数のハッシュ値。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UnitStore:
+    """
+    入力ファイル（単位）ごとの処理結果を、ファイルの内容ハッシュを名前にして保存するディレクトリとそのマニフェスト。
+    マニフェストには入力ファイルの相対パスごとに内容ハッシュと件数などを記録し、内容の変わっていないファイルの結果を再利用します。
+    word_embeddings（トークンファイル）・lemma_index（セグメント）・sentiment_cubes（部分集計）で使います。
+
+    使用例:
+        store = UnitStore(segment_dir, manifest_path, {'version': 1, 'dictionary_id': ...}, ('.npz', '.parquet'))
+        for path in paths:
+            key, digest = os.path.relpath(path, base_dir), file_digest(path)
+            entry = store.reuse(key, digest)
+            if entry is None:
+                ...  # store.path(digest) + 拡張子 に結果を保存する
+                entry = store.record(key, digest, n_documents=...)
+        store.prune()
+        store.save()
+    """
+
+    def __init__(self, directory, manifest_path, identity, suffixes):
+        """
+        Args:
+            directory (str): 処理結果を保存するディレクトリ。存在しない場合は作成します。
+            manifest_path (str): マニフェスト（JSON）のパス。
+            identity (dict): 処理結果の形式の版や辞書の識別子など。保存済みのマニフェストと1つでも異なる場合はすべて作り直します。
+            suffixes (tuple[str]): 1つの入力ファイルの処理結果のファイルの拡張子（'.npz' など）。
+        """
+        self.directory = directory
+        self.manifest_path = manifest_path
+        self.suffixes = tuple(suffixes)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {}
+        if any(manifest.get(name) != value for name, value in identity.items()):
+            manifest = {**identity, "units": {}}
+        self.manifest = manifest
+        self.units = {}  # 今回の入力ファイル（save でマニフェストに書き込む）
+
+    def path(self, digest):
+        """内容ハッシュに対応する処理結果のパス（拡張子を除く）。"""
+        return os.path.join(self.directory, digest)
+
+    def reuse(self, key, digest):
+        """
+        保存済みの処理結果が使える場合は、その記録を今回の入力ファイルとして登録して返します。
+
+        Args:
+            key (str): 入力ファイルの相対パス。
+            digest (str): 入力ファイルの内容ハッシュ（file_digest）。
+
+        Returns:
+            dict or None: マニフェストの記録（sha256 と record で渡した値）。内容が変わった場合や結果のファイルがない場合は None。
+        """
+        recorded = self.manifest["units"].get(key)
+        if recorded is None or recorded["sha256"] != digest:
+            return None
+        if not all(os.path.isfile(self.path(digest) + suffix) for suffix in self.suffixes):
+            return None
+        self.units[key] = recorded
+        return recorded
+
+    def record(self, key, digest, **info):
+        """
+        新たに保存した処理結果を今回の入力ファイルとして登録します。
+
+        Args:
+            key (str): 入力ファイルの相対パス。
+            digest (str): 入力ファイルの内容ハッシュ。
+            **info: 件数など、マニフェストに記録する値。
+
+        Returns:
+            dict: 登録した記録。
+        """
+        entry = self.units[key] = {"sha256": digest, **info}
+        return entry
+
+    def changed(self):
+        """今回の入力ファイルの記録が保存済みのマニフェストと異なる（追加・変更・削除がある）かどうか。"""
+        return self.units != self.manifest["units"]
+
+    def prune(self):
+        """
+        今回の入力ファイルにない（削除・変更された）ファイルの処理結果を削除します。
+        """
+        digests = {entry["sha256"] for entry in self.units.values()}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.split(".")[0] not in digests and os.path.isfile(path):
+                os.remove(path)
+
+    def save(self):
+        """
+        今回の入力ファイルの記録をマニフェストに保存します。書き込み途中のマニフェストを読まないよう、一時ファイルから置き換えます。
+        """
+        self.manifest["units"] = self.units
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
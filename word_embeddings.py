@@ -0,0 +1,225 @@
+# 講義評価の自由記述から Word2Vec の単語ベクトルを学習し、コメントごとの文書ベクトルを作成する
+#
+# 使用例:
+#   python word_embeddings.py "(CSV)2025 raw"                        # トークンのコーパスを更新して学習
+#   python word_embeddings.py data/processed/evaluations --workers 8 --vector-size 200
+#
+# 形態素解析の結果（内容語の原形）は、入力ファイルごとに1行1文書・空白区切りのテキストとしてディスクに保存し、
+# 内容の変わっていないファイルは次回以降も再利用します。学習はそれらを連結したコーパスファイルを
+# gensim の corpus_file モードで読むため、コーパス全体をメモリに載せずに、ワーカースレッド数に応じて並列に学習できます。
+# 学習した単語ベクトルは行列を .npy の別ファイルとして保存し、DocumentEmbedder はそれをメモリマップで読み込みます。
+import argparse
+import os
+import shutil
+import numpy as np
+import scipy.sparse as sp
+from gensim.models import KeyedVectors, Word2Vec
+from analysis_client import make_analyzer
+from content_words import tokenize_corpus
+from ingest import list_evaluation_files, read_evaluation_columns
+from unit_store import UnitStore, file_digest
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'processed', 'word2vec')
+CORPUS_MANIFEST = 'corpus.json'
+CORPUS_FILE = 'corpus.txt'
+VECTORS_FILE = 'vectors.kv'
+
+
+def write_token_lines(token_lists, path):
+    """
+    文書ごとのトークンのリストを、1行1文書・空白区切りで書き出します（gensim の corpus_file の形式）。
+    形態素解析の結果は空白を含まないため、空白をトークンの区切りに使えます。
+
+    Args:
+        token_lists (list[list[str]]): 文書ごとのトークンのリスト。
+        path (str): 出力先のパス。
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for tokens in token_lists:
+            f.write(' '.join(tokens))
+            f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def update_corpus(data_path, output_dir=DEFAULT_OUTPUT_DIR, analyzer=None, workers=1):
+    """
+    入力ファイルごとのトークンファイルを更新し、それらを連結したコーパスファイルを作成します。
+    トークンファイルはファイルの内容ハッシュごとに保存するため、内容の変わっていないファイルは形態素解析を省略します。
+    辞書が変わった場合はすべて解析し直します。
+
+    Args:
+        data_path (str): 講義評価CSVのディレクトリ、または取り込み済みのParquetデータセット。
+        output_dir (str, optional): 保存先ディレクトリ。
+        analyzer (MorphologicalAnalyzer, optional): 形態素解析器。None の場合は make_analyzer で作成します。
+        workers (int, optional): 形態素解析のワーカープロセス数。
+
+    Returns:
+        dict: corpus（コーパスファイルのパス）, tokenized（解析したファイル）, reused（再利用したファイル）,
+              n_documents（文書数）を含む辞書。
+    """
+    if analyzer is None:
+        analyzer = make_analyzer()
+    store = UnitStore(os.path.join(output_dir, 'tokens'), os.path.join(output_dir, CORPUS_MANIFEST),
+                      {'dictionary_id': analyzer.dictionary_id}, ('.txt',))
+    summary = {'tokenized': [], 'reused': [], 'n_documents': 0}
+    for unit in list_evaluation_files(data_path):
+        key = os.path.relpath(unit, data_path)
+        digest = file_digest(unit)
+        entry = store.reuse(key, digest)
+        if entry is not None:
+            summary['reused'].append(key)
+        else:
+            texts = read_evaluation_columns(unit, ['自由記述'])['自由記述'].tolist()
+            write_token_lines(tokenize_corpus(analyzer, texts, workers=workers), store.path(digest) + '.txt')
+            summary['tokenized'].append(key)
+            entry = store.record(key, digest, n_documents=len(texts))
+        summary['n_documents'] += entry['n_documents']
+
+    # 入力から消えたファイルのトークンファイルを削除する
+    store.prune()
+
+    corpus_path = os.path.join(output_dir, CORPUS_FILE)
+    with open(corpus_path + '.tmp', 'wb') as out:
+        for entry in store.units.values():
+            with open(store.path(entry['sha256']) + '.txt', 'rb') as f:
+                shutil.copyfileobj(f, out)
+    os.replace(corpus_path + '.tmp', corpus_path)
+
+    store.save()
+    summary['corpus'] = corpus_path
+    return summary
+
+
+def train_word2vec(corpus_path, vectors_path, vector_size=100, window=5, min_count=2, epochs=5, sg=False,
+                   workers=os.cpu_count() or 1, seed=42):
+    """
+    コーパスファイルから Word2Vec を学習し、単語ベクトルを保存します。
+    corpus_file モードではワーカーごとにファイルの別の範囲を読むため、ワーカー数に応じて学習が速くなります。
+    ベクトルの行列は .npy の別ファイルに保存し、KeyedVectors.load(..., mmap='r') でメモリマップできるようにします。
+
+    Args:
+        corpus_path (str): 1行1文書・空白区切りのコーパスファイル。
+        vectors_path (str): 単語ベクトルの保存先。
+        vector_size (int, optional): ベクトルの次元数。デフォルトは 100。
+        window (int, optional): 文脈の窓幅。デフォルトは 5。
+        min_count (int, optional): 語彙に含める最小出現回数。デフォルトは 2。
+        epochs (int, optional): エポック数。デフォルトは 5。
+        sg (bool, optional): True の場合は skip-gram、False の場合は CBOW。
+        workers (int, optional): 学習のワーカースレッド数。デフォルトはCPUコア数。
+        seed (int, optional): 乱数シード。
+
+    Returns:
+        KeyedVectors: 学習した単語ベクトル。
+    """
+    model = Word2Vec(corpus_file=corpus_path, vector_size=vector_size, window=window, min_count=min_count,
+                     epochs=epochs, sg=int(sg), workers=workers, seed=seed)
+    model.wv.save(vectors_path, separately=['vectors'])
+    return model.wv
+
+
+class DocumentEmbedder:
+    """
+    学習済みの単語ベクトルをメモリマップで読み込み、文書ごとに単語ベクトルを平均した文書ベクトルを作成するクラス。
+    複数の文書をまとめて疎行列（文書×語彙の出現回数）と単語ベクトルの行列の積で計算します。
+    """
+
+    def __init__(self, vectors_path, mmap='r'):
+        """
+        Args:
+            vectors_path (str): train_word2vec で保存した単語ベクトルのパス。
+            mmap (str, optional): ベクトルの行列の読み込み方法。'r' でメモリマップ、None ですべて読み込みます。
+        """
+        self.keyed_vectors = KeyedVectors.load(vectors_path, mmap=mmap)
+        self.key_to_index = self.keyed_vectors.key_to_index
+        self.vectors = self.keyed_vectors.vectors
+
+    @property
+    def vector_size(self):
+        """文書ベクトルの次元数。"""
+        return self.vectors.shape[1]
+
+    def counts(self, token_lists):
+        """
+        文書×語彙の出現回数の疎行列を作成します。語彙にない語は無視します。
+
+        Args:
+            token_lists (list[list[str]]): 文書ごとのトークンのリスト。
+
+        Returns:
+            scipy.sparse.csr_matrix: 出現回数の行列。
+        """
+        key_to_index = self.key_to_index
+        indices, indptr = [], [0]
+        for tokens in token_lists:
+            indices.extend(index for index in map(key_to_index.get, tokens) if index is not None)
+            indptr.append(len(indices))
+        indices = np.asarray(indices, dtype=np.int64)
+        matrix = sp.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(token_lists), len(self.vectors)))
+        matrix.sum_duplicates()
+        return matrix
+
+    def transform(self, token_lists, normalize=False):
+        """
+        文書ごとのトークンのリストを、単語ベクトルの平均（語彙にある語のみ）に変換します。
+        語彙にある語を含まない文書はゼロベクトルになります。
+
+        Args:
+            token_lists (list[list[str]]): 文書ごとのトークンのリスト。
+            normalize (bool, optional): True の場合は文書ベクトルをL2ノルムで正規化します。
+
+        Returns:
+            np.ndarray: (文書数, 次元数) の文書ベクトル。
+        """
+        counts = self.counts(token_lists)
+        pooled = np.asarray(counts @ self.vectors, dtype=np.float32)
+        lengths = np.asarray(counts.sum(axis=1), dtype=np.float32)
+        np.divide(pooled, lengths, out=pooled, where=lengths > 0)
+        if normalize:
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            np.divide(pooled, norms, out=pooled, where=norms > 0)
+        return pooled
+
+    def transform_texts(self, analyzer, texts, workers=1, normalize=False):
+        """
+        自由記述を学習時と同じ方法（内容語の原形）でトークン化し、文書ベクトルに変換します。
+
+        Args:
+            analyzer (MorphologicalAnalyzer): 形態素解析器。
+            texts (list[str]): 自由記述のリスト。
+            workers (int, optional): 形態素解析のワーカープロセス数。
+            normalize (bool, optional): True の場合は文書ベクトルをL2ノルムで正規化します。
+
+        Returns:
+            np.ndarray: (文書数, 次元数) の文書ベクトル。
+        """
+        return self.transform(tokenize_corpus(analyzer, texts, workers=workers), normalize=normalize)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="講義評価の自由記述による Word2Vec の学習")
+    parser.add_argument("data", help="講義評価CSVのディレクトリ、または取り込み済みのParquetデータセット")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="コーパスと単語ベクトルの保存先")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="学習のワーカースレッド数")
+    parser.add_argument("--tokenize-workers", type=int, default=1, help="形態素解析のワーカープロセス数")
+    parser.add_argument("--vector-size", type=int, default=100, help="ベクトルの次元数")
+    parser.add_argument("--window", type=int, default=5, help="文脈の窓幅")
+    parser.add_argument("--min-count", type=int, default=2, help="語彙に含める最小出現回数")
+    parser.add_argument("--epochs", type=int, default=5, help="エポック数")
+    parser.add_argument("--sg", action="store_true", help="skip-gram で学習する（デフォルトは CBOW）")
+    parser.add_argument("--similar", nargs="*", default=[], help="学習後に類似語を表示する語")
+    args = parser.parse_args()
+
+    summary = update_corpus(args.data, args.output_dir, workers=args.tokenize_workers)
+    print(f"コーパス: {summary['n_documents']}件（解析 {len(summary['tokenized'])}ファイル、"
+          f"再利用 {len(summary['reused'])}ファイル）")
+    vectors_path = os.path.join(args.output_dir, VECTORS_FILE)
+    wv = train_word2vec(summary['corpus'], vectors_path, args.vector_size, args.window, args.min_count,
+                        args.epochs, args.sg, args.workers)
+    print(f"語彙 {len(wv.key_to_index)}語、{wv.vector_size}次元の単語ベクトルを保存しました: {vectors_path}")
+    for word in args.similar:
+        if word in wv.key_to_index:
+            print(f"{word}: " + ', '.join(f'{w}({s:.3f})' for w, s in wv.most_similar(word, topn=10)))
+        else:
+            print(f"{word}: 語彙にありません")